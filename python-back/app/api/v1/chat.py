@@ -1,63 +1,74 @@
 """
 对话聊天 API - 支持流式输出
 """
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session as DBSession
-from app.db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import AsyncSessionLocal, get_async_db
 from app.models.message import Message
 from app.models.session import Session as SessionModel
 from app.schemas.chat import ChatRequest
+from app.core.config import settings
+from app.services.code_context import build_chat_message, build_code_context, load_code_files
+from app.services.conversation_memory import build_chat_history, conversation_summarizer
+from app.services.instruction_parser import StreamingInstructionParser, dump_instructions, parse_instructions
+from app.services.llm_usage import llm_usage, merge_usage
+from app.services.message_checkpoint import MessageCheckpointer
+from app.services.response_cache import get_response_cache
 from app.services.review_chain import review_chain
-from app.models.file import File
-import json
-import asyncio
+from app.services.stream_manager import StreamBuffer, stream_manager
+from app.utils.sse import coalesce_deltas, format_sse_event
 import uuid
-import os
 from datetime import datetime
 
 router = APIRouter()
 
+# 重放缓存回复时每个增量的字符数
+REPLAY_CHUNK_CHARS = 64
 
-def _get_language_from_filename(filename: str) -> str:
-    """从文件名获取编程语言"""
-    ext_map = {
-        '.py': 'python',
-        '.js': 'javascript',
-        '.jsx': 'javascript',
-        '.ts': 'typescript',
-        '.tsx': 'typescript',
-        '.java': 'java',
-        '.go': 'go',
-        '.cpp': 'cpp',
-        '.c': 'c',
-        '.h': 'c',
-        '.hpp': 'cpp',
-        '.rs': 'rust',
-        '.rb': 'ruby',
-        '.php': 'php',
-        '.swift': 'swift',
-        '.kt': 'kotlin',
-        '.vue': 'vue',
-        '.html': 'html',
-        '.css': 'css',
-        '.scss': 'scss',
-        '.less': 'less'
-    }
-    
-    ext = os.path.splitext(filename)[1].lower()
-    return ext_map.get(ext, 'plaintext')
+
+async def _get_session(db: AsyncSession, session_id: str):
+    """根据会话ID获取会话"""
+    return await db.scalar(
+        select(SessionModel).where(SessionModel.session_id == session_id)
+    )
 
 
 async def generate_stream_response(
     user_message: str,
     session_id: str,
     file_ids: list,
-    db: DBSession
+    ai_msg_id: Optional[str] = None
 ):
     """
-    生成流式响应
+    生成流式响应事件
+    
+    使用独立的异步数据库会话，会话生命周期与流一致，数据库 I/O 不阻塞其他流。
+    
+    Yields:
+        事件字典，由 stream_manager 分配序号后以 SSE 帧发送
     """
+    async with AsyncSessionLocal() as db:
+        async for event in _stream_with_session(user_message, session_id, file_ids, db, ai_msg_id):
+            yield event
+
+
+async def _sse_frames(buffer: StreamBuffer, last_event_id: int = 0):
+    """把事件缓冲转换为带序号的 SSE 帧"""
+    async for seq, event in buffer.subscribe(last_event_id):
+        yield format_sse_event(event, event_id=seq)
+
+
+async def _stream_with_session(
+    user_message: str,
+    session_id: str,
+    file_ids: list,
+    db: AsyncSession,
+    ai_msg_id: Optional[str] = None
+):
+    """在给定的异步数据库会话中生成流式响应事件"""
     try:
         # 1. 保存用户消息
         user_msg_id = f"msg_{uuid.uuid4().hex[:16]}"
@@ -68,42 +79,52 @@ async def generate_stream_response(
             content=user_message
         )
         db.add(user_message_obj)
-        db.commit()
+        await db.commit()
         
         # 自动设置会话标题（如果是默认标题）
-        session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+        session = await _get_session(db, session_id)
         if session and session.title == "新对话":
             # 使用用户消息的前6个字符作为标题
             title = user_message.strip()[:6]
             if len(user_message.strip()) > 6:
                 title += "..."
             session.title = title
-            db.commit()
+            await db.commit()
         
         # 发送用户消息确认
-        yield f"data: {json.dumps({'type': 'user_message', 'message_id': user_msg_id, 'content': user_message}, ensure_ascii=False)}\n\n"
+        yield {'type': 'user_message', 'message_id': user_msg_id, 'content': user_message}
         
         # 2. 准备代码内容（如果有文件）
         code_context = ""
+        line_count = None  # 只附带一个文件时按其行数校验修改指令
         if file_ids:
-            for file_id in file_ids:
-                file = db.query(File).filter(File.file_id == file_id).first()
-                if file and os.path.exists(file.filepath):
-                    with open(file.filepath, 'r', encoding='utf-8') as f:
-                        code_content = f.read()
-                        language = _get_language_from_filename(file.filename)
-                        code_context += f"\n\n**文件**: {file.filename}\n```{language}\n{code_content}\n```\n"
-        
-        # 3. 构建完整的用户消息（包含代码上下文）
-        full_message = user_message
-        if code_context:
-            full_message += code_context
+            code_files = await load_code_files(db, file_ids, skip_missing=True)
+            code_context = build_code_context(code_files)
+            if len(code_files) == 1:
+                line_count = code_files[0].code.count("\n") + 1
+        
+        # 3. 构建完整的用户消息（代码上下文在前），之前的对话按 token 预算作为历史
+        full_message = build_chat_message(user_message, code_context)
+        history = await build_chat_history(db, session_id, exclude_message_ids=[user_msg_id])
+        agent_messages = history + [{"role": "user", "content": full_message}]
+        
+        # 相同的问题、代码和历史命中缓存时，以合成的流重放缓存的回复
+        response_cache = get_response_cache()
+        cache_key = None
+        cached_content = None
+        if response_cache.enabled:
+            cache_key = review_chain.get_response_cache_key(
+                code_context, user_message, channel="chat", history=history
+            )
+            cached_content = await response_cache.aget(cache_key)
         
         # 4. 调用 Agent 进行流式生成
         # 先创建 AI 消息对象并保存到数据库（内容为空）
-        ai_msg_id = f"msg_{uuid.uuid4().hex[:16]}"
+        ai_msg_id = ai_msg_id or f"msg_{uuid.uuid4().hex[:16]}"
         ai_content = ""
         thinking_process = ""  # 收集思考过程
+        usage = None  # 本次回复的 token 用量（流式响应的最后一个数据块附带）
+        instruction_parser = StreamingInstructionParser(line_count)  # 随内容增量解析修改指令
         
         # 立即保存空消息到数据库，以便中断时可以更新
         ai_message_obj = Message(
@@ -114,16 +135,39 @@ async def generate_stream_response(
             thinking_process=None
         )
         db.add(ai_message_obj)
-        db.commit()
+        await db.commit()
+        
+        # 后台定期把已生成的内容追加到消息行，进程中途退出时不会丢失全部内容
+        checkpointer = MessageCheckpointer(ai_msg_id, AsyncSessionLocal)
+        checkpointer.start()
         
         # 发送开始信号
-        yield f"data: {json.dumps({'type': 'start', 'message_id': ai_msg_id}, ensure_ascii=False)}\n\n"
+        yield {'type': 'start', 'message_id': ai_msg_id}
         
         # 调用 Agent（流式）
-        try:
+        def instruction_events(delta: str):
+            """内容增量中完成的修改指令，作为独立的 instruction 事件发送"""
+            return [
+                {'type': 'instruction', 'instruction': instruction.model_dump()}
+                for instruction in instruction_parser.feed(delta)
+            ]
+        
+        async def agent_deltas():
+            """把 Agent 事件转换为增量事件，同时收集完整的回复和思考过程"""
+            nonlocal ai_content, thinking_process, usage
+            if cached_content is not None:
+                for i in range(0, len(cached_content), REPLAY_CHUNK_CHARS):
+                    delta = cached_content[i:i + REPLAY_CHUNK_CHARS]
+                    ai_content += delta
+                    checkpointer.append(content=delta)
+                    yield {'type': 'content', 'delta': delta}
+                    for instruction_event in instruction_events(delta):
+                        yield instruction_event
+                return
+            
             # 使用 astream_events 方法进行流式调用（LangChain 1.0 推荐）
             async for event in review_chain.agent.astream_events(
-                {"messages": [{"role": "user", "content": full_message}]},
+                {"messages": agent_messages},
                 version="v1"
             ):
                 kind = event.get("event")
@@ -136,8 +180,8 @@ async def generate_stream_response(
                     if tool_input:
                         thinking_text += f"输入: {str(tool_input)[:100]}...\n"
                     thinking_process += thinking_text  # 收集思考过程
-                    yield f"data: {json.dumps({'type': 'thinking', 'delta': thinking_text}, ensure_ascii=False)}\n\n"
-                    await asyncio.sleep(0.01)
+                    checkpointer.append(thinking=thinking_text)
+                    yield {'type': 'thinking', 'delta': thinking_text}
                 
                 # 处理工具输出（作为思考过程）
                 elif kind == "on_tool_end":
@@ -145,41 +189,72 @@ async def generate_stream_response(
                     output = event.get("data", {}).get("output", "")
                     thinking_text = f"✅ {tool_name} 完成\n输出: {str(output)[:200]}...\n\n"
                     thinking_process += thinking_text  # 收集思考过程
-                    yield f"data: {json.dumps({'type': 'thinking', 'delta': thinking_text}, ensure_ascii=False)}\n\n"
-                    await asyncio.sleep(0.01)
+                    checkpointer.append(thinking=thinking_text)
+                    yield {'type': 'thinking', 'delta': thinking_text}
                 
                 # 处理 LLM 流式输出
                 elif kind == "on_chat_model_stream":
                     content = event.get("data", {}).get("chunk", {})
+                    usage = merge_usage(usage, llm_usage.record(content))
                     if hasattr(content, "content"):
                         delta = content.content
                         if delta:
                             ai_content += delta
-                            # 发送增量内容
-                            yield f"data: {json.dumps({'type': 'content', 'delta': delta}, ensure_ascii=False)}\n\n"
-                            await asyncio.sleep(0.01)
+                            checkpointer.append(content=delta)
+                            yield {'type': 'content', 'delta': delta}
+                            for instruction_event in instruction_events(delta):
+                                yield instruction_event
+        
+        try:
+            # 增量到达即转发，或按时间/大小预算合并为帧后发送
+            async for frame in coalesce_deltas(
+                agent_deltas(),
+                flush_interval_ms=settings.SSE_FLUSH_INTERVAL_MS,
+                flush_max_bytes=settings.SSE_FLUSH_MAX_BYTES
+            ):
+                yield frame
         
         except Exception as e:
             error_msg = f"AI 响应错误: {str(e)}"
             print(f"Agent 流式调用错误: {e}")
             import traceback
             traceback.print_exc()
-            yield f"data: {json.dumps({'type': 'error', 'error': error_msg}, ensure_ascii=False)}\n\n"
+            if instruction_parser.instructions:
+                # 保存的消息不带修改指令，通知客户端丢弃已收到的指令
+                yield {'type': 'instructions_reset'}
+                instruction_parser.instructions.clear()
+            yield {'type': 'error', 'error': error_msg}
             ai_content = error_msg
         
-        # 5. 更新 AI 消息内容和思考过程
+        else:
+            if cache_key and cached_content is None:
+                await response_cache.aset(cache_key, ai_content)
+            # 回复末尾没有闭合的指令
+            for instruction in instruction_parser.finish():
+                yield {'type': 'instruction', 'instruction': instruction.model_dump()}
+        
+        finally:
+            # 客户端断开时由后台任务写入剩余内容
+            checkpointer.finish()
+        
+        # 5. 等待检查点写完，再写入完整的 AI 消息内容和思考过程
+        await checkpointer.aclose()
         ai_message_obj.content = ai_content
         ai_message_obj.thinking_process = thinking_process if thinking_process else None
+        ai_message_obj.instructions = dump_instructions(instruction_parser.instructions)
         
         # 更新会话的最后消息
-        session = db.query(SessionModel).filter(SessionModel.session_id == session_id).first()
+        session = await _get_session(db, session_id)
         if session:
             session.updated_at = datetime.utcnow()
         
-        db.commit()
+        await db.commit()
+        
+        # 后台更新会话摘要（不阻塞本次响应）
+        conversation_summarizer.schedule(session_id, AsyncSessionLocal)
         
         # 6. 发送完成信号
-        yield f"data: {json.dumps({'type': 'done', 'message_id': ai_msg_id}, ensure_ascii=False)}\n\n"
+        yield {'type': 'done', 'message_id': ai_msg_id, 'usage': usage}
         
     except Exception as e:
         error_msg = f"流式响应错误: {str(e)}"
@@ -190,17 +265,17 @@ async def generate_stream_response(
         # 即使出错也要保存部分内容
         try:
             if 'ai_message_obj' in locals():
-                db.commit()
+                await db.commit()
         except:
-            db.rollback()
+            await db.rollback()
         
-        yield f"data: {json.dumps({'type': 'error', 'error': error_msg}, ensure_ascii=False)}\n\n"
+        yield {'type': 'error', 'error': error_msg}
 
 
 @router.post("/stream")
 async def chat_stream(
     request: ChatRequest,
-    db: DBSession = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     流式对话接口
@@ -208,21 +283,74 @@ async def chat_stream(
     支持 Server-Sent Events (SSE) 流式输出
     """
     # 验证会话是否存在
-    session = db.query(SessionModel).filter(
-        SessionModel.session_id == request.session_id
-    ).first()
+    session = await _get_session(db, request.session_id)
     
     if not session:
         raise HTTPException(status_code=404, detail="会话不存在")
     
-    # 返回流式响应
-    return StreamingResponse(
+    # 在后台任务中生成，客户端断线不会中断生成，可以通过 Last-Event-ID 重连
+    ai_msg_id = f"msg_{uuid.uuid4().hex[:16]}"
+    buffer = stream_manager.start(
+        ai_msg_id,
         generate_stream_response(
             user_message=request.message,
             session_id=request.session_id,
             file_ids=request.file_ids or [],
-            db=db
-        ),
+            ai_msg_id=ai_msg_id
+        )
+    )
+    
+    # 返回流式响应
+    return StreamingResponse(
+        _sse_frames(buffer),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"  # 禁用 nginx 缓冲
+        }
+    )
+
+
+@router.get("/stream/{message_id}")
+async def chat_stream_resume(
+    message_id: str,
+    last_event_id: Optional[int] = Query(None, description="已收到的最后一个事件序号"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    恢复流式对话
+    
+    补发 Last-Event-ID（请求头或查询参数）之后的事件，并继续接收后续事件。
+    生成已结束且缓冲已过期时，以快照形式返回数据库中保存的消息。
+    """
+    if last_event_id is None:
+        try:
+            last_event_id = int(last_event_id_header) if last_event_id_header else 0
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID 格式错误")
+    
+    buffer = stream_manager.get(message_id)
+    if buffer is None:
+        message = await db.scalar(select(Message).where(Message.message_id == message_id))
+        if not message:
+            raise HTTPException(status_code=404, detail="消息不存在")
+        
+        # 缓冲已过期，直接返回已保存的完整消息
+        buffer = StreamBuffer(message_id, max_events=2)
+        buffer.publish({
+            'type': 'snapshot',
+            'message_id': message_id,
+            'content': message.content,
+            'thinking': message.thinking_process or ''
+        })
+        buffer.publish({'type': 'done', 'message_id': message_id})
+        buffer.close()
+        last_event_id = 0
+    
+    return StreamingResponse(
+        _sse_frames(buffer, last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -235,7 +363,7 @@ async def chat_stream(
 @router.post("/send")
 async def chat_send(
     request: ChatRequest,
-    db: DBSession = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     普通对话接口（非流式）
@@ -244,9 +372,7 @@ async def chat_send(
     """
     try:
         # 验证会话是否存在
-        session = db.query(SessionModel).filter(
-            SessionModel.session_id == request.session_id
-        ).first()
+        session = await _get_session(db, request.session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="会话不存在")
@@ -260,7 +386,7 @@ async def chat_send(
             content=request.message
         )
         db.add(user_message_obj)
-        db.commit()
+        await db.commit()
         
         # 自动设置会话标题（如果是默认标题）
         if session and session.title == "新对话":
@@ -269,51 +395,68 @@ async def chat_send(
             if len(request.message.strip()) > 6:
                 title += "..."
             session.title = title
-            db.commit()
+            await db.commit()
         
         # 2. 准备代码内容（如果有文件）
         code_context = ""
+        line_count = None
         if request.file_ids:
-            for file_id in request.file_ids:
-                file = db.query(File).filter(File.file_id == file_id).first()
-                if file and os.path.exists(file.filepath):
-                    with open(file.filepath, 'r', encoding='utf-8') as f:
-                        code_content = f.read()
-                        language = _get_language_from_filename(file.filename)
-                        code_context += f"\n\n**文件**: {file.filename}\n```{language}\n{code_content}\n```\n"
-        
-        # 3. 构建完整的用户消息
-        full_message = request.message
-        if code_context:
-            full_message += code_context
-        
-        # 4. 调用 Agent
-        result = await review_chain.agent.ainvoke({
-            "messages": [{"role": "user", "content": full_message}]
-        })
+            code_files = await load_code_files(db, request.file_ids, skip_missing=True)
+            code_context = build_code_context(code_files)
+            if len(code_files) == 1:
+                line_count = code_files[0].code.count("\n") + 1
         
-        # 提取 AI 回复
-        ai_content = ""
-        if result and "messages" in result:
-            last_message = result["messages"][-1]
-            if hasattr(last_message, "content"):
-                ai_content = last_message.content
-            elif isinstance(last_message, dict):
-                ai_content = last_message.get("content", "")
+        # 3. 构建完整的用户消息（代码上下文在前），之前的对话按 token 预算作为历史
+        full_message = build_chat_message(request.message, code_context)
+        history = await build_chat_history(db, request.session_id, exclude_message_ids=[user_msg_id])
+        
+        # 4. 调用 Agent（相同的问题、代码和历史直接返回缓存的回复）
+        response_cache = get_response_cache()
+        cache_key = None
+        ai_content = None
+        if response_cache.enabled:
+            cache_key = review_chain.get_response_cache_key(
+                code_context, request.message, channel="chat", history=history
+            )
+            ai_content = await response_cache.aget(cache_key)
+        
+        usage = None
+        if ai_content is None:
+            result = await review_chain.agent.ainvoke({
+                "messages": history + [{"role": "user", "content": full_message}]
+            })
+            usage = llm_usage.record_result(result)
+            
+            # 提取 AI 回复
+            ai_content = ""
+            if result and "messages" in result:
+                last_message = result["messages"][-1]
+                if hasattr(last_message, "content"):
+                    ai_content = last_message.content
+                elif isinstance(last_message, dict):
+                    ai_content = last_message.get("content", "")
+            
+            if cache_key:
+                await response_cache.aset(cache_key, ai_content)
         
         # 5. 保存 AI 消息
         ai_msg_id = f"msg_{uuid.uuid4().hex[:16]}"
+        instructions = dump_instructions(parse_instructions(ai_content, line_count))
         ai_message_obj = Message(
             message_id=ai_msg_id,
             session_id=request.session_id,
             role='assistant',
-            content=ai_content
+            content=ai_content,
+            instructions=instructions
         )
         db.add(ai_message_obj)
         
         # 更新会话时间
         session.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        
+        # 后台更新会话摘要
+        conversation_summarizer.schedule(request.session_id, AsyncSessionLocal)
         
         return {
             "code": 200,
@@ -321,13 +464,15 @@ async def chat_send(
             "data": {
                 "user_message_id": user_msg_id,
                 "ai_message_id": ai_msg_id,
-                "content": ai_content
+                "content": ai_content,
+                "instructions": instructions,
+                "usage": usage
             }
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"对话失败: {str(e)}")
 
@@ -1,14 +1,25 @@
 """
 文件管理API
 """
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_db
-from app.schemas.file import FileResponse, FileList
+from app.db.database import get_async_db
+from app.schemas.file import (
+    ArchiveSkippedEntry,
+    ArchiveUploadResult,
+    BatchUploadItem,
+    BatchUploadResult,
+    FileDiffHunk,
+    FileDiffResponse,
+    FileResponse,
+    FileList
+)
 from app.schemas.common import ResponseModel
-from app.services import file_service
+from app.services import archive_service, file_service
+from app.services.code_context import load_code_files
+from app.services.code_diff import compute_diff
 
 router = APIRouter()
 
@@ -17,7 +28,8 @@ router = APIRouter()
 async def upload_file(
     file: UploadFile = File(...),
     session_id: str = Form(...),
-    db: Session = Depends(get_db)
+    parent_file_id: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     上传单个文件
@@ -25,6 +37,7 @@ async def upload_file(
     Args:
         file: 上传的文件
         session_id: 会话ID
+        parent_file_id: 上一版本的文件ID（应用修改建议后重新上传时提供，审查时只审查修改部分）
     
     Returns:
         文件信息
@@ -34,7 +47,7 @@ async def upload_file(
             db=db,
             upload_file=file,
             session_id=session_id,
-            save_content=True  # 保存文件内容到数据库
+            parent_file_id=parent_file_id
         )
         
         return ResponseModel(
@@ -48,42 +61,96 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
 
-@router.post("/upload-batch", response_model=ResponseModel[List[FileResponse]])
+@router.post("/upload-batch", response_model=ResponseModel[BatchUploadResult])
 async def upload_files(
     files: List[UploadFile] = File(...),
     session_id: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     批量上传文件
     
+    文件并发写入，所有文件记录在一个事务中插入；单个文件失败不影响其他文件。
+    
     Args:
         files: 上传的文件列表
         session_id: 会话ID
     
     Returns:
-        文件信息列表
+        每个文件的上传结果
     """
     try:
-        uploaded_files = []
-        for file in files:
-            db_file = await file_service.upload_file(
-                db=db,
-                upload_file=file,
-                session_id=session_id,
-                save_content=True
-            )
-            uploaded_files.append(FileResponse.model_validate(db_file))
-        
-        return ResponseModel(
-            code=200,
-            message=f"成功上传 {len(uploaded_files)} 个文件",
-            data=uploaded_files
+        results = await file_service.bulk_upload_files(
+            db=db,
+            upload_files=files,
+            session_id=session_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量上传失败: {str(e)}")
+    
+    items = [
+        BatchUploadItem(
+            filename=result.filename,
+            success=result.file is not None,
+            file=FileResponse.model_validate(result.file) if result.file is not None else None,
+            error=result.error
+        )
+        for result in results
+    ]
+    succeeded = sum(1 for item in items if item.success)
+    
+    return ResponseModel(
+        code=200,
+        message=f"成功上传 {succeeded} 个文件" + (f"，{len(items) - succeeded} 个失败" if succeeded < len(items) else ""),
+        data=BatchUploadResult(
+            total=len(items),
+            succeeded=succeeded,
+            failed=len(items) - succeeded,
+            items=items
+        )
+    )
+
+
+@router.post("/upload-archive", response_model=ResponseModel[ArchiveUploadResult])
+async def upload_archive(
+    file: UploadFile = File(...),
+    session_id: str = Form(...),
+    exclude: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    上传压缩包（zip / tar.gz）并导入其中的代码文件
+    
+    Args:
+        file: 压缩包
+        session_id: 会话ID
+        exclude: 额外的排除规则（.gitignore 格式，每行一条）
+    
+    Returns:
+        导入的文件和跳过的成员
+    """
+    try:
+        result = await archive_service.extract_archive(
+            db=db,
+            upload_file=file,
+            session_id=session_id,
+            exclude=exclude
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"批量上传失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"压缩包上传失败: {str(e)}")
+    
+    return ResponseModel(
+        code=200,
+        message=f"成功导入 {len(result.files)} 个文件",
+        data=ArchiveUploadResult(
+            files=[FileResponse.model_validate(f) for f in result.files],
+            skipped=[ArchiveSkippedEntry(path=s.path, reason=s.reason) for s in result.skipped],
+            total_size=result.total_size,
+            truncated=result.truncated
+        )
+    )
 
 
 @router.get("/session/{session_id}", response_model=ResponseModel[FileList])
@@ -91,7 +158,7 @@ async def get_session_files(
     session_id: str,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取会话的所有文件
@@ -105,8 +172,8 @@ async def get_session_files(
         文件列表
     """
     try:
-        files = file_service.get_files_by_session(db, session_id, skip, limit)
-        total = file_service.get_file_count_by_session(db, session_id)
+        files = await file_service.get_files_by_session(db, session_id, skip, limit)
+        total = await file_service.get_file_count_by_session(db, session_id)
         
         return ResponseModel(
             code=200,
@@ -123,7 +190,7 @@ async def get_session_files(
 @router.get("/{file_id}", response_model=ResponseModel[FileResponse])
 async def get_file(
     file_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取单个文件信息
@@ -134,7 +201,7 @@ async def get_file(
     Returns:
         文件信息
     """
-    db_file = file_service.get_file(db, file_id)
+    db_file = await file_service.get_file(db, file_id)
     if not db_file:
         raise HTTPException(status_code=404, detail="文件不存在")
     
@@ -148,7 +215,7 @@ async def get_file(
 @router.get("/{file_id}/content", response_model=ResponseModel[dict])
 async def get_file_content(
     file_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取文件内容
@@ -159,7 +226,7 @@ async def get_file_content(
     Returns:
         文件内容
     """
-    content = file_service.get_file_content(db, file_id)
+    content = await file_service.get_file_content(db, file_id)
     if content is None:
         raise HTTPException(status_code=404, detail="文件不存在或无法读取")
     
@@ -170,10 +237,49 @@ async def get_file_content(
     )
 
 
+@router.get("/{file_id}/diff", response_model=ResponseModel[FileDiffResponse])
+async def get_file_diff(
+    file_id: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取文件与上一版本的行差异
+    
+    Args:
+        file_id: 文件ID
+    
+    Returns:
+        修改块列表
+    """
+    db_file = await file_service.get_file(db, file_id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if not db_file.parent_file_id:
+        raise HTTPException(status_code=404, detail="文件没有上一版本")
+    
+    try:
+        current, parent = await load_code_files(db, [file_id, db_file.parent_file_id])
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    diff = compute_diff(parent.code, current.code)
+    return ResponseModel(
+        code=200,
+        message="获取文件差异成功",
+        data=FileDiffResponse(
+            file_id=file_id,
+            parent_file_id=db_file.parent_file_id,
+            old_line_count=diff.old_line_count,
+            new_line_count=diff.new_line_count,
+            hunks=[FileDiffHunk(**hunk.model_dump()) for hunk in diff.hunks]
+        )
+    )
+
+
 @router.delete("/{file_id}", response_model=ResponseModel)
 async def delete_file(
     file_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     删除文件
@@ -184,7 +290,7 @@ async def delete_file(
     Returns:
         删除结果
     """
-    success = file_service.delete_file(db, file_id)
+    success = await file_service.delete_file(db, file_id)
     if not success:
         raise HTTPException(status_code=404, detail="文件不存在")
     
@@ -198,7 +304,7 @@ async def delete_file(
 @router.delete("/session/{session_id}", response_model=ResponseModel)
 async def delete_session_files(
     session_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     删除会话的所有文件
@@ -210,7 +316,7 @@ async def delete_session_files(
         删除结果
     """
     try:
-        file_service.delete_session_files(db, session_id)
+        await file_service.delete_session_files(db, session_id)
         return ResponseModel(
             code=200,
             message="会话文件删除成功",
@@ -4,6 +4,9 @@
 from fastapi import APIRouter
 from datetime import datetime
 from app.schemas.common import ResponseModel
+from app.services.analysis_cache import get_analysis_cache
+from app.services.llm_usage import llm_usage
+from app.services.response_cache import get_response_cache
 
 router = APIRouter()
 
@@ -19,7 +22,10 @@ async def health_check():
         data={
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
-            "service": "AI Code Review Assistant"
+            "service": "AI Code Review Assistant",
+            "analysis_cache": get_analysis_cache().stats(),
+            "response_cache": get_response_cache().stats(),
+            "llm_usage": llm_usage.stats()
         }
     )
 
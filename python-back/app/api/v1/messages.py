@@ -1,12 +1,15 @@
 """
 消息管理API
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.db.database import get_db
-from app.models.message import Message
-from app.schemas.message import MessageCreate, MessageResponse
+from app.db.database import get_async_db
+from app.models.message import Message, MessageRole
+from app.schemas.message import MessageCreate, MessageResponse, MessageSummary
+from app.services.instruction_parser import dump_instructions, parse_instructions
+from app.services.message_service import ContentMode, get_messages_page
 from app.core.response import success_response
 from pydantic import BaseModel
 from typing import Optional
@@ -23,7 +26,7 @@ class MessageUpdate(BaseModel):
 @router.post("/", response_model=dict)
 async def create_message(
     message: MessageCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建消息"""
     try:
@@ -39,48 +42,79 @@ async def create_message(
             content=message.content
         )
         db.add(db_message)
-        db.commit()
-        db.refresh(db_message)
+        await db.commit()
+        await db.refresh(db_message)
         
         return success_response(
             data=MessageResponse.model_validate(db_message),
             message="消息创建成功"
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/session/{session_id}", response_model=dict)
 async def get_session_messages(
     session_id: str,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=200, description="每页条数，不传时返回全部消息"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc：从旧到新；desc：从新到旧"),
+    content_mode: ContentMode = Query(ContentMode.FULL, description="full：完整内容；truncated：内容预览；none：只返回元数据"),
+    preview_length: int = Query(200, ge=1, le=10000, description="truncated 模式下保留的字符数"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取会话的所有消息"""
+    """
+    获取会话的消息
+    
+    传入 limit 时按 (created_at, id) 游标分页，响应中的 next_cursor 用于获取下一页；
+    truncated / none 模式只返回内容预览或元数据，完整内容通过 GET /messages/{message_id} 获取。
+    """
     try:
-        messages = db.query(Message).filter(
-            Message.session_id == session_id
-        ).order_by(Message.created_at.asc()).all()
-        
-        return success_response(
-            data={
-                "items": [MessageResponse.model_validate(msg) for msg in messages],
-                "total": len(messages)
-            },
-            message="获取消息列表成功"
+        page = await get_messages_page(
+            db,
+            session_id,
+            limit=limit,
+            cursor=cursor,
+            order=order,
+            content_mode=content_mode,
+            preview_length=preview_length
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if content_mode == ContentMode.FULL:
+        items = [MessageResponse.model_validate(row) for row in page.rows]
+    else:
+        items = [
+            MessageSummary(
+                **row,
+                truncated=row["content"] is not None and row["content_length"] > len(row["content"])
+            )
+            for row in page.rows
+        ]
+    
+    return success_response(
+        data={
+            "items": items,
+            "total": page.total,
+            "next_cursor": page.next_cursor,
+            "has_more": page.next_cursor is not None
+        },
+        message="获取消息列表成功"
+    )
 
 
 @router.get("/{message_id}", response_model=dict)
 async def get_message(
     message_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取单个消息"""
     try:
-        message = db.query(Message).filter(Message.message_id == message_id).first()
+        message = await db.scalar(select(Message).where(Message.message_id == message_id))
         if not message:
             raise HTTPException(status_code=404, detail="消息不存在")
         
@@ -98,22 +132,25 @@ async def get_message(
 async def update_message(
     message_id: str,
     update_data: MessageUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新消息内容（用于保存中断时的部分内容）"""
     try:
-        message = db.query(Message).filter(Message.message_id == message_id).first()
+        message = await db.scalar(select(Message).where(Message.message_id == message_id))
         if not message:
             raise HTTPException(status_code=404, detail="消息不存在")
         
         # 更新字段
         if update_data.content is not None:
             message.content = update_data.content
+            # 内容变化后重新解析修改指令（原文件行数未知，只校验字段）
+            if message.role == MessageRole.ASSISTANT:
+                message.instructions = dump_instructions(parse_instructions(message.content))
         if update_data.thinking_process is not None:
             message.thinking_process = update_data.thinking_process
         
-        db.commit()
-        db.refresh(message)
+        await db.commit()
+        await db.refresh(message)
         
         return success_response(
             data=MessageResponse.model_validate(message),
@@ -122,28 +159,28 @@ async def update_message(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/{message_id}", response_model=dict)
 async def delete_message(
     message_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除消息"""
     try:
-        message = db.query(Message).filter(Message.message_id == message_id).first()
+        message = await db.scalar(select(Message).where(Message.message_id == message_id))
         if not message:
             raise HTTPException(status_code=404, detail="消息不存在")
         
-        db.delete(message)
-        db.commit()
+        await db.delete(message)
+        await db.commit()
         
         return success_response(message="消息删除成功")
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
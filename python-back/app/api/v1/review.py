@@ -2,120 +2,69 @@
 代码审查API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.db.database import get_db
-from app.models.file import File
-from app.models.message import Message
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
 from app.schemas.review import (
     CodeReviewRequest,
     MultiFileReviewRequest,
     CodeReviewResponse
 )
 from app.services.review_chain import review_chain
+from app.services.review_jobs import FINISHED_STATUSES, ReviewJob, ReviewJobStatus, review_job_queue
+from app.services.review_service import (
+    load_review_files,
+    review_file,
+    save_review_message,
+    validate_review_files,
+)
 from app.core.response import success_response
-import os
 
 router = APIRouter()
 
 
-def _get_language_from_filename(filename: str) -> str:
-    """从文件名获取编程语言"""
-    ext_map = {
-        '.py': 'python',
-        '.js': 'javascript',
-        '.jsx': 'javascript',
-        '.ts': 'typescript',
-        '.tsx': 'typescript',
-        '.java': 'java',
-        '.go': 'go',
-        '.cpp': 'cpp',
-        '.c': 'c',
-        '.h': 'c',
-        '.hpp': 'cpp',
-        '.rs': 'rust',
-        '.rb': 'ruby',
-        '.php': 'php',
-        '.swift': 'swift',
-        '.kt': 'kotlin',
-        '.vue': 'vue',
-        '.html': 'html',
-        '.css': 'css',
-        '.scss': 'scss',
-        '.less': 'less'
-    }
-    
-    ext = os.path.splitext(filename)[1].lower()
-    return ext_map.get(ext, 'plaintext')
-
-
 @router.post("/single", response_model=dict)
 async def review_single_file(
     request: CodeReviewRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """审查单个文件"""
     try:
-        # 获取文件信息
-        file = db.query(File).filter(File.file_id == request.file_id).first()
-        if not file:
-            raise HTTPException(status_code=404, detail="文件不存在")
-        
-        # 读取文件内容（使用 filepath 字段）
-        file_path = file.filepath
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="文件内容不存在")
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_content = f.read()
-        
-        # 执行代码审查
-        language = _get_language_from_filename(file.filename)
-        review_result = await review_chain.review_code(
-            code=code_content,
-            filename=file.filename,
-            language=language,
-            user_question=request.user_question
+        # 执行代码审查（文件有已审查的上一版本时只审查修改部分）
+        review_result, line_count = await review_file(
+            db, request.file_id, request.user_question, incremental=request.incremental
         )
 
         # 保存审查结果为AI消息
-        import uuid
-        message_id = f"msg_{uuid.uuid4().hex[:16]}"
-
-        ai_message = Message(
-            message_id=message_id,
-            session_id=request.session_id,
-            role='assistant',
-            content=review_result
-        )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
+        ai_message = await save_review_message(db, request.session_id, review_result, line_count=line_count)
         
         return success_response(
             data={
                 "session_id": request.session_id,
                 "review_result": review_result,
-                "message_id": ai_message.message_id
+                "message_id": ai_message.message_id,
+                "instructions": ai_message.instructions
             },
             message="代码审查完成"
         )
         
     except HTTPException:
         raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except ConnectionError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=503,
             detail=f"无法连接到 OpenAI API。请检查网络连接和 API 配置。\n详细错误: {str(e)}"
         )
     except ValueError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=401,
             detail=f"OpenAI API 认证失败。请检查 OPENAI_API_KEY 配置。\n详细错误: {str(e)}"
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         error_msg = str(e)
         print(f"代码审查失败: {error_msg}")
         raise HTTPException(
@@ -127,30 +76,12 @@ async def review_single_file(
 @router.post("/multiple", response_model=dict)
 async def review_multiple_files(
     request: MultiFileReviewRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """审查多个文件"""
     try:
-        # 获取所有文件信息
-        files_data = []
-        for file_id in request.file_ids:
-            file = db.query(File).filter(File.file_id == file_id).first()
-            if not file:
-                raise HTTPException(status_code=404, detail=f"文件不存在: {file_id}")
-            
-            # 读取文件内容（使用 filepath 字段）
-            file_path = file.filepath
-            if not os.path.exists(file_path):
-                raise HTTPException(status_code=404, detail=f"文件内容不存在: {file.filename}")
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                code_content = f.read()
-            
-            files_data.append({
-                'filename': file.filename,
-                'code': code_content,
-                'language': _get_language_from_filename(file.filename)
-            })
+        # 获取并读取所有文件
+        files_data = await load_review_files(db, request.file_ids)
         
         # 执行多文件代码审查
         review_result = await review_chain.review_multiple_files(
@@ -159,18 +90,7 @@ async def review_multiple_files(
         )
 
         # 保存审查结果为AI消息
-        import uuid
-        message_id = f"msg_{uuid.uuid4().hex[:16]}"
-
-        ai_message = Message(
-            message_id=message_id,
-            session_id=request.session_id,
-            role='assistant',
-            content=review_result
-        )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
+        ai_message = await save_review_message(db, request.session_id, review_result)
         
         return success_response(
             data={
@@ -183,20 +103,22 @@ async def review_multiple_files(
         
     except HTTPException:
         raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except ConnectionError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=503,
             detail=f"无法连接到 OpenAI API。请检查网络连接和 API 配置。\n详细错误: {str(e)}"
         )
     except ValueError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=401,
             detail=f"OpenAI API 认证失败。请检查 OPENAI_API_KEY 配置。\n详细错误: {str(e)}"
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         error_msg = str(e)
         print(f"多文件代码审查失败: {error_msg}")
         raise HTTPException(
@@ -204,3 +126,97 @@ async def review_multiple_files(
             detail=f"代码审查失败: {error_msg}"
         )
 
+
+# ==================== 后台审查任务 ====================
+
+def _job_data(job: ReviewJob) -> dict:
+    """任务状态（不含审查结果）"""
+    return job.model_dump(mode="json", exclude={"result"})
+
+
+def _get_job_or_404(job_id: str) -> ReviewJob:
+    job = review_job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="审查任务不存在")
+    return job
+
+
+@router.post("/jobs/single", response_model=dict)
+async def submit_single_review_job(
+    request: CodeReviewRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """提交单文件审查任务，立即返回任务ID"""
+    try:
+        await validate_review_files(db, [request.file_id])
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    job = review_job_queue.submit(
+        kind="single",
+        session_id=request.session_id,
+        file_ids=[request.file_id],
+        user_question=request.user_question,
+        incremental=request.incremental
+    )
+    return success_response(data=_job_data(job), message="审查任务已提交")
+
+
+@router.post("/jobs/multiple", response_model=dict)
+async def submit_multiple_review_job(
+    request: MultiFileReviewRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """提交多文件审查任务，立即返回任务ID"""
+    try:
+        await validate_review_files(db, request.file_ids)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    job = review_job_queue.submit(
+        kind="multiple",
+        session_id=request.session_id,
+        file_ids=request.file_ids,
+        user_question=request.user_question
+    )
+    return success_response(data=_job_data(job), message="审查任务已提交")
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_review_job(job_id: str):
+    """查询审查任务状态和进度"""
+    job = _get_job_or_404(job_id)
+    return success_response(data=_job_data(job), message="获取任务状态成功")
+
+
+@router.get("/jobs/{job_id}/result", response_model=dict)
+async def get_review_job_result(job_id: str):
+    """获取审查任务结果"""
+    job = _get_job_or_404(job_id)
+    if job.status == ReviewJobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=f"代码审查失败: {job.error}")
+    if job.status != ReviewJobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"审查任务尚未完成（当前状态: {job.status.value}）")
+    
+    return success_response(
+        data={
+            "session_id": job.session_id,
+            "review_result": job.result,
+            "message_id": job.message_id
+        },
+        message="代码审查完成"
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=dict)
+async def cancel_review_job(job_id: str):
+    """取消审查任务"""
+    _get_job_or_404(job_id)
+    job = await review_job_queue.cancel(job_id)
+    if job.status == ReviewJobStatus.CANCELLED:
+        message = "审查任务已取消"
+    elif job.status in FINISHED_STATUSES:
+        message = "审查任务已结束，无法取消"
+    else:
+        message = "已请求取消审查任务"
+    return success_response(data=_job_data(job), message=message)
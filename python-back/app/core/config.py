@@ -23,6 +23,19 @@ class Settings(BaseSettings):
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./app.db"
+    # SQLite 连接参数（每个连接建立时通过 PRAGMA 设置，留空表示不设置）
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL 模式下读写互不阻塞
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL 模式下 NORMAL 不会损坏数据库，只在掉电时可能丢失最近的事务
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 数据库被锁定时等待的时间（毫秒），避免立即报 database is locked
+    SQLITE_MMAP_SIZE: int = 268435456  # 内存映射读取的字节数（256MB），0 表示不使用
+    SQLITE_CACHE_SIZE: int = -64000  # 页缓存大小，负数表示 KiB（64MB）
+    SQLITE_TEMP_STORE: str = "MEMORY"  # 临时表和索引存放在内存中
+    # 连接池配置
+    DB_POOL_SIZE: int = 5  # 连接池常驻连接数
+    DB_MAX_OVERFLOW: int = 10  # 连接池满时允许额外创建的连接数
+    DB_POOL_TIMEOUT: float = 30.0  # 等待空闲连接的超时（秒）
+    DB_POOL_RECYCLE: int = 1800  # 连接最长使用时间（秒），超过后重建（仅 PostgreSQL 等服务端数据库）
+    DB_POOL_PRE_PING: bool = True  # 取出连接前检测是否可用（仅 PostgreSQL 等服务端数据库）
     
     # OpenAI配置（Day 3集成AI时配置）
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
@@ -30,6 +43,7 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_TEMPERATURE: float = 0.2
     OPENAI_MAX_TOKENS: int = 8000
+    OPENAI_STREAM_USAGE: bool = True  # 流式响应中请求 token 用量（不支持 stream_options 的兼容接口需关闭）
     
     # CORS配置
     BACKEND_CORS_ORIGINS: List[str] = [
@@ -51,8 +65,15 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
     UPLOAD_DIR: str = "./uploads"
     ALLOWED_EXTENSIONS: List[str] = [".py", ".js", ".jsx", ".ts", ".tsx", ".vue", ".java", ".go", ".cpp", ".c", ".h", ".hpp", ".cs", ".php", ".rb", ".swift", ".kt"]
+    UPLOAD_FALLBACK_ENCODINGS: List[str] = ["gb18030"]  # 文件不是 UTF-8 时依次尝试的编码
+    BULK_UPLOAD_CONCURRENCY: int = 8  # 批量上传时同时写入的文件数
+    ARCHIVE_MAX_UPLOAD_SIZE: int = 52428800  # 压缩包本身的大小上限（50MB）
+    ARCHIVE_MAX_TOTAL_SIZE: int = 209715200  # 压缩包解压后导入文件的总大小上限（200MB）
+    ARCHIVE_MAX_FILES: int = 2000  # 单个压缩包最多导入的文件数
+    CODE_CONTEXT_CACHE_CHARS: int = 8000000  # 文件内容内存缓存上限（字符数），0 表示不缓存
+    ARCHIVE_EXCLUDE_PATTERNS: List[str] = [".git/", "node_modules/", "__pycache__/", ".venv/", "venv/", "dist/", "build/"]  # 默认排除规则（.gitignore 格式）
     
-    @field_validator("ALLOWED_EXTENSIONS", mode="before")
+    @field_validator("ALLOWED_EXTENSIONS", "UPLOAD_FALLBACK_ENCODINGS", "ARCHIVE_EXCLUDE_PATTERNS", mode="before")
     @classmethod
     def parse_allowed_extensions(cls, v: Any) -> List[str]:
         """解析允许的文件扩展名"""
@@ -60,9 +81,51 @@ class Settings(BaseSettings):
             return json.loads(v)
         return v
     
+    # 静态分析配置
+    PYLINT_POOL_SIZE: int = 2  # Pylint 常驻工作进程数
+    PYLINT_JOB_TIMEOUT: float = 10.0  # 单次 Pylint 分析超时（秒，从工作进程开始执行时计时）
+    PYLINT_MAX_JOBS_PER_WORKER: int = 100  # 工作进程处理多少任务后回收重建
+
+    # 代码审查配置
+    REVIEW_MODE: str = "agent"  # agent：由 Agent 调用工具；pipeline：本地并行预分析后单次调用 LLM
+    REVIEW_MAX_CONCURRENCY: int = 4  # 多文件审查时同时审查的最大文件数
+    REVIEW_FILE_TIMEOUT: float = 300.0  # 单个文件审查超时（秒）
+    REVIEW_CHUNK_MAX_TOKENS: int = 6000  # 单次审查的代码 token 预算，超出时按函数/类边界分块审查
+    REVIEW_MAX_CHUNKS: int = 50  # 单个文件最多审查的分块数
+    REVIEW_INCREMENTAL_CONTEXT_LINES: int = 5  # 增量审查时修改块前后附带的上下文行数
+    REVIEW_INCREMENTAL_MAX_CHANGE_RATIO: float = 0.5  # 修改行数超过新版本行数的该比例时改为完整审查
+    REVIEW_JOB_CONCURRENCY: int = 2  # 后台审查任务的并发数
+    REVIEW_JOB_MAX_HISTORY: int = 1000  # 内存中最多保留的审查任务数
+
+    # 分析结果缓存配置
+    ANALYSIS_CACHE_ENABLED: bool = True
+    ANALYSIS_CACHE_MEMORY_BYTES: int = 67108864  # 内存层上限 64MB
+    ANALYSIS_CACHE_DB_PATH: Optional[str] = None  # SQLite 磁盘层路径，例如 ./cache/analysis.db
+    ANALYSIS_CACHE_DB_MAX_BYTES: int = 536870912  # 磁盘层上限 512MB
+
+    # LLM 响应缓存配置（相同模型、提示词、代码和问题直接返回缓存的回复）
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_DB_PATH: str = "./cache/responses.db"
+    RESPONSE_CACHE_TTL: float = 86400.0  # 条目有效期（秒）
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000  # 最多保留的条目数，超出时淘汰最久未访问的条目
+
+    # 流式响应配置
+    SSE_FLUSH_INTERVAL_MS: int = 20  # 增量合并为一帧的最长等待时间（毫秒），0 表示到达即发送
+    SSE_FLUSH_MAX_BYTES: int = 512  # 单帧缓冲超过该字节数立即发送
+    STREAM_CHECKPOINT_TOKENS: int = 1000  # 流式生成时每累积多少个增量写入一次消息检查点
+    STREAM_CHECKPOINT_INTERVAL_MS: int = 5000  # 消息检查点最长写入间隔（毫秒）
+    STREAM_BUFFER_MAX_EVENTS: int = 1000  # 每条消息用于断线重连的事件缓冲大小
+    STREAM_BUFFER_TTL: float = 300.0  # 生成结束后事件缓冲保留时间（秒）
+    STREAM_RESUME_TIMEOUT: float = 60.0  # 没有客户端连接时继续生成的最长时间（秒）
+    
     # 会话配置
     SESSION_EXPIRE_MINUTES: int = 60
     MAX_SESSIONS_PER_USER: int = 100
+    CHAT_HISTORY_MAX_TOKENS: int = 4000  # 对话时附带的历史消息 token 预算，0 表示不带历史
+    CHAT_HISTORY_MAX_MESSAGES: int = 50  # 对话时最多附带的历史消息数
+    CHAT_SUMMARY_ENABLED: bool = True  # 是否在后台把超出预算的历史合并为会话摘要
+    CHAT_SUMMARY_MIN_TOKENS: int = 1000  # 移出历史窗口的内容累计超过该 token 数才更新摘要
+    CHAT_SUMMARY_MAX_CHARS: int = 1500  # 会话摘要的最大字数
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
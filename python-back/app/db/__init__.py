@@ -1,7 +1,27 @@
 """
 数据库模块
 """
-from app.db.database import Base, engine, SessionLocal, get_db, init_db
+from app.db.database import (
+    Base,
+    engine,
+    SessionLocal,
+    get_db,
+    async_engine,
+    AsyncSessionLocal,
+    get_async_db,
+    init_db,
+    run_migrations,
+)
 
-__all__ = ["Base", "engine", "SessionLocal", "get_db", "init_db"]
+__all__ = [
+    "Base",
+    "engine",
+    "SessionLocal",
+    "get_db",
+    "async_engine",
+    "AsyncSessionLocal",
+    "get_async_db",
+    "init_db",
+    "run_migrations",
+]
 
@@ -1,20 +1,123 @@
 """
 数据库连接和会话管理
 """
-from sqlalchemy import create_engine
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
+# python-back 目录（alembic.ini 所在目录）
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def is_sqlite_url(database_url: str) -> bool:
+    """是否为 SQLite 数据库"""
+    return database_url.partition("://")[0].split("+")[0] == "sqlite"
+
+
+def get_engine_options(database_url: str, is_async: bool = False) -> dict:
+    """
+    根据数据库类型生成引擎参数
+
+    SQLite 内存数据库使用默认连接池；文件数据库和 PostgreSQL 使用配置的连接池大小，
+    PostgreSQL 额外启用 pre_ping 和连接回收，避免使用被服务端关闭的连接。
+
+    Args:
+        database_url: 数据库 URL
+        is_async: 是否用于异步引擎
+    """
+    options = {}
+    if is_sqlite_url(database_url):
+        if not is_async:
+            options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in database_url or database_url.rstrip("/").endswith("sqlite:"):
+            return options
+    else:
+        options["pool_pre_ping"] = settings.DB_POOL_PRE_PING
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE
+
+    options["pool_size"] = settings.DB_POOL_SIZE
+    options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    return options
+
+
+def get_sqlite_pragmas() -> list:
+    """按配置生成连接建立时执行的 PRAGMA 语句"""
+    pragmas = [
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE),
+        ("cache_size", settings.SQLITE_CACHE_SIZE),
+        ("temp_store", settings.SQLITE_TEMP_STORE),
+    ]
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas if value not in (None, "")]
+
+
+def register_sqlite_pragmas(sync_engine: Engine) -> None:
+    """
+    在每个 SQLite 连接建立时设置 PRAGMA（异步引擎传入 async_engine.sync_engine）
+    """
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in get_sqlite_pragmas():
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
 # 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = create_engine(settings.DATABASE_URL, **get_engine_options(settings.DATABASE_URL))
+register_sqlite_pragmas(engine)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    把同步数据库 URL 转换为对应的异步驱动 URL
+
+    sqlite -> sqlite+aiosqlite，postgresql -> postgresql+asyncpg，
+    已指定异步驱动的 URL 保持不变。
+    """
+    scheme, sep, rest = database_url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return database_url
+
+
+# 创建异步数据库引擎（请求路径上的数据库 I/O 不阻塞事件循环）
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL),
+    **get_engine_options(settings.DATABASE_URL, is_async=True)
+)
+register_sqlite_pragmas(async_engine.sync_engine)
+
+# 创建异步会话工厂（提交后不过期对象，避免提交后访问属性时触发隐式 I/O）
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -30,10 +133,49 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    获取异步数据库会话的依赖注入函数
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """
-    初始化数据库（创建所有表）
+    初始化数据库（执行 Alembic 迁移到最新版本）
     """
-    from app.models import session, message, file  # noqa
-    Base.metadata.create_all(bind=engine)
+    run_migrations()
 
+
+def get_alembic_config(database_url: Optional[str] = None) -> Config:
+    """
+    获取 Alembic 配置
+
+    Args:
+        database_url: 数据库 URL，默认取 DATABASE_URL
+    """
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    config.set_main_option("sqlalchemy.url", database_url or settings.DATABASE_URL)
+    # 应用内执行迁移时不覆盖应用的日志配置
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def run_migrations(database_url: Optional[str] = None) -> None:
+    """
+    把数据库升级到最新版本
+
+    引入 Alembic 之前由 create_all 创建的数据库没有版本表，先标记为初始版本再升级
+    （后续迁移会跳过已经存在的列和索引）。
+    """
+    config = get_alembic_config(database_url)
+    target_engine = create_engine(config.get_main_option("sqlalchemy.url"))
+    try:
+        inspector = inspect(target_engine)
+        if inspector.has_table("sessions") and not inspector.has_table("alembic_version"):
+            command.stamp(config, "0001_baseline")
+    finally:
+        target_engine.dispose()
+    command.upgrade(config, "head")
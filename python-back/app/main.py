@@ -2,11 +2,18 @@
 FastAPI主应用
 """
 from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
 from app.core.config import settings
 from app.api.v1 import api_router
-from app.db.database import init_db
+from app.db.database import async_engine, init_db
+from app.services.conversation_memory import conversation_summarizer
+from app.services.review_jobs import review_job_queue
+from app.services.stream_manager import stream_manager
+from app.utils.pylint_pool import get_pylint_pool
 
 
 @asynccontextmanager
@@ -26,9 +33,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"❌ 数据库初始化失败: {e}")
     
+    # 预热 Pylint 工作进程池
+    pylint_pool = get_pylint_pool()
+    if pylint_pool.is_available():
+        pylint_pool.start()
+        print(f"✅ Pylint 工作进程池已启动（{pylint_pool.size} 个进程）")
+    
     yield
     
     # 关闭时执行
+    await stream_manager.shutdown()
+    await conversation_summarizer.shutdown()
+    await review_job_queue.shutdown()
+    pylint_pool.shutdown()
+    await async_engine.dispose()
     print(f"👋 Shutting down {settings.PROJECT_NAME}")
 
 
@@ -42,6 +60,55 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# multipart 表单除文件内容外的开销（边界、表单字段等）
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    根据 Content-Length 提前拒绝超大的上传请求
+
+    Starlette 在进入路由前会把整个 multipart 请求体写入临时文件，
+    这里在读取请求体之前就返回 413，避免接收明显超限的文件。
+    只检查两个上传接口，其他请求（包括 SSE 流式响应）直接交给下游，不做包装。
+
+    分块传输的请求没有 Content-Length，这里无法拦截；
+    真正的大小限制由流式写入时的 max_size 检查保证，这里只是提前拒绝。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = self._upload_limit(scope)
+        if limit is not None:
+            content_length = Headers(scope=scope).get("content-length")
+            if content_length and content_length.isdigit() \
+                    and int(content_length) > limit + UPLOAD_FORM_OVERHEAD:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"文件大小超过限制: {limit} 字节"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _upload_limit(scope) -> Optional[int]:
+        """返回上传接口的大小限制，其他请求返回 None"""
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return None
+        path = scope["path"]
+        if path.endswith("/files/upload"):
+            return settings.MAX_UPLOAD_SIZE
+        if path.endswith("/files/upload-archive"):
+            return settings.ARCHIVE_MAX_UPLOAD_SIZE
+        return None
+
+
+# 先注册的中间件在内层，放在 CORS 之内使 413 响应也带有 CORS 头
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
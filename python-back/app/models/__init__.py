@@ -4,6 +4,7 @@
 from app.models.session import Session
 from app.models.message import Message
 from app.models.file import File
+from app.models.blob import Blob
 
-__all__ = ["Session", "Message", "File"]
+__all__ = ["Session", "Message", "File", "Blob"]
 
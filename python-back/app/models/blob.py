@@ -0,0 +1,21 @@
+"""
+文件内容块模型
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from app.db.database import Base
+
+
+class Blob(Base):
+    """按 sha256 寻址的文件内容，内容相同的上传共享同一份存储"""
+    
+    __tablename__ = "blobs"
+    
+    sha256 = Column(String(64), primary_key=True, comment="内容的 sha256 哈希")
+    size = Column(Integer, nullable=False, default=0, comment="内容大小（字节）")
+    path = Column(String(500), nullable=False, comment="存储路径")
+    refcount = Column(Integer, nullable=False, default=0, comment="引用该内容的文件数")
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="创建时间")
+    
+    def __repr__(self):
+        return f"<Blob(sha256={self.sha256}, size={self.size}, refcount={self.refcount})>"
@@ -2,7 +2,7 @@
 文件模型
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -11,6 +11,10 @@ class File(Base):
     """文件模型"""
     
     __tablename__ = "files"
+    __table_args__ = (
+        # 按会话列出文件（按创建时间排序）
+        Index("ix_files_session_created", "session_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     file_id = Column(String(50), unique=True, index=True, nullable=False, comment="文件唯一标识")
@@ -19,7 +23,11 @@ class File(Base):
     filepath = Column(String(500), nullable=False, comment="文件路径")
     file_type = Column(String(20), nullable=True, comment="文件类型")
     file_size = Column(Integer, nullable=False, default=0, comment="文件大小（字节）")
-    content = Column(Text, nullable=True, comment="文件内容")
+    blob_hash = Column(String(64), index=True, nullable=True, comment="内容块 sha256（指向 blobs 表）")
+    encoding = Column(String(20), nullable=True, comment="文本编码（上传时识别）")
+    content = Column(Text, nullable=True, comment="文件内容（旧数据，新上传的文件不再保存）")
+    parent_file_id = Column(String(50), index=True, nullable=True, comment="上一版本的文件ID")
+    review_result = Column(Text, nullable=True, comment="最近一次单文件审查结果（供下一版本增量审查）")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="创建时间")
     
     # 关系
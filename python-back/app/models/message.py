@@ -2,7 +2,7 @@
 消息模型
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, JSON, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from enum import Enum
 from app.db.database import Base
@@ -19,6 +19,10 @@ class Message(Base):
     """消息模型"""
     
     __tablename__ = "messages"
+    __table_args__ = (
+        # 按会话分页查询消息（keyset 分页按 created_at, id 排序）
+        Index("ix_messages_session_created_id", "session_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     message_id = Column(String(50), unique=True, index=True, nullable=False, comment="消息唯一标识")
@@ -26,6 +30,7 @@ class Message(Base):
     role = Column(SQLEnum(MessageRole), nullable=False, comment="消息角色")
     content = Column(Text, nullable=False, comment="消息内容")
     thinking_process = Column(Text, nullable=True, comment="AI思考过程")
+    instructions = Column(JSON, nullable=True, comment="结构化修改指令（服务端解析并校验）")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="创建时间")
     
     # 关系
@@ -2,7 +2,7 @@
 会话模型
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -16,6 +16,7 @@ class Session(Base):
     session_id = Column(String(50), unique=True, index=True, nullable=False, comment="会话唯一标识")
     title = Column(String(200), nullable=False, default="新对话", comment="会话标题")
     summary = Column(Text, nullable=True, comment="会话摘要")
+    summary_until_id = Column(Integer, nullable=True, comment="摘要已覆盖到的最后一条消息（messages.id）")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, comment="更新时间")
     
@@ -26,3 +27,6 @@ class Session(Base):
     def __repr__(self):
         return f"<Session(id={self.id}, session_id={self.session_id}, title={self.title})>"
 
+
+# 会话列表按更新时间倒序
+Index("ix_sessions_updated_at", Session.updated_at.desc())
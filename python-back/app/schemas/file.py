@@ -24,6 +24,9 @@ class FileResponse(FileBase):
     filepath: str
     file_type: Optional[str] = None
     file_size: int
+    blob_hash: Optional[str] = None
+    encoding: Optional[str] = None
+    parent_file_id: Optional[str] = None
     content: Optional[str] = None
     created_at: datetime
     
@@ -31,6 +34,54 @@ class FileResponse(FileBase):
         from_attributes = True
 
 
+class BatchUploadItem(BaseModel):
+    """批量上传中单个文件的结果"""
+    filename: str = Field(..., description="文件名")
+    success: bool = Field(..., description="是否上传成功")
+    file: Optional[FileResponse] = Field(None, description="文件信息（成功时）")
+    error: Optional[str] = Field(None, description="失败原因")
+
+
+class BatchUploadResult(BaseModel):
+    """批量上传结果"""
+    total: int = Field(..., description="文件总数")
+    succeeded: int = Field(..., description="成功数")
+    failed: int = Field(..., description="失败数")
+    items: List[BatchUploadItem] = Field(..., description="与上传顺序一致的结果")
+
+
+class ArchiveSkippedEntry(BaseModel):
+    """压缩包中未导入的成员"""
+    path: str = Field(..., description="成员路径")
+    reason: str = Field(..., description="跳过原因")
+
+
+class ArchiveUploadResult(BaseModel):
+    """压缩包上传结果"""
+    files: List[FileResponse] = Field(..., description="导入的文件")
+    skipped: List[ArchiveSkippedEntry] = Field(..., description="跳过的成员（被排除规则忽略的不列出）")
+    total_size: int = Field(..., description="导入的文件总大小（字节）")
+    truncated: bool = Field(..., description="是否因数量或总大小限制提前停止")
+
+
+class FileDiffHunk(BaseModel):
+    """修改块（行号从 1 开始；一侧没有内容时 end = start - 1）"""
+    tag: str = Field(..., description="修改类型：replace / insert / delete")
+    old_start: int = Field(..., description="上一版本起始行号")
+    old_end: int = Field(..., description="上一版本结束行号（包含）")
+    new_start: int = Field(..., description="当前版本起始行号")
+    new_end: int = Field(..., description="当前版本结束行号（包含）")
+
+
+class FileDiffResponse(BaseModel):
+    """文件与上一版本的差异"""
+    file_id: str = Field(..., description="文件ID")
+    parent_file_id: str = Field(..., description="上一版本的文件ID")
+    old_line_count: int = Field(..., description="上一版本行数")
+    new_line_count: int = Field(..., description="当前版本行数")
+    hunks: List[FileDiffHunk] = Field(..., description="修改块")
+
+
 class FileList(BaseModel):
     """文件列表模型"""
     total: int
@@ -2,7 +2,7 @@
 消息相关的Pydantic模型
 """
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from app.models.message import MessageRole
 
@@ -18,18 +18,42 @@ class MessageCreate(MessageBase):
     session_id: str = Field(..., description="会话ID")
 
 
+class InstructionResponse(BaseModel):
+    """结构化修改指令"""
+    number: int = Field(..., description="指令编号")
+    description: str = Field(..., description="修改描述")
+    type: Optional[str] = Field(None, description="操作类型：INSERT / REPLACE / DELETE")
+    start_line: Optional[int] = Field(None, description="起始行号（从 1 开始）")
+    end_line: Optional[int] = Field(None, description="结束行号（包含）")
+    content: str = Field("", description="代码内容")
+    valid: bool = Field(True, description="是否通过校验")
+    error: Optional[str] = Field(None, description="校验失败原因")
+
+
 class MessageResponse(MessageBase):
     """消息响应模型"""
     message_id: str
     session_id: str
     role: MessageRole
     thinking_process: str | None = None
+    instructions: Optional[List[InstructionResponse]] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
 
+class MessageSummary(BaseModel):
+    """消息摘要模型（截断或省略内容，完整内容通过 GET /messages/{message_id} 获取）"""
+    message_id: str
+    session_id: str
+    role: MessageRole
+    content: Optional[str] = Field(None, description="内容预览")
+    content_length: int = Field(0, description="完整内容的字符数")
+    truncated: bool = Field(False, description="内容是否被截断")
+    created_at: datetime
+
+
 class MessageList(BaseModel):
     """消息列表模型"""
     total: int
@@ -10,13 +10,15 @@ class CodeReviewRequest(BaseModel):
     session_id: str = Field(..., description="会话ID")
     file_id: str = Field(..., description="文件ID")
     user_question: Optional[str] = Field(None, description="用户提出的具体问题")
+    incremental: bool = Field(True, description="文件有已审查的上一版本时只审查修改部分")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "session_id": "session_123",
                 "file_id": "file_456",
-                "user_question": "这段代码有性能问题吗？"
+                "user_question": "这段代码有性能问题吗？",
+                "incremental": True
             }
         }
 
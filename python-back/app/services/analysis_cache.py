@@ -0,0 +1,311 @@
+"""
+静态分析结果缓存
+
+同一份代码会在 /review/single、/chat/stream 以及 Agent 重试中被反复分析。
+这里按 (代码, 工具名, 工具版本, 工具配置) 的哈希缓存工具输出：
+- 内存 LRU 层：按结果字节数淘汰
+- 可选的 SQLite 磁盘层：进程重启后仍可命中，按总字节数淘汰最久未访问的条目
+
+磁盘层命中时不立即写库，访问时间先记在内存中，随下一次写入一并提交；
+异步调用时磁盘层读写在线程池中执行，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+class AnalysisCache:
+    """内容寻址的分析结果缓存（内存 LRU + 可选 SQLite）"""
+
+    # 磁盘层条目的访问时间早于该秒数时才记录新的访问时间
+    TOUCH_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        db_path: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            max_memory_bytes: 内存层最大字节数
+            db_path: SQLite 文件路径，为空时不启用磁盘层
+            max_disk_bytes: 磁盘层最大字节数
+            enabled: 是否启用缓存
+        """
+        self.enabled = enabled
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.db_path = db_path
+
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        # 尚未写入磁盘层的访问时间 {key: last_access}
+        self._pending_touches: Dict[str, float] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if enabled and db_path:
+            self._open_db(db_path)
+
+    # ==================== 键 ====================
+
+    @staticmethod
+    def make_key(
+        code: str,
+        tool_name: str,
+        tool_version: str,
+        tool_config: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """计算缓存键：sha256(工具名, 工具版本, 工具配置, 代码)"""
+        digest = hashlib.sha256()
+        header = json.dumps(
+            [tool_name, tool_version, tool_config or {}],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        digest.update(header.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(code.encode("utf-8"))
+        return digest.hexdigest()
+
+    # ==================== 读写 ====================
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，先查内存层再查磁盘层"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+            value = self._disk_get(key)
+            if value is not None:
+                self.disk_hits += 1
+                self._memory_put(key, value)
+                return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存（同时写入内存层和磁盘层）"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._memory_put(key, value)
+            self._disk_put(key, value)
+
+    def get_or_compute(
+        self,
+        code: str,
+        tool_name: str,
+        tool_version: str,
+        tool_config: Optional[Dict[str, Any]],
+        compute: Callable[[], str]
+    ) -> str:
+        """
+        命中则直接返回缓存结果，否则执行 compute 并缓存
+
+        compute 抛出的异常不会被缓存，由调用方处理。
+        """
+        key = self.make_key(code, tool_name, tool_version, tool_config)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    async def aget_or_compute(
+        self,
+        code: str,
+        tool_name: str,
+        tool_version: str,
+        tool_config: Optional[Dict[str, Any]],
+        compute: Callable[[], Awaitable[str]]
+    ) -> str:
+        """get_or_compute 的异步版本（启用磁盘层时读写在线程池中执行）"""
+        key = self.make_key(code, tool_name, tool_version, tool_config)
+        if self._conn is None:
+            value = self.get(key)
+        else:
+            value = await asyncio.to_thread(self.get, key)
+        if value is None:
+            value = await compute()
+            if self._conn is None:
+                self.set(key, value)
+            else:
+                await asyncio.to_thread(self.set, key, value)
+        return value
+
+    def clear(self) -> None:
+        """清空所有缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._pending_touches.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM analysis_cache")
+                self._conn.commit()
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_enabled": self._conn is not None,
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    # ==================== 内存层 ====================
+
+    @staticmethod
+    def _sizeof(value: str) -> int:
+        return len(value.encode("utf-8"))
+
+    def _memory_put(self, key: str, value: str) -> None:
+        size = self._sizeof(value)
+        if size > self.max_memory_bytes:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= self._sizeof(old)
+
+        self._memory[key] = value
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self._sizeof(evicted)
+            self.evictions += 1
+
+    # ==================== 磁盘层 ====================
+
+    def _open_db(self, db_path: str) -> None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_analysis_cache_last_access ON analysis_cache (last_access)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()
+        self._disk_bytes = row[0]
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self._conn is None:
+            return None
+
+        row = self._conn.execute(
+            "SELECT value, last_access FROM analysis_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        # 只记录在内存中，随下一次写入提交
+        now = time.time()
+        if now - self._pending_touches.get(key, row[1]) >= self.TOUCH_INTERVAL:
+            self._pending_touches[key] = now
+        return row[0]
+
+    def _flush_touches(self) -> None:
+        """把暂存的访问时间写入磁盘层（由调用方提交）"""
+        if self._pending_touches:
+            self._conn.executemany(
+                "UPDATE analysis_cache SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self._pending_touches.items()]
+            )
+            self._pending_touches.clear()
+
+    def _disk_put(self, key: str, value: str) -> None:
+        if self._conn is None:
+            return
+
+        size = self._sizeof(value)
+        if size > self.max_disk_bytes:
+            return
+
+        self._flush_touches()
+        row = self._conn.execute("SELECT size FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._disk_bytes -= row[0]
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time())
+        )
+        self._disk_bytes += size
+
+        # 超出容量时按最久未访问的顺序淘汰
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM analysis_cache ORDER BY last_access ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for evicted_key, evicted_size in rows:
+                self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (evicted_key,))
+                self._disk_bytes -= evicted_size
+                self.evictions += 1
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+
+        self._conn.commit()
+
+
+_default_cache: Optional[AnalysisCache] = None
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """获取全局分析结果缓存（按配置懒加载）"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnalysisCache(
+            max_memory_bytes=settings.ANALYSIS_CACHE_MEMORY_BYTES,
+            db_path=settings.ANALYSIS_CACHE_DB_PATH,
+            max_disk_bytes=settings.ANALYSIS_CACHE_DB_MAX_BYTES,
+            enabled=settings.ANALYSIS_CACHE_ENABLED
+        )
+    return _default_cache
@@ -0,0 +1,234 @@
+"""
+压缩包上传
+
+接收 zip / tar.gz 压缩包，逐个成员流式解压并写入内容块存储，
+按 ALLOWED_EXTENSIONS、.gitignore 风格的排除规则以及单文件、总大小、文件数限制过滤，
+最后在一个事务中批量创建文件记录。压缩包本身不会整体读入内存，
+成员遍历在工作线程中进行，不阻塞事件循环。
+"""
+import asyncio
+import stat
+import tarfile
+import threading
+import zipfile
+from pathlib import PurePosixPath
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.file import File as FileModel
+from app.services import file_service
+from app.services.blob_store import remove_blob_file
+from app.utils.gitignore import GitIgnoreMatcher
+
+# 支持的压缩包格式
+ARCHIVE_SUFFIXES = {
+    ".zip": "zip",
+    ".tar.gz": "tar",
+    ".tgz": "tar",
+    ".tar": "tar",
+}
+
+# File.filename 列的长度
+MAX_PATH_LENGTH = 255
+
+
+class SkippedEntry(BaseModel):
+    """未导入的压缩包成员"""
+    path: str = Field(description="成员路径")
+    reason: str = Field(description="跳过原因")
+
+
+class ArchiveExtractResult(BaseModel):
+    """压缩包解压结果"""
+    files: List[FileModel] = Field(default_factory=list, description="创建的文件记录")
+    skipped: List[SkippedEntry] = Field(default_factory=list, description="跳过的成员")
+    total_size: int = Field(0, description="导入的文件总大小（字节）")
+    truncated: bool = Field(False, description="是否因数量或总大小限制提前停止")
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+def get_archive_format(filename: Optional[str]) -> Optional[str]:
+    """根据文件名判断压缩包格式，不支持时返回 None"""
+    name = (filename or "").lower()
+    for suffix, archive_format in ARCHIVE_SUFFIXES.items():
+        if name.endswith(suffix):
+            return archive_format
+    return None
+
+
+def normalize_member_path(name: str) -> Optional[str]:
+    """
+    规范化成员路径
+
+    Returns:
+        以 / 分隔的相对路径；绝对路径或包含 .. 的路径返回 None
+    """
+    name = name.replace("\\", "/")
+    path = PurePosixPath(name)
+    if path.is_absolute() or ".." in path.parts or (path.parts and ":" in path.parts[0]):
+        return None
+    parts = [part for part in path.parts if part not in ("", ".")]
+    return "/".join(parts) or None
+
+
+def _iter_zip(fileobj: BinaryIO) -> Iterator[Tuple[str, str, int, Optional[BinaryIO]]]:
+    """
+    遍历 zip 成员
+
+    Yields:
+        (成员路径, 类型, 声明大小, 内容流)，类型为 file / dir / other
+    """
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            mode = info.external_attr >> 16
+            if info.is_dir():
+                yield info.filename, "dir", 0, None
+            elif stat.S_ISLNK(mode):
+                yield info.filename, "other", 0, None
+            else:
+                with archive.open(info) as stream:
+                    yield info.filename, "file", info.file_size, stream
+
+
+def _iter_tar(fileobj: BinaryIO) -> Iterator[Tuple[str, str, int, Optional[BinaryIO]]]:
+    """遍历 tar 成员（流式模式，只顺序读取一遍）"""
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if member.isdir():
+                yield member.name, "dir", 0, None
+            elif member.isfile():
+                yield member.name, "file", member.size, archive.extractfile(member)
+            else:
+                # 符号链接、设备文件等不导入
+                yield member.name, "other", 0, None
+
+
+async def extract_archive(
+    db: AsyncSession,
+    upload_file: UploadFile,
+    session_id: str,
+    exclude: Optional[str] = None
+) -> ArchiveExtractResult:
+    """
+    流式解压压缩包并创建文件记录
+
+    Args:
+        db: 数据库会话
+        upload_file: 上传的压缩包
+        session_id: 会话ID
+        exclude: 额外的 .gitignore 格式排除规则（多行文本）
+
+    Returns:
+        解压结果
+
+    Raises:
+        ValueError: 不支持的压缩包格式或压缩包损坏
+    """
+    archive_format = get_archive_format(upload_file.filename)
+    if archive_format is None:
+        raise ValueError(f"不支持的压缩包格式: {upload_file.filename}")
+
+    matcher = GitIgnoreMatcher([*settings.ARCHIVE_EXCLUDE_PATTERNS, *(exclude or "").splitlines()])
+    iterate = _iter_zip if archive_format == "zip" else _iter_tar
+    result = ArchiveExtractResult()
+    entries: List[Tuple[str, file_service.IngestResult]] = []
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+
+    def skip(path: str, reason: str) -> None:
+        result.skipped.append(SkippedEntry(path=path, reason=reason))
+
+    def scan() -> None:
+        """
+        在工作线程中遍历成员
+
+        解压、读取成员头以及跳过被排除或过大的成员都在这里完成，不占用事件循环；
+        需要导入的成员交回事件循环写入内容块存储，写完后再继续遍历。
+        """
+        def check_stop() -> None:
+            if stop.is_set():
+                raise asyncio.CancelledError()
+
+        try:
+            for name, kind, declared_size, stream in iterate(upload_file.file):
+                check_stop()
+                if kind == "dir":
+                    continue
+                path = normalize_member_path(name)
+                if path is None:
+                    skip(name, "非法路径")
+                    continue
+                if kind != "file":
+                    skip(path, "不是普通文件")
+                    continue
+                if matcher.is_ignored(path):
+                    skip(path, "被排除规则忽略")
+                    continue
+                if not file_service.is_allowed_file(path):
+                    skip(path, "不支持的文件类型")
+                    continue
+                if len(path) > MAX_PATH_LENGTH:
+                    skip(path, "路径过长")
+                    continue
+                if declared_size > settings.MAX_UPLOAD_SIZE:
+                    skip(path, "文件大小超过限制")
+                    continue
+                if len(entries) >= settings.ARCHIVE_MAX_FILES:
+                    skip(path, "超过文件数量上限")
+                    result.truncated = True
+                    break
+
+                remaining = settings.ARCHIVE_MAX_TOTAL_SIZE - result.total_size
+                if declared_size > remaining:
+                    skip(path, "超过压缩包解压总大小上限")
+                    result.truncated = True
+                    break
+
+                # 实际写入时再次限制大小，防止成员头部声明的大小与内容不符
+                try:
+                    ingest = asyncio.run_coroutine_threadsafe(
+                        file_service.save_upload_file(
+                            UploadFile(file=stream, filename=path),
+                            file_service.generate_file_id(),
+                            max_size=min(settings.MAX_UPLOAD_SIZE, remaining)
+                        ),
+                        loop
+                    ).result()
+                except ValueError as e:
+                    skip(path, str(e))
+                    continue
+
+                entries.append((path, ingest))
+                result.total_size += ingest.size
+                # 写入期间请求可能已被取消，此时不会再有人登记这些文件
+                check_stop()
+            check_stop()
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            _discard(entries)
+            raise ValueError(f"压缩包损坏或无法读取: {e}")
+        except BaseException:
+            _discard(entries)
+            raise
+
+    await upload_file.seek(0)
+    try:
+        await asyncio.to_thread(scan)
+    except asyncio.CancelledError:
+        # 请求被取消时通知工作线程停止，已写入的临时文件由工作线程删除
+        stop.set()
+        raise
+
+    result.files = await file_service.create_file_records_bulk(db, session_id, entries)
+    return result
+
+
+def _discard(entries: List[Tuple[str, file_service.IngestResult]]) -> None:
+    """删除已写入但未登记的临时文件"""
+    for _, ingest in entries:
+        remove_blob_file(ingest.temp_path)
@@ -0,0 +1,186 @@
+"""
+内容寻址的文件存储
+
+上传的文件按 sha256 命名保存在 uploads/blobs/<前两位>/<sha256>，
+数据库 blobs 表记录引用计数。内容相同的上传（包括跨会话）共享同一份存储，
+引用计数归零时删除文件。
+
+删除时先在事务提交前把文件改名为墓碑文件，提交后再删除墓碑文件。
+提交与删除之间并发上传的相同内容会写入原路径，不会被误删；事务回滚时把墓碑文件改回原名。
+"""
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.blob import Blob
+
+
+def get_blob_dir() -> Path:
+    """获取内容块存储目录"""
+    blob_dir = Path(settings.UPLOAD_DIR) / "blobs"
+    blob_dir.mkdir(parents=True, exist_ok=True)
+    return blob_dir
+
+
+def get_blob_path(sha256: str) -> Path:
+    """内容块的存储路径"""
+    return get_blob_dir() / sha256[:2] / sha256
+
+
+async def store_blob(db: AsyncSession, temp_path: str, sha256: str, size: int) -> Blob:
+    """
+    把临时文件登记为内容块并增加引用计数（不提交事务）
+
+    内容已存在时删除临时文件，否则把临时文件移动到内容块路径。
+
+    Args:
+        db: 数据库会话
+        temp_path: 已写入完整内容的临时文件
+        sha256: 内容哈希
+        size: 内容大小（字节）
+
+    Returns:
+        内容块模型
+    """
+    path = get_blob_path(sha256)
+    blob = await db.get(Blob, sha256)
+
+    if blob is not None and os.path.exists(blob.path):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    elif os.path.exists(temp_path) or not path.exists():
+        # 重试时临时文件可能已经移动到位
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, path)
+
+    if blob is None:
+        blob = Blob(sha256=sha256, size=size, path=str(path), refcount=1)
+        db.add(blob)
+    else:
+        # 存储文件丢失时已重新写入
+        blob.path = str(path) if not os.path.exists(blob.path) else blob.path
+        blob.refcount = Blob.refcount + 1
+    return blob
+
+
+async def store_blobs(db: AsyncSession, items: List[Tuple[str, str, int]]) -> Dict[str, Blob]:
+    """
+    批量登记内容块并增加引用计数（不提交事务）
+
+    用一次 IN 查询取出已存在的内容块；同一批次中内容相同的文件只保留一份存储。
+
+    Args:
+        db: 数据库会话
+        items: (临时文件路径, sha256, 大小) 列表
+
+    Returns:
+        sha256 到内容块模型的映射
+    """
+    grouped: Dict[str, List[Tuple[str, int]]] = {}
+    for temp_path, sha256, size in items:
+        grouped.setdefault(sha256, []).append((temp_path, size))
+    if not grouped:
+        return {}
+
+    existing = {
+        blob.sha256: blob
+        for blob in await db.scalars(select(Blob).where(Blob.sha256.in_(list(grouped))))
+    }
+
+    blobs: Dict[str, Blob] = {}
+    for sha256, entries in grouped.items():
+        path = get_blob_path(sha256)
+        blob = existing.get(sha256)
+        temp_paths = [temp_path for temp_path, _ in entries]
+
+        # 重试时内容块文件可能已经移动到位
+        if (blob is None or not os.path.exists(blob.path)) and not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_paths.pop(0), path)
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        if blob is None:
+            blob = Blob(sha256=sha256, size=entries[0][1], path=str(path), refcount=len(entries))
+            db.add(blob)
+        else:
+            blob.path = str(path) if not os.path.exists(blob.path) else blob.path
+            blob.refcount = Blob.refcount + len(entries)
+        blobs[sha256] = blob
+    return blobs
+
+
+async def release_blob(db: AsyncSession, sha256: str) -> Optional[str]:
+    """
+    减少引用计数（不提交事务），归零时删除内容块记录并把文件改名为墓碑文件
+
+    Returns:
+        墓碑文件路径：提交后用 remove_blob_file 删除，回滚时用 restore_blob_file 恢复；
+        仍被引用时返回 None
+    """
+    await db.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount - 1)
+    )
+    blob = await db.scalar(select(Blob).where(Blob.sha256 == sha256).execution_options(populate_existing=True))
+    if blob is None or blob.refcount > 0:
+        return None
+    await db.delete(blob)
+    return _tombstone_blob_file(blob.path)
+
+
+def release_blob_sync(db: Session, sha256: str) -> Optional[str]:
+    """release_blob 的同步版本（用于同步会话的级联删除）"""
+    db.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount - 1)
+    )
+    blob = db.scalar(select(Blob).where(Blob.sha256 == sha256).execution_options(populate_existing=True))
+    if blob is None or blob.refcount > 0:
+        return None
+    db.delete(blob)
+    return _tombstone_blob_file(blob.path)
+
+
+TOMBSTONE_SUFFIX = ".deleted"
+
+
+def _tombstone_blob_file(path: str) -> Optional[str]:
+    """把待删除的内容块文件改名为墓碑文件，文件不存在时返回 None"""
+    tombstone = f"{path}.{uuid.uuid4().hex[:8]}{TOMBSTONE_SUFFIX}"
+    try:
+        os.replace(path, tombstone)
+    except FileNotFoundError:
+        return None
+    return tombstone
+
+
+def restore_blob_file(tombstone: Optional[str]) -> None:
+    """
+    删除事务回滚时把墓碑文件改回原名
+
+    内容寻址存储中同名文件内容相同，即使并发上传已写入原路径也可以直接覆盖。
+    """
+    if not tombstone:
+        return
+    path = tombstone[:-len(TOMBSTONE_SUFFIX)].rsplit(".", 1)[0]
+    try:
+        os.replace(tombstone, path)
+    except Exception as e:
+        print(f"恢复内容块文件失败: {e}")
+
+
+def remove_blob_file(path: Optional[str]) -> None:
+    """删除已不再被引用的内容块文件"""
+    if not path:
+        return
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        print(f"删除内容块文件失败: {e}")
@@ -0,0 +1,239 @@
+"""
+大文件分块
+
+超出单次审查 token 预算的代码按 AST 中的函数/类边界切分（Python），
+其他语言或无法解析的代码按行窗口切分。每个分块记录其在原文件中的行范围，
+审查结果中的结构化修改指令可以据此映射回原文件行号。
+"""
+import ast
+import re
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+# 结构化修改指令中的位置字段，例如 "- 位置：10-12"
+POSITION_PATTERN = re.compile(
+    r"(?P<prefix>-?\s*位置\s*[：:]\s*第?\s*)(?P<start>\d+)(?:(?P<sep>\s*[-到至~]\s*)(?P<end>\d+))?"
+)
+
+
+class CodeChunk(BaseModel):
+    """代码分块"""
+    index: int = Field(description="分块序号（从 0 开始）")
+    start_line: int = Field(description="在原文件中的起始行号（从 1 开始）")
+    end_line: int = Field(description="在原文件中的结束行号（包含）")
+    code: str = Field(description="分块代码")
+    symbols: List[str] = Field(default_factory=list, description="分块包含的顶层函数/类名")
+    indent: int = Field(0, description="分块代码的公共缩进（拆分后的类成员大于 0）")
+
+    def analysis_code(self) -> str:
+        """
+        供静态分析使用的代码
+
+        拆分后的类成员带有缩进，直接交给 Pylint、AST 等工具会报语法错误；
+        这里去掉公共缩进，行号保持不变。
+        """
+        if not self.indent:
+            return self.code
+        return "\n".join(
+            line[self.indent:] if line[:self.indent].isspace() else line.lstrip()
+            for line in self.code.split("\n")
+        )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数
+
+    不依赖分词器（避免首次使用时下载词表），按 ASCII 约 4 字符/token、
+    非 ASCII（如中文）约 1 字符/token 估算，结果略偏保守。
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def _line_range_counter(lines: List[str]) -> Callable[[int, int], int]:
+    """
+    按行预先统计字符数，返回估算第 start-end 行 token 数的函数
+
+    结果与对这些行拼接后的文本调用 estimate_tokens 相同，切分时无需反复拼接和扫描。
+    """
+    ascii_prefix = [0]
+    other_prefix = [0]
+    for line in lines:
+        ascii_chars = len(line.encode("ascii", "ignore"))
+        ascii_prefix.append(ascii_prefix[-1] + ascii_chars)
+        other_prefix.append(other_prefix[-1] + len(line) - ascii_chars)
+
+    def count(start: int, end: int) -> int:
+        if end < start:
+            return 1
+        ascii_chars = ascii_prefix[end] - ascii_prefix[start - 1] + (end - start)
+        return ascii_chars // 4 + other_prefix[end] - other_prefix[start - 1] + 1
+
+    return count
+
+
+# ==================== 切分 ====================
+
+def _node_start(node: ast.AST) -> int:
+    """节点起始行（包含装饰器）"""
+    decorators = getattr(node, "decorator_list", None) or []
+    return min([node.lineno, *(d.lineno for d in decorators)])
+
+
+def _node_symbol(node: ast.AST) -> Optional[str]:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return node.name
+    return None
+
+
+def _python_segments(
+    nodes: List[ast.AST],
+    count_tokens: Callable[[int, int], int],
+    first_line: int,
+    last_line: int,
+    max_tokens: int,
+    prefix: str = ""
+) -> List[Tuple[int, int, List[str], int]]:
+    """
+    按语句边界生成 (起始行, 结束行, 符号, 缩进) 片段
+
+    语句之间的注释和空行归入下一条语句；超出预算的类按其成员继续切分。
+    """
+    segments = []
+    cursor = first_line
+    for i, node in enumerate(nodes):
+        end = last_line if i == len(nodes) - 1 else _node_start(nodes[i + 1]) - 1
+        end = max(end, getattr(node, "end_lineno", node.lineno))
+        symbol = _node_symbol(node)
+
+        if isinstance(node, ast.ClassDef) and node.body and count_tokens(cursor, end) > max_tokens:
+            # 成员逐个切分；类头（到第一个成员之前）并入第一个成员，使该片段可以单独解析
+            body_start = _node_start(node.body[0])
+            members = _python_segments(
+                node.body, count_tokens, body_start, end, max_tokens, prefix=f"{prefix}{node.name}."
+            )
+            _, first_end, first_symbols, _ = members[0]
+            members[0] = (cursor, first_end, [f"{prefix}{node.name}", *first_symbols], node.col_offset)
+            segments.extend(members)
+        else:
+            segments.append((cursor, end, [f"{prefix}{symbol}"] if symbol else [], node.col_offset))
+        cursor = end + 1
+    return segments
+
+
+def _line_window_segments(
+    count_tokens: Callable[[int, int], int],
+    first_line: int,
+    last_line: int,
+    max_tokens: int
+) -> List[Tuple[int, int]]:
+    """按 token 预算切分行窗口"""
+    segments = []
+    start = first_line
+    budget = 0
+    for lineno in range(first_line, last_line + 1):
+        tokens = count_tokens(lineno, lineno) + 1
+        if budget and budget + tokens > max_tokens:
+            segments.append((start, lineno - 1))
+            start, budget = lineno, 0
+        budget += tokens
+    if start <= last_line:
+        segments.append((start, last_line))
+    return segments
+
+
+def split_code(code: str, language: str = "python", max_tokens: int = 6000) -> List[CodeChunk]:
+    """
+    将代码切分为不超过 token 预算的分块
+
+    Args:
+        code: 代码内容
+        language: 编程语言
+        max_tokens: 单个分块的 token 预算
+
+    Returns:
+        按行号顺序排列的分块，拼接后与原代码一致
+    """
+    lines = code.split("\n")
+    total = len(lines)
+    count_tokens = _line_range_counter(lines)
+
+    segments = None
+    if language == "python":
+        try:
+            tree = ast.parse(code)
+            if tree.body:
+                segments = _python_segments(tree.body, count_tokens, 1, total, max_tokens)
+                if segments[0][0] > 1:
+                    segments[0] = (1, *segments[0][1:])
+        except (SyntaxError, ValueError, RecursionError):
+            segments = None
+    if segments is None:
+        segments = [(1, total, [], 0)]
+
+    # 单个片段仍超出预算时退化为行窗口
+    fitted = []
+    for start, end, symbols, indent in segments:
+        if count_tokens(start, end) > max_tokens:
+            windows = _line_window_segments(count_tokens, start, end, max_tokens)
+            fitted.extend((s, e, symbols, indent) for s, e in windows)
+        else:
+            fitted.append((start, end, symbols, indent))
+
+    # 贪心合并相邻片段（缩进不同的片段不合并，保证每个分块去掉公共缩进后可以单独解析）
+    chunks: List[CodeChunk] = []
+    current: Optional[List] = None
+    for start, end, symbols, indent in fitted:
+        tokens = count_tokens(start, end)
+        if current is not None and current[4] == indent and current[3] + tokens <= max_tokens:
+            current[1] = end
+            current[2].extend(symbols)
+            current[3] += tokens
+        else:
+            if current is not None:
+                chunks.append(_make_chunk(len(chunks), current, lines))
+            current = [start, end, list(symbols), tokens, indent]
+    if current is not None:
+        chunks.append(_make_chunk(len(chunks), current, lines))
+    return chunks
+
+
+def _make_chunk(index: int, state: List, lines: List[str]) -> CodeChunk:
+    start, end, symbols, _, indent = state
+    return CodeChunk(
+        index=index,
+        start_line=start,
+        end_line=end,
+        code="\n".join(lines[start - 1:end]),
+        symbols=symbols,
+        indent=indent
+    )
+
+
+# ==================== 行号映射 ====================
+
+def remap_instruction_positions(markdown: str, mapper: Callable[[int], int]) -> str:
+    """
+    改写结构化修改指令中的位置行号
+
+    Args:
+        markdown: 审查结果
+        mapper: 行号映射函数（输入片段内行号，返回原文件行号）
+    """
+    def replace(match: re.Match) -> str:
+        result = f"{match.group('prefix')}{mapper(int(match.group('start')))}"
+        if match.group("end") is not None:
+            result += f"{match.group('sep')}{mapper(int(match.group('end')))}"
+        return result
+
+    return POSITION_PATTERN.sub(replace, markdown)
+
+
+def shift_instruction_positions(markdown: str, offset: int) -> str:
+    """把片段内行号整体偏移为原文件行号"""
+    if offset == 0:
+        return markdown
+    return remap_instruction_positions(markdown, lambda line: line + offset)
+
@@ -0,0 +1,180 @@
+"""
+代码上下文构建
+
+对话和审查都需要按文件ID读取代码：这里用一次 IN 查询取出所有文件记录，
+优先使用内存缓存或数据库中的内容，其余文件在线程池中并发读取，结果按请求顺序返回。
+内容块按 sha256 寻址、内容不可变，因此可以按哈希缓存。
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.file import File
+from app.services.file_service import read_file_content
+
+# 同时读取的文件数
+MAX_CONCURRENT_READS = 16
+
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.jsx': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'typescript',
+    '.java': 'java',
+    '.go': 'go',
+    '.cpp': 'cpp',
+    '.c': 'c',
+    '.h': 'c',
+    '.hpp': 'cpp',
+    '.rs': 'rust',
+    '.rb': 'ruby',
+    '.php': 'php',
+    '.swift': 'swift',
+    '.kt': 'kotlin',
+    '.vue': 'vue',
+    '.html': 'html',
+    '.css': 'css',
+    '.scss': 'scss',
+    '.less': 'less'
+}
+
+
+def get_language_from_filename(filename: str) -> str:
+    """从文件名获取编程语言"""
+    ext = os.path.splitext(filename)[1].lower()
+    return LANGUAGE_BY_EXTENSION.get(ext, 'plaintext')
+
+
+class CodeFile(BaseModel):
+    """已读取内容的代码文件"""
+    file_id: str = Field(description="文件ID")
+    filename: str = Field(description="文件名")
+    language: str = Field(description="编程语言")
+    code: str = Field(description="代码内容")
+
+
+class ContentCache:
+    """按内容哈希缓存文件文本（LRU，按字符数限制总大小）"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._items.get(key)
+        if text is not None:
+            self._items.move_to_end(key)
+        return text
+
+    def set(self, key: str, text: str) -> None:
+        if len(text) > self.max_chars or key in self._items:
+            return
+        self._items[key] = text
+        self._size += len(text)
+        while self._size > self.max_chars:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._size = 0
+
+
+content_cache = ContentCache(settings.CODE_CONTEXT_CACHE_CHARS)
+
+
+async def get_file_records(db: AsyncSession, file_ids: Iterable[str]) -> Dict[str, File]:
+    """一次查询取出文件记录，返回 file_id 到记录的映射"""
+    unique_ids = list(dict.fromkeys(file_ids))
+    if not unique_ids:
+        return {}
+    records = await db.scalars(select(File).where(File.file_id.in_(unique_ids)))
+    return {record.file_id: record for record in records}
+
+
+async def load_code_files(
+    db: AsyncSession,
+    file_ids: List[str],
+    skip_missing: bool = False,
+    records: Optional[Dict[str, File]] = None
+) -> List[CodeFile]:
+    """
+    读取多个文件的代码
+
+    Args:
+        db: 数据库会话
+        file_ids: 文件ID列表
+        skip_missing: 为 True 时跳过不存在或无法读取的文件，否则抛出异常
+        records: 已查询出的文件记录（file_id 到记录的映射），提供时不再查询数据库
+
+    Returns:
+        代码文件列表，顺序与 file_ids 一致
+
+    Raises:
+        FileNotFoundError: 文件记录或文件内容不存在（skip_missing=False 时）
+    """
+    if records is None:
+        records = await get_file_records(db, file_ids)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_READS)
+
+    async def load(file_id: str) -> Optional[str]:
+        record = records.get(file_id)
+        if record is None:
+            return None
+        # 旧数据可能直接保存在数据库中
+        if record.content:
+            return record.content
+        if record.blob_hash:
+            cached = content_cache.get(record.blob_hash)
+            if cached is not None:
+                return cached
+        async with semaphore:
+            text = await read_file_content(record.filepath, record.encoding)
+        if text is not None and record.blob_hash:
+            content_cache.set(record.blob_hash, text)
+        return text
+
+    contents = await asyncio.gather(*(load(file_id) for file_id in file_ids))
+
+    files = []
+    for file_id, code in zip(file_ids, contents):
+        record = records.get(file_id)
+        if record is None or code is None:
+            if skip_missing:
+                continue
+            if record is None:
+                raise FileNotFoundError(f"文件不存在: {file_id}")
+            raise FileNotFoundError(f"文件内容不存在: {record.filename}")
+        files.append(CodeFile(
+            file_id=file_id,
+            filename=record.filename,
+            language=get_language_from_filename(record.filename),
+            code=code
+        ))
+    return files
+
+
+def build_code_context(files: List[CodeFile]) -> str:
+    """把代码文件拼接为 Markdown 上下文"""
+    return "".join(
+        f"\n\n**文件**: {f.filename}\n```{f.language}\n{f.code}\n```\n" for f in files
+    )
+
+
+def build_chat_message(user_message: str, code_context: str) -> str:
+    """
+    构建包含代码上下文的用户消息
+
+    代码放在问题之前：同一批文件上换一个问题时，消息前缀保持不变，可以命中服务端提示词缓存。
+    """
+    if not code_context:
+        return user_message
+    return f"{code_context.strip()}\n\n**用户问题**: {user_message}"
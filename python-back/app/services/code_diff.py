@@ -0,0 +1,112 @@
+"""
+文件版本差异
+
+按行比较同一文件的两个版本，得到修改块（hunk）以及未修改行的新旧行号映射。
+增量审查只审查修改块及其上下文，未修改区域沿用上一版本的审查结论。
+"""
+import bisect
+import difflib
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+
+def split_lines(code: str) -> List[str]:
+    """按行切分（与分块审查的行号计算方式一致）"""
+    return code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
+
+class DiffHunk(BaseModel):
+    """修改块（行号从 1 开始；一侧没有内容时 end = start - 1）"""
+    tag: str = Field(description="修改类型：replace / insert / delete")
+    old_start: int = Field(description="旧版本起始行号")
+    old_end: int = Field(description="旧版本结束行号（包含）")
+    new_start: int = Field(description="新版本起始行号")
+    new_end: int = Field(description="新版本结束行号（包含）")
+
+    @property
+    def added(self) -> int:
+        """新增行数"""
+        return self.new_end - self.new_start + 1
+
+    @property
+    def removed(self) -> int:
+        """删除行数"""
+        return self.old_end - self.old_start + 1
+
+
+class FileDiff(BaseModel):
+    """两个版本之间的行差异"""
+    old_line_count: int = Field(description="旧版本行数")
+    new_line_count: int = Field(description="新版本行数")
+    hunks: List[DiffHunk] = Field(default_factory=list, description="修改块")
+    equal_blocks: List[Tuple[int, int, int]] = Field(
+        default_factory=list, description="未修改的行块 (旧起始行, 新起始行, 行数)"
+    )
+
+    @property
+    def changed_lines(self) -> int:
+        """修改涉及的行数（每个修改块取新旧两侧的较大者）"""
+        return sum(max(hunk.added, hunk.removed) for hunk in self.hunks)
+
+    def map_old_line(self, line: int) -> Optional[int]:
+        """
+        把旧版本的行号映射为新版本的行号
+
+        Returns:
+            新版本行号，该行已被修改或删除时返回 None
+        """
+        index = bisect.bisect_right([block[0] for block in self.equal_blocks], line) - 1
+        if index < 0:
+            return None
+        old_start, new_start, size = self.equal_blocks[index]
+        if line >= old_start + size:
+            return None
+        return new_start + line - old_start
+
+    def changed_regions(self, context: int = 0) -> List[Tuple[int, int]]:
+        """
+        需要重新审查的新版本行范围
+
+        每个修改块前后扩展 context 行，重叠或相邻的范围合并；
+        纯删除的修改块取删除位置前后各一行。
+
+        Returns:
+            按行号排序的 (起始行, 结束行) 列表
+        """
+        regions: List[Tuple[int, int]] = []
+        for hunk in self.hunks:
+            if hunk.added > 0:
+                start, end = hunk.new_start, hunk.new_end
+            else:
+                start, end = hunk.new_end, hunk.new_start
+            start = max(1, start - context)
+            end = min(self.new_line_count, end + context)
+            if regions and start <= regions[-1][1] + 1:
+                regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+            else:
+                regions.append((start, end))
+        return regions
+
+
+def compute_diff(old_code: str, new_code: str) -> FileDiff:
+    """
+    计算两个版本之间的行差异
+
+    Args:
+        old_code: 旧版本代码
+        new_code: 新版本代码
+    """
+    old_lines = split_lines(old_code)
+    new_lines = split_lines(new_code)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    diff = FileDiff(old_line_count=len(old_lines), new_line_count=len(new_lines))
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            diff.equal_blocks.append((i1 + 1, j1 + 1, i2 - i1))
+        else:
+            diff.hunks.append(DiffHunk(
+                tag=tag, old_start=i1 + 1, old_end=i2, new_start=j1 + 1, new_end=j2
+            ))
+    return diff
@@ -0,0 +1,410 @@
+"""
+代码复杂度分析
+
+Python 代码通过一次 AST 遍历计算每个函数的圈复杂度、认知复杂度、
+最大嵌套深度、参数个数和长度；其他语言退化为基于行的统计
+（C 风格语言按大括号、其余按缩进单位计算嵌套深度）。
+整体复杂度与文件大小成线性关系，可以在请求路径中直接分析数千行的文件。
+"""
+import ast
+from functools import reduce
+from math import gcd
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+# 使用大括号表示代码块的语言
+BRACE_LANGUAGES = {
+    "javascript", "typescript", "java", "go", "c", "cpp", "csharp", "cs",
+    "php", "swift", "kotlin", "rust", "scss", "less", "css", "vue"
+}
+
+# 各语言的单行注释前缀
+COMMENT_PREFIXES = {
+    "python": ("#",),
+    "ruby": ("#",),
+}
+DEFAULT_COMMENT_PREFIXES = ("//", "/*", "*", "#")
+
+# 触发重构建议的阈值
+CYCLOMATIC_THRESHOLD = 10
+COGNITIVE_THRESHOLD = 15
+PARAMS_THRESHOLD = 5
+FUNCTION_LENGTH_THRESHOLD = 50
+NESTING_THRESHOLD = 4
+
+
+class FunctionMetrics(BaseModel):
+    """单个函数的复杂度指标"""
+    name: str = Field(description="函数限定名，例如 Class.method")
+    lineno: int = Field(description="起始行号")
+    end_lineno: int = Field(description="结束行号")
+    cyclomatic: int = Field(default=1, description="圈复杂度")
+    cognitive: int = Field(default=0, description="认知复杂度")
+    max_nesting: int = Field(default=0, description="函数内最大嵌套深度")
+    params: int = Field(default=0, description="参数个数（不含 self/cls）")
+    length: int = Field(default=0, description="函数长度（行）")
+
+
+class ComplexityResult(BaseModel):
+    """文件级复杂度分析结果"""
+    language: str
+    total_lines: int
+    code_lines: int
+    comment_lines: int
+    blank_lines: int
+    max_nesting: int
+    functions: List[FunctionMetrics] = Field(default_factory=list)
+    parse_error: Optional[str] = Field(default=None, description="AST 解析失败原因")
+
+
+class _Frame:
+    """遍历过程中一个函数（或模块）的状态"""
+
+    __slots__ = ("metrics", "depth", "cognitive_nesting")
+
+    def __init__(self, metrics: Optional[FunctionMetrics]):
+        self.metrics = metrics
+        self.depth = 0
+        self.cognitive_nesting = 0
+
+
+class _ComplexityVisitor(ast.NodeVisitor):
+    """单次遍历 AST，收集所有函数的复杂度指标"""
+
+    def __init__(self):
+        self.functions: List[FunctionMetrics] = []
+        self.max_nesting = 0
+        self._frames: List[_Frame] = [_Frame(None)]
+        self._scope: List[str] = []
+        self._in_class: List[bool] = [False]
+
+    # ---------- 工具方法 ----------
+
+    @property
+    def _frame(self) -> _Frame:
+        return self._frames[-1]
+
+    def _add(self, cyclomatic: int = 0, cognitive: int = 0) -> None:
+        metrics = self._frame.metrics
+        if metrics is not None:
+            metrics.cyclomatic += cyclomatic
+            metrics.cognitive += cognitive
+
+    def _nesting_increment(self) -> int:
+        """认知复杂度中结构语句的增量：1 + 当前嵌套层级"""
+        return 1 + self._frame.cognitive_nesting
+
+    def _visit_block(self, body: List[ast.AST], cognitive_nested: bool = True) -> None:
+        """访问一个嵌套代码块"""
+        frame = self._frame
+        frame.depth += 1
+        if cognitive_nested:
+            frame.cognitive_nesting += 1
+        if frame.metrics is not None:
+            frame.metrics.max_nesting = max(frame.metrics.max_nesting, frame.depth)
+        self.max_nesting = max(self.max_nesting, frame.depth)
+
+        for stmt in body:
+            self.visit(stmt)
+
+        frame.depth -= 1
+        if cognitive_nested:
+            frame.cognitive_nesting -= 1
+
+    # ---------- 作用域 ----------
+
+    def _visit_function(self, node) -> None:
+        args = node.args
+        params = [*args.posonlyargs, *args.args, *args.kwonlyargs]
+        if self._in_class[-1] and params and params[0].arg in ("self", "cls"):
+            params = params[1:]
+        param_count = len(params) + (1 if args.vararg else 0) + (1 if args.kwarg else 0)
+
+        end_lineno = getattr(node, "end_lineno", None) or node.lineno
+        metrics = FunctionMetrics(
+            name=".".join([*self._scope, node.name]),
+            lineno=node.lineno,
+            end_lineno=end_lineno,
+            params=param_count,
+            length=end_lineno - node.lineno + 1
+        )
+        self.functions.append(metrics)
+
+        # 装饰器和默认值属于外层作用域
+        for expr in [*node.decorator_list, *args.defaults, *[d for d in args.kw_defaults if d]]:
+            self.visit(expr)
+
+        self._frames.append(_Frame(metrics))
+        self._scope.append(node.name)
+        self._in_class.append(False)
+        for stmt in node.body:
+            self.visit(stmt)
+        self._in_class.pop()
+        self._scope.pop()
+        self._frames.pop()
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        for expr in [*node.decorator_list, *node.bases]:
+            self.visit(expr)
+        self._scope.append(node.name)
+        self._in_class.append(True)
+        for stmt in node.body:
+            self.visit(stmt)
+        self._in_class.pop()
+        self._scope.pop()
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        frame = self._frame
+        frame.cognitive_nesting += 1
+        self.visit(node.body)
+        frame.cognitive_nesting -= 1
+
+    # ---------- 分支与循环 ----------
+
+    def visit_If(self, node: ast.If, is_elif: bool = False) -> None:
+        self._add(cyclomatic=1, cognitive=1 if is_elif else self._nesting_increment())
+        self.visit(node.test)
+        self._visit_block(node.body)
+
+        orelse = node.orelse
+        if len(orelse) == 1 and isinstance(orelse[0], ast.If) and orelse[0].col_offset == node.col_offset:
+            # elif 分支与 if 处于同一层级
+            self.visit_If(orelse[0], is_elif=True)
+        elif orelse:
+            self._add(cognitive=1)
+            self._visit_block(orelse)
+
+    def _visit_loop(self, node) -> None:
+        self._add(cyclomatic=1, cognitive=self._nesting_increment())
+        for field in ("target", "iter", "test"):
+            child = getattr(node, field, None)
+            if child is not None:
+                self.visit(child)
+        self._visit_block(node.body)
+        if node.orelse:
+            self._add(cognitive=1)
+            self._visit_block(node.orelse)
+
+    visit_For = _visit_loop
+    visit_AsyncFor = _visit_loop
+    visit_While = _visit_loop
+
+    def _visit_try(self, node) -> None:
+        # try 本身不增加认知复杂度，但计入结构嵌套深度
+        self._visit_block(node.body, cognitive_nested=False)
+        for handler in node.handlers:
+            self._add(cyclomatic=1, cognitive=self._nesting_increment())
+            if handler.type is not None:
+                self.visit(handler.type)
+            self._visit_block(handler.body)
+        if node.orelse:
+            self._visit_block(node.orelse, cognitive_nested=False)
+        if node.finalbody:
+            self._visit_block(node.finalbody, cognitive_nested=False)
+
+    visit_Try = _visit_try
+    if hasattr(ast, "TryStar"):
+        visit_TryStar = _visit_try
+
+    def _visit_with(self, node) -> None:
+        for item in node.items:
+            self.visit(item)
+        self._visit_block(node.body, cognitive_nested=False)
+
+    visit_With = _visit_with
+    visit_AsyncWith = _visit_with
+
+    def visit_Match(self, node) -> None:
+        self._add(cognitive=self._nesting_increment())
+        self.visit(node.subject)
+        for case in node.cases:
+            self._add(cyclomatic=1)
+            if case.guard is not None:
+                self.visit(case.guard)
+            self._visit_block(case.body)
+
+    # ---------- 表达式 ----------
+
+    def visit_IfExp(self, node: ast.IfExp) -> None:
+        self._add(cyclomatic=1, cognitive=self._nesting_increment())
+        self.generic_visit(node)
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> None:
+        # 每个布尔运算序列在认知复杂度中计 1，圈复杂度按分支数计
+        self._add(cyclomatic=len(node.values) - 1, cognitive=1)
+        self.generic_visit(node)
+
+    def visit_comprehension(self, node: ast.comprehension) -> None:
+        self._add(cyclomatic=1 + len(node.ifs), cognitive=1)
+        self.generic_visit(node)
+
+
+def _count_lines(lines: List[str], language: str):
+    """统计代码行、注释行、空白行"""
+    prefixes = COMMENT_PREFIXES.get(language, DEFAULT_COMMENT_PREFIXES)
+    code_lines = comment_lines = blank_lines = 0
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            blank_lines += 1
+        elif stripped.startswith(prefixes):
+            comment_lines += 1
+        else:
+            code_lines += 1
+    return code_lines, comment_lines, blank_lines
+
+
+def _indent_nesting(lines: List[str]) -> int:
+    """按缩进估算最大嵌套深度（制表符展开，缩进单位取各缩进宽度的最大公约数）"""
+    widths = []
+    for line in lines:
+        if line.strip():
+            expanded = line.expandtabs(4)
+            widths.append(len(expanded) - len(expanded.lstrip()))
+
+    nonzero = [w for w in widths if w]
+    if not nonzero:
+        return 0
+    unit = reduce(gcd, nonzero)
+    # 个别对齐用的奇数缩进会把单位拉到 1，此时按常见的 2 空格处理
+    if unit == 1 and len(nonzero) > 1:
+        unit = 2
+    return max(nonzero) // unit
+
+
+def _brace_nesting(code: str) -> int:
+    """按大括号估算最大嵌套深度（忽略字符串和注释中的括号）"""
+    depth = max_depth = 0
+    i, n = 0, len(code)
+    quote = None
+    while i < n:
+        ch = code[i]
+        if quote:
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+        elif ch in "\"'`":
+            quote = ch
+        elif ch == "/" and code.startswith("//", i):
+            newline = code.find("\n", i)
+            i = n if newline == -1 else newline
+            continue
+        elif ch == "/" and code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif ch == "{":
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif ch == "}":
+            depth = max(depth - 1, 0)
+        i += 1
+    return max_depth
+
+
+def analyze_complexity(code: str, language: str = "python") -> ComplexityResult:
+    """
+    分析代码复杂度
+
+    Args:
+        code: 代码内容
+        language: 编程语言
+
+    Returns:
+        结构化的复杂度分析结果
+    """
+    lines = code.split("\n")
+    code_lines, comment_lines, blank_lines = _count_lines(lines, language)
+
+    functions: List[FunctionMetrics] = []
+    parse_error = None
+    if language == "python":
+        try:
+            visitor = _ComplexityVisitor()
+            visitor.visit(ast.parse(code))
+            functions = visitor.functions
+            max_nesting = visitor.max_nesting
+        except (SyntaxError, ValueError, RecursionError) as e:
+            parse_error = str(e)
+            max_nesting = _indent_nesting(lines)
+    elif language in BRACE_LANGUAGES:
+        max_nesting = _brace_nesting(code)
+    else:
+        max_nesting = _indent_nesting(lines)
+
+    return ComplexityResult(
+        language=language,
+        total_lines=len(lines),
+        code_lines=code_lines,
+        comment_lines=comment_lines,
+        blank_lines=blank_lines,
+        max_nesting=max_nesting,
+        functions=functions,
+        parse_error=parse_error
+    )
+
+
+def format_complexity_report(result: ComplexityResult, top_n: int = 10) -> str:
+    """
+    将复杂度分析结果格式化为文本摘要
+
+    Args:
+        result: 复杂度分析结果
+        top_n: 最多列出的函数个数（按圈复杂度降序）
+
+    Returns:
+        文本摘要
+    """
+    total_lines = result.total_lines or 1
+    report = f"""📊 代码复杂度分析：
+- 总行数: {result.total_lines}
+- 代码行: {result.code_lines}
+- 注释行: {result.comment_lines}
+- 空白行: {result.blank_lines}
+- 最大嵌套深度: {result.max_nesting}
+- 注释率: {(result.comment_lines / total_lines * 100):.1f}%"""
+
+    if result.functions:
+        ranked = sorted(result.functions, key=lambda f: (f.cyclomatic, f.cognitive), reverse=True)
+        rows = [
+            f"- {f.name}（第 {f.lineno}-{f.end_lineno} 行）: 圈复杂度 {f.cyclomatic}, "
+            f"认知复杂度 {f.cognitive}, 嵌套 {f.max_nesting}, 参数 {f.params}, 长度 {f.length}"
+            for f in ranked[:top_n]
+        ]
+        report += f"\n\n🔎 函数指标（共 {len(result.functions)} 个，按圈复杂度排序）：\n" + "\n".join(rows)
+
+    # 给出建议
+    suggestions = []
+    if result.parse_error:
+        suggestions.append(f"⚠️ 代码无法解析为 AST，仅给出基于行的统计: {result.parse_error}")
+    if result.code_lines > 300:
+        suggestions.append("⚠️ 代码行数较多，建议拆分为多个模块")
+    if result.max_nesting > NESTING_THRESHOLD:
+        suggestions.append("⚠️ 嵌套层次过深，建议简化逻辑或提取函数")
+    for f in result.functions:
+        problems = []
+        if f.cyclomatic > CYCLOMATIC_THRESHOLD:
+            problems.append(f"圈复杂度 {f.cyclomatic}")
+        if f.cognitive > COGNITIVE_THRESHOLD:
+            problems.append(f"认知复杂度 {f.cognitive}")
+        if f.params > PARAMS_THRESHOLD:
+            problems.append(f"参数 {f.params} 个")
+        if f.length > FUNCTION_LENGTH_THRESHOLD:
+            problems.append(f"长度 {f.length} 行")
+        if problems:
+            suggestions.append(f"⚠️ 函数 {f.name}（第 {f.lineno} 行）{', '.join(problems)}，建议拆分或简化")
+    if result.comment_lines / total_lines < 0.1:
+        suggestions.append("💡 注释较少，建议增加文档注释")
+
+    if suggestions:
+        report += "\n\n" + "\n".join(suggestions)
+    else:
+        report += "\n\n✅ 代码结构良好"
+
+    return report
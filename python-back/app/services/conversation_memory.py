@@ -0,0 +1,295 @@
+"""
+对话记忆
+
+对话接口把会话中之前的消息按 token 预算打包为历史，附在当前问题之前；
+超出预算的较早消息由后台任务增量地合并进 Session.summary，
+请求路径上只读取已有摘要，不调用 LLM。
+
+Session.summary_until_id 记录摘要已覆盖到的最后一条消息（messages.id），
+历史窗口只取其后的消息，避免摘要与历史重复。
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.message import Message, MessageRole
+from app.models.session import Session as SessionModel
+from app.services.code_chunker import estimate_tokens
+
+# 生成摘要时每条消息最多保留的字符数
+SUMMARY_MESSAGE_MAX_CHARS = 2000
+
+# 流式生成失败时写入的错误内容前缀，不作为历史
+ERROR_CONTENT_PREFIXES = ("AI 响应错误:", "流式响应错误:")
+
+SUMMARY_SYSTEM_PROMPT = """你负责维护代码审查对话的摘要。
+根据已有摘要和新增的对话，输出更新后的完整摘要：
+- 保留讨论过的文件、发现的主要问题、已给出的修改建议和用户的偏好与结论
+- 省略寒暄和重复内容，不要编造对话中没有的信息
+- 不超过 {max_chars} 个字"""
+
+
+async def _load_recent_messages(
+    db: AsyncSession,
+    session_id: str,
+    after_id: int,
+    exclude_message_ids: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[Message]:
+    """按时间倒序读取 after_id 之后的消息"""
+    stmt = (
+        select(Message)
+        .where(Message.session_id == session_id, Message.id > after_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit).offset(offset)
+    if exclude_message_ids:
+        stmt = stmt.where(Message.message_id.not_in(exclude_message_ids))
+    return list((await db.scalars(stmt)).all())
+
+
+def _is_history_message(message: Message) -> bool:
+    """空内容（生成中的占位消息）和错误内容不作为历史"""
+    if message.role not in (MessageRole.USER, MessageRole.ASSISTANT):
+        return False
+    content = (message.content or "").strip()
+    return bool(content) and not content.startswith(ERROR_CONTENT_PREFIXES)
+
+
+def _pack_window(messages_desc: List[Message], max_tokens: int) -> int:
+    """
+    从最新的消息开始向前累计，返回能放进预算的消息数
+
+    遇到放不下的消息即停止，保证历史是连续的最近若干条。
+    """
+    used = 0
+    count = 0
+    for message in messages_desc:
+        tokens = estimate_tokens(message.content)
+        if used + tokens > max_tokens:
+            break
+        used += tokens
+        count += 1
+    return count
+
+
+async def _load_history_window(
+    db: AsyncSession,
+    session_id: str,
+    after_id: int,
+    max_tokens: int,
+    exclude_message_ids: Optional[List[str]] = None,
+    load_all: bool = False
+) -> Tuple[List[Message], List[Message]]:
+    """
+    读取 after_id 之后的历史消息并划分历史窗口
+
+    先过滤掉占位和错误消息，再依次应用 token 预算和 CHAT_HISTORY_MAX_MESSAGES，
+    对话接口和摘要任务共用这一划分，保证每条消息要么在历史中，要么会被摘要。
+
+    Args:
+        db: 数据库会话
+        session_id: 会话ID
+        after_id: 只读取 id 大于该值的消息
+        max_tokens: 历史窗口的 token 预算
+        exclude_message_ids: 不作为历史的消息
+        load_all: 是否读取窗口外的全部消息，否则只分页读取到填满窗口为止
+
+    Returns:
+        (窗口内消息, 窗口外消息)，均按时间倒序
+    """
+    max_messages = settings.CHAT_HISTORY_MAX_MESSAGES
+    if load_all:
+        messages = await _load_recent_messages(db, session_id, after_id, exclude_message_ids)
+        messages = [m for m in messages if _is_history_message(m)]
+    else:
+        # 被过滤的消息不占窗口名额，按页读取直到凑满 max_messages 条有效消息
+        messages = []
+        offset = 0
+        while len(messages) < max_messages:
+            page = await _load_recent_messages(
+                db, session_id, after_id, exclude_message_ids,
+                limit=max_messages, offset=offset
+            )
+            messages.extend(m for m in page if _is_history_message(m))
+            if len(page) < max_messages:
+                break
+            offset += len(page)
+
+    in_window = min(_pack_window(messages, max_tokens), max_messages)
+    return messages[:in_window], messages[in_window:]
+
+
+async def build_chat_history(
+    db: AsyncSession,
+    session_id: str,
+    exclude_message_ids: Optional[List[str]] = None,
+    max_tokens: Optional[int] = None
+) -> List[Dict[str, str]]:
+    """
+    构建对话历史
+
+    Args:
+        db: 数据库会话
+        session_id: 会话ID
+        exclude_message_ids: 不作为历史的消息（例如刚保存的当前问题）
+        max_tokens: 历史消息的 token 预算，默认取 CHAT_HISTORY_MAX_TOKENS，0 表示不带历史
+
+    Returns:
+        按时间正序的消息列表 [{role, content}]；有摘要时第一条为包含摘要的系统消息
+    """
+    max_tokens = settings.CHAT_HISTORY_MAX_TOKENS if max_tokens is None else max_tokens
+    if max_tokens <= 0:
+        return []
+
+    session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
+    if session is None:
+        return []
+
+    window, _ = await _load_history_window(
+        db,
+        session_id,
+        after_id=session.summary_until_id or 0,
+        max_tokens=max_tokens,
+        exclude_message_ids=exclude_message_ids
+    )
+
+    history = []
+    if session.summary:
+        history.append({
+            "role": "system",
+            "content": f"以下是本会话更早对话的摘要，回答时可参考：\n{session.summary}"
+        })
+    history.extend(
+        {"role": message.role.value, "content": message.content}
+        for message in reversed(window)
+    )
+    return history
+
+
+SummarizeFn = Callable[[Optional[str], List[Message]], Awaitable[str]]
+
+
+async def summarize_with_llm(previous_summary: Optional[str], messages: List[Message]) -> str:
+    """调用 LLM 把新增对话合并进已有摘要"""
+    from app.services.review_chain import review_chain
+
+    lines = []
+    for message in messages:
+        speaker = "用户" if message.role == MessageRole.USER else "助手"
+        content = message.content
+        if len(content) > SUMMARY_MESSAGE_MAX_CHARS:
+            content = content[:SUMMARY_MESSAGE_MAX_CHARS] + "…（已截断）"
+        lines.append(f"{speaker}：{content}")
+
+    user_message = (
+        f"**已有摘要**:\n{previous_summary or '（无）'}\n\n"
+        f"**新增对话**:\n" + "\n\n".join(lines)
+    )
+    response = await review_chain.llm.ainvoke([
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(max_chars=settings.CHAT_SUMMARY_MAX_CHARS)},
+        {"role": "user", "content": user_message}
+    ])
+    return (response.content or "").strip()
+
+
+class ConversationSummarizer:
+    """在后台增量更新会话摘要"""
+
+    def __init__(self, summarize: SummarizeFn = summarize_with_llm):
+        """
+        Args:
+            summarize: 摘要函数 (已有摘要, 新增消息) -> 新摘要
+        """
+        self.summarize = summarize
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def schedule(
+        self,
+        session_id: str,
+        session_factory: Callable = AsyncSessionLocal
+    ) -> Optional[asyncio.Task]:
+        """
+        安排一次摘要更新（同一会话已有任务在执行时跳过）
+
+        Returns:
+            后台任务，未安排时返回 None
+        """
+        if not settings.CHAT_SUMMARY_ENABLED or settings.CHAT_HISTORY_MAX_TOKENS <= 0:
+            return None
+        if session_id in self._tasks:
+            return None
+
+        task = asyncio.create_task(self._run(session_id, session_factory))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+        return task
+
+    async def shutdown(self) -> None:
+        """取消未完成的摘要任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, session_id: str, session_factory: Callable) -> None:
+        try:
+            async with session_factory() as db:
+                await self.update_summary(db, session_id)
+        except Exception as e:
+            print(f"更新会话摘要失败 {session_id}: {e}")
+
+    async def update_summary(self, db: AsyncSession, session_id: str) -> bool:
+        """
+        把已移出历史窗口的消息合并进摘要
+
+        新移出窗口的内容不足 CHAT_SUMMARY_MIN_TOKENS 时不调用 LLM，攒够后再批量摘要。
+
+        Returns:
+            是否更新了摘要
+        """
+        session = await db.scalar(select(SessionModel).where(SessionModel.session_id == session_id))
+        if session is None:
+            return False
+        summary_until_id = session.summary_until_id
+
+        # 与 build_chat_history 使用相同的窗口，窗口外的消息才需要摘要
+        _, outside_desc = await _load_history_window(
+            db,
+            session_id,
+            after_id=summary_until_id or 0,
+            max_tokens=settings.CHAT_HISTORY_MAX_TOKENS,
+            load_all=True
+        )
+        outside = list(reversed(outside_desc))
+        if not outside:
+            return False
+        if sum(estimate_tokens(m.content) for m in outside) < settings.CHAT_SUMMARY_MIN_TOKENS:
+            return False
+
+        new_summary = await self.summarize(session.summary, outside)
+        if not new_summary:
+            return False
+
+        # 只有摘要进度未被其他任务推进时才写入
+        result = await db.execute(
+            update(SessionModel)
+            .where(
+                SessionModel.session_id == session_id,
+                SessionModel.summary_until_id.is_(None) if summary_until_id is None
+                else SessionModel.summary_until_id == summary_until_id
+            )
+            .values(summary=new_summary, summary_until_id=max(m.id for m in outside))
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+
+# 全局实例
+conversation_summarizer = ConversationSummarizer()
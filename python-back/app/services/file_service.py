@@ -1,17 +1,37 @@
 """
 文件服务
 """
+import asyncio
+import hashlib
 import os
+import aiofiles
+import aiofiles.os
 import uuid
 import shutil
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 from pathlib import Path
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import UploadFile
+from pydantic import BaseModel, Field
 
 from app.models.file import File as FileModel
 from app.core.config import settings
+from app.services.blob_store import (
+    get_blob_dir,
+    release_blob,
+    remove_blob_file,
+    restore_blob_file,
+    store_blob,
+    store_blobs,
+)
+from app.utils.text_encoding import IncrementalEncodingDetector
+
+# 流式写入上传文件时每次读取的字节数
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 def generate_file_id() -> str:
@@ -39,51 +59,99 @@ def is_allowed_file(filename: str) -> bool:
     return ext in settings.ALLOWED_EXTENSIONS
 
 
-def save_upload_file(
+class IngestResult(BaseModel):
+    """上传文件单次流式写入的结果"""
+    temp_path: str = Field(description="临时文件路径")
+    size: int = Field(description="文件大小（字节）")
+    sha256: str = Field(description="内容哈希")
+    encoding: str = Field(description="识别出的文本编码")
+    text: Optional[str] = Field(None, description="解码后的文本（仅在需要时保留）")
+
+
+async def save_upload_file(
     upload_file: UploadFile,
-    session_id: str,
-    file_id: str
-) -> tuple[str, int]:
+    file_id: str,
+    max_size: Optional[int] = None,
+    keep_text: bool = False
+) -> IngestResult:
     """
-    保存上传的文件到本地
+    单次流式写入上传的文件
+    
+    边读边写入临时文件，同时计算 sha256、识别编码，超过大小限制立即中止，
+    不需要写完后再读回文件。文件 I/O 通过 aiofiles 在线程池中执行，不阻塞事件循环。
+    
+    Args:
+        upload_file: 上传的文件
+        file_id: 文件ID（用于临时文件名）
+        max_size: 大小限制，默认取 MAX_UPLOAD_SIZE
+        keep_text: 是否保留解码后的文本
     
-    返回：(文件路径, 文件大小)
+    Raises:
+        ValueError: 超过大小限制或无法识别编码
     """
-    session_dir = get_session_upload_dir(session_id)
+    max_size = max_size or settings.MAX_UPLOAD_SIZE
+    if upload_file.size is not None and upload_file.size > max_size:
+        raise ValueError(f"文件大小超过限制: {upload_file.size} > {max_size}")
     
-    # 生成唯一的文件名：file_id + 原始文件名
-    filename = f"{file_id}_{upload_file.filename}"
-    filepath = session_dir / filename
+    temp_dir = get_blob_dir() / "tmp"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    temp_path = temp_dir / f"{file_id}.part"
     
-    # 保存文件
     file_size = 0
-    with open(filepath, "wb") as f:
-        while chunk := upload_file.file.read(1024 * 1024):  # 每次读取1MB
-            f.write(chunk)
-            file_size += len(chunk)
+    digest = hashlib.sha256()
+    detector = IncrementalEncodingDetector(
+        ["utf-8", *settings.UPLOAD_FALLBACK_ENCODINGS], keep_text=keep_text
+    )
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise ValueError(f"文件大小超过限制: 超过 {max_size} 字节")
+                digest.update(chunk)
+                detector.feed(chunk)
+                await f.write(chunk)
+        
+        encoding, text = detector.finish()
+        if encoding is None:
+            raise ValueError(f"无法识别文件编码，请上传文本文件: {upload_file.filename}")
+    except BaseException:
+        # 中止时删除已写入的部分
+        if os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
     
-    return str(filepath), file_size
+    return IngestResult(
+        temp_path=str(temp_path),
+        size=file_size,
+        sha256=digest.hexdigest(),
+        encoding=encoding,
+        text=text
+    )
 
 
-async def read_file_content(filepath: str) -> Optional[str]:
+async def read_file_content(filepath: str, encoding: Optional[str] = None) -> Optional[str]:
     """读取文件内容"""
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return f.read()
+        async with aiofiles.open(filepath, "r", encoding=encoding or "utf-8") as f:
+            return await f.read()
     except Exception as e:
         print(f"读取文件失败: {e}")
         return None
 
 
-def create_file_record(
-    db: Session,
+async def create_file_record(
+    db: AsyncSession,
     file_id: str,
     session_id: str,
     filename: str,
     filepath: str,
     file_type: str,
     file_size: int,
-    content: Optional[str] = None
+    content: Optional[str] = None,
+    blob_hash: Optional[str] = None,
+    encoding: Optional[str] = None,
+    parent_file_id: Optional[str] = None
 ) -> FileModel:
     """创建文件记录"""
     db_file = FileModel(
@@ -93,28 +161,36 @@ def create_file_record(
         filepath=filepath,
         file_type=file_type,
         file_size=file_size,
-        content=content
+        blob_hash=blob_hash,
+        encoding=encoding,
+        content=content,
+        parent_file_id=parent_file_id
     )
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    await db.commit()
+    await db.refresh(db_file)
     return db_file
 
 
 async def upload_file(
-    db: Session,
+    db: AsyncSession,
     upload_file: UploadFile,
     session_id: str,
-    save_content: bool = True
+    save_content: bool = False,
+    parent_file_id: Optional[str] = None
 ) -> FileModel:
     """
     上传文件
     
+    文件内容按 sha256 保存在内容块存储中，内容相同的上传共享同一份存储，
+    文件记录通过 blob_hash 指向内容块。
+    
     Args:
         db: 数据库会话
         upload_file: 上传的文件
         session_id: 会话ID
-        save_content: 是否将文件内容保存到数据库
+        save_content: 是否额外将文件内容保存到数据库（默认不保存，内容从内容块读取）
+        parent_file_id: 上一版本的文件ID（重新上传修改后的文件时提供，用于增量审查）
     
     Returns:
         文件模型
@@ -123,94 +199,237 @@ async def upload_file(
     if not is_allowed_file(upload_file.filename):
         raise ValueError(f"不支持的文件类型: {upload_file.filename}")
     
+    # 上一版本必须属于同一会话
+    if parent_file_id:
+        parent = await get_file(db, parent_file_id)
+        if parent is None or parent.session_id != session_id:
+            raise ValueError(f"上一版本文件不存在: {parent_file_id}")
+    
     # 生成文件ID
     file_id = generate_file_id()
     
-    # 保存文件到本地
-    filepath, file_size = save_upload_file(upload_file, session_id, file_id)
-    
-    # 检查文件大小
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        # 删除刚保存的文件
-        os.remove(filepath)
-        raise ValueError(f"文件大小超过限制: {file_size} > {settings.MAX_UPLOAD_SIZE}")
-    
-    # 读取文件内容（如果需要）
-    content = None
-    if save_content:
-        content = await read_file_content(filepath)
+    # 单次流式写入（超过大小限制时立即中止）
+    ingest = await save_upload_file(upload_file, file_id, keep_text=save_content)
     
     # 获取文件类型
     file_type = os.path.splitext(upload_file.filename)[1].lower()
     
-    # 创建数据库记录
-    db_file = create_file_record(
-        db=db,
-        file_id=file_id,
-        session_id=session_id,
-        filename=upload_file.filename,
-        filepath=filepath,
-        file_type=file_type,
-        file_size=file_size,
-        content=content
+    async def create_record() -> FileModel:
+        blob = await store_blob(db, ingest.temp_path, ingest.sha256, ingest.size)
+        
+        # 创建数据库记录（与内容块引用计数在同一事务中提交）
+        return await create_file_record(
+            db=db,
+            file_id=file_id,
+            session_id=session_id,
+            filename=upload_file.filename,
+            filepath=blob.path,
+            file_type=file_type,
+            file_size=ingest.size,
+            content=ingest.text,
+            blob_hash=ingest.sha256,
+            encoding=ingest.encoding,
+            parent_file_id=parent_file_id
+        )
+    
+    try:
+        return await create_record()
+    except (IntegrityError, StaleDataError):
+        # 并发上传相同内容时，另一个请求已先登记该内容块，
+        # 或读到的内容块正在被删除（更新引用计数时记录已不存在），重试一次即可
+        await db.rollback()
+        return await create_record()
+
+
+class BulkUploadItem(BaseModel):
+    """批量上传中单个文件的结果"""
+    filename: str = Field(description="文件名")
+    file: Optional[FileModel] = Field(None, description="文件模型（成功时）")
+    error: Optional[str] = Field(None, description="失败原因")
+    
+    class Config:
+        arbitrary_types_allowed = True
+
+
+async def bulk_upload_files(
+    db: AsyncSession,
+    upload_files: List[UploadFile],
+    session_id: str,
+    concurrency: Optional[int] = None
+) -> List[BulkUploadItem]:
+    """
+    批量上传文件
+    
+    先并发地把所有文件流式写入临时文件，再在一个事务中批量登记内容块、
+    批量插入文件记录，只提交一次。单个文件校验或写入失败不影响其他文件。
+    
+    Args:
+        db: 数据库会话
+        upload_files: 上传的文件列表
+        session_id: 会话ID
+        concurrency: 同时写入的文件数，默认取 BULK_UPLOAD_CONCURRENCY
+    
+    Returns:
+        与 upload_files 顺序一致的结果列表
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.BULK_UPLOAD_CONCURRENCY)
+    
+    async def ingest_one(upload_file: UploadFile) -> IngestResult:
+        if not is_allowed_file(upload_file.filename):
+            raise ValueError(f"不支持的文件类型: {upload_file.filename}")
+        async with semaphore:
+            return await save_upload_file(upload_file, generate_file_id())
+    
+    ingests = await asyncio.gather(
+        *(ingest_one(f) for f in upload_files), return_exceptions=True
     )
     
-    return db_file
+    items: List[BulkUploadItem] = []
+    rows = []
+    for upload_file, ingest in zip(upload_files, ingests):
+        item = BulkUploadItem(filename=upload_file.filename or "")
+        items.append(item)
+        if isinstance(ingest, BaseException):
+            if not isinstance(ingest, Exception):
+                raise ingest
+            item.error = str(ingest)
+            continue
+        rows.append((item, ingest))
+    
+    if rows:
+        created = await create_file_records_bulk(
+            db, session_id, [(item.filename, ingest) for item, ingest in rows]
+        )
+        for (item, _), db_file in zip(rows, created):
+            item.file = db_file
+    return items
+
+
+async def create_file_records_bulk(
+    db: AsyncSession,
+    session_id: str,
+    entries: List[Tuple[str, IngestResult]]
+) -> List[FileModel]:
+    """
+    在一个事务中登记内容块并批量插入文件记录
+    
+    Args:
+        db: 数据库会话
+        session_id: 会话ID
+        entries: (文件名, 写入结果) 列表
+    
+    Returns:
+        与 entries 顺序一致的文件模型列表
+    """
+    if not entries:
+        return []
+    
+    async def insert_records() -> List[FileModel]:
+        blobs = await store_blobs(db, [(i.temp_path, i.sha256, i.size) for _, i in entries])
+        records = [
+            {
+                "file_id": generate_file_id(),
+                "session_id": session_id,
+                "filename": filename,
+                "filepath": blobs[ingest.sha256].path,
+                "file_type": os.path.splitext(filename)[1].lower(),
+                "file_size": ingest.size,
+                "blob_hash": ingest.sha256,
+                "encoding": ingest.encoding
+            }
+            for filename, ingest in entries
+        ]
+        await db.execute(insert(FileModel), records)
+        await db.commit()
+        
+        # 一次查询取回插入的记录
+        file_ids = [record["file_id"] for record in records]
+        created = {
+            f.file_id: f
+            for f in await db.scalars(select(FileModel).where(FileModel.file_id.in_(file_ids)))
+        }
+        return [created[file_id] for file_id in file_ids]
+    
+    try:
+        try:
+            return await insert_records()
+        except (IntegrityError, StaleDataError):
+            # 并发上传相同内容时，另一个请求已先登记内容块或内容块正在被删除，重试一次即可
+            await db.rollback()
+            return await insert_records()
+    except Exception:
+        # 最终失败时删除还未移动到位的临时文件；已移动到内容块路径的文件
+        # 可能正被并发上传的记录引用，保留给之后上传相同内容时复用
+        for _, ingest in entries:
+            remove_blob_file(ingest.temp_path)
+        raise
 
 
-def get_file(db: Session, file_id: str) -> Optional[FileModel]:
+async def get_file(db: AsyncSession, file_id: str) -> Optional[FileModel]:
     """根据ID获取文件"""
-    return db.query(FileModel).filter(FileModel.file_id == file_id).first()
+    return await db.scalar(select(FileModel).where(FileModel.file_id == file_id))
 
 
-def get_files_by_session(
-    db: Session,
+async def get_files_by_session(
+    db: AsyncSession,
     session_id: str,
     skip: int = 0,
     limit: int = 100
 ) -> List[FileModel]:
     """获取会话的所有文件"""
-    return (
-        db.query(FileModel)
-        .filter(FileModel.session_id == session_id)
+    result = await db.scalars(
+        select(FileModel)
+        .where(FileModel.session_id == session_id)
         .order_by(FileModel.created_at.desc())
         .offset(skip)
         .limit(limit)
-        .all()
     )
+    return list(result.all())
 
 
-def get_file_count_by_session(db: Session, session_id: str) -> int:
+async def get_file_count_by_session(db: AsyncSession, session_id: str) -> int:
     """获取会话的文件总数"""
-    return db.query(FileModel).filter(FileModel.session_id == session_id).count()
+    return await db.scalar(
+        select(func.count()).select_from(FileModel).where(FileModel.session_id == session_id)
+    )
 
 
-def delete_file(db: Session, file_id: str) -> bool:
+async def delete_file(db: AsyncSession, file_id: str) -> bool:
     """删除文件"""
-    db_file = get_file(db, file_id)
+    db_file = await get_file(db, file_id)
     if not db_file:
         return False
     
-    # 删除本地文件
-    try:
-        if os.path.exists(db_file.filepath):
-            os.remove(db_file.filepath)
-    except Exception as e:
-        print(f"删除本地文件失败: {e}")
+    # 内容块只在没有其他文件引用时删除
+    if db_file.blob_hash:
+        blob_path = await release_blob(db, db_file.blob_hash)
+    else:
+        # 旧数据：删除本地文件
+        blob_path = None
+        try:
+            if os.path.exists(db_file.filepath):
+                os.remove(db_file.filepath)
+        except Exception as e:
+            print(f"删除本地文件失败: {e}")
     
     # 删除数据库记录
-    db.delete(db_file)
-    db.commit()
+    try:
+        await db.delete(db_file)
+        await db.commit()
+    except BaseException:
+        restore_blob_file(blob_path)
+        raise
+    remove_blob_file(blob_path)
     return True
 
 
-def delete_session_files(db: Session, session_id: str) -> bool:
+async def delete_session_files(db: AsyncSession, session_id: str) -> bool:
     """删除会话的所有文件"""
-    db_files = get_files_by_session(db, session_id)
+    db_files = await get_files_by_session(db, session_id)
     
     # 删除所有文件
     for db_file in db_files:
-        delete_file(db, db_file.file_id)
+        await delete_file(db, db_file.file_id)
     
     # 删除会话目录
     session_dir = get_session_upload_dir(session_id)
@@ -223,9 +442,9 @@ def delete_session_files(db: Session, session_id: str) -> bool:
     return True
 
 
-def get_file_content(db: Session, file_id: str) -> Optional[str]:
+async def get_file_content(db: AsyncSession, file_id: str) -> Optional[str]:
     """获取文件内容"""
-    db_file = get_file(db, file_id)
+    db_file = await get_file(db, file_id)
     if not db_file:
         return None
     
@@ -234,10 +453,5 @@ def get_file_content(db: Session, file_id: str) -> Optional[str]:
         return db_file.content
     
     # 否则从文件系统读取
-    try:
-        with open(db_file.filepath, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception as e:
-        print(f"读取文件内容失败: {e}")
-        return None
+    return await read_file_content(db_file.filepath, db_file.encoding)
 
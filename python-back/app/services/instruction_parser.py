@@ -0,0 +1,218 @@
+"""
+结构化修改指令解析
+
+审查结果中的修改指令格式见系统提示词：
+    **修改N：描述**
+    - 操作类型：INSERT / REPLACE / DELETE
+    - 位置：10-12
+    - 内容：
+    ```python
+    ...
+    ```
+流式输出时逐行解析，指令块一结束（内容代码块闭合、或遇到下一个指令/标题）就立即产出，
+不需要每次对完整的 Markdown 重新匹配；解析出的指令按原文件行数校验行号范围。
+"""
+import re
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.services.code_chunker import POSITION_PATTERN
+
+# 指令块标题，例如 "**修改1：添加文档字符串**"
+INSTRUCTION_HEADER_PATTERN = re.compile(r"^\s*\*\*修改\s*(?P<number>\d+)\s*[：:]\s*(?P<title>[^\n*]*)")
+OPERATION_PATTERN = re.compile(r"操作类型\s*[：:]\s*(?P<operation>插入|替换|删除|INSERT|REPLACE|DELETE)", re.I)
+CONTENT_FIELD_PATTERN = re.compile(r"^\s*-?\s*内容\s*[：:]")
+
+OPERATION_ALIASES = {"插入": "INSERT", "替换": "REPLACE", "删除": "DELETE"}
+
+
+class ModificationInstruction(BaseModel):
+    """结构化修改指令"""
+    number: int = Field(description="指令编号（标题中的 N）")
+    description: str = Field(description="修改描述")
+    type: Optional[str] = Field(None, description="操作类型：INSERT / REPLACE / DELETE")
+    start_line: Optional[int] = Field(None, description="起始行号（从 1 开始）")
+    end_line: Optional[int] = Field(None, description="结束行号（包含）")
+    content: str = Field("", description="代码内容")
+    valid: bool = Field(True, description="是否通过校验")
+    error: Optional[str] = Field(None, description="校验失败原因")
+
+
+def instruction_line_range(block: str) -> Optional[Tuple[int, int]]:
+    """读取修改指令块中的位置行号范围，没有位置字段时返回 None"""
+    match = POSITION_PATTERN.search(block)
+    if match is None:
+        return None
+    start = int(match.group("start"))
+    end = int(match.group("end")) if match.group("end") is not None else start
+    return start, end
+
+
+def parse_instruction_block(block: str) -> ModificationInstruction:
+    """解析单个指令块（不校验）"""
+    header = INSTRUCTION_HEADER_PATTERN.match(block)
+    instruction = ModificationInstruction(
+        number=int(header.group("number")) if header else 0,
+        description=header.group("title").strip() if header else ""
+    )
+
+    operation = OPERATION_PATTERN.search(block)
+    if operation:
+        value = operation.group("operation")
+        instruction.type = OPERATION_ALIASES.get(value, value.upper())
+
+    line_range = instruction_line_range(block)
+    if line_range:
+        instruction.start_line, instruction.end_line = line_range
+
+    # 内容字段后的第一个代码块，保留开头的缩进，只去掉末尾空白
+    lines = block.split("\n")
+    for i, line in enumerate(lines):
+        if CONTENT_FIELD_PATTERN.match(line):
+            code: List[str] = []
+            fence_open = False
+            for code_line in lines[i + 1:]:
+                if code_line.strip().startswith("```"):
+                    if fence_open:
+                        break
+                    fence_open = True
+                elif fence_open:
+                    code.append(code_line)
+            instruction.content = "\n".join(code).rstrip()
+            break
+    return instruction
+
+
+def validate_instruction(
+    instruction: ModificationInstruction,
+    line_count: Optional[int] = None
+) -> ModificationInstruction:
+    """
+    校验指令字段和行号范围
+
+    Args:
+        instruction: 修改指令
+        line_count: 原文件行数，未知时只校验字段
+
+    Returns:
+        同一个指令，valid 和 error 已更新
+    """
+    error = None
+    if instruction.type is None:
+        error = "缺少操作类型"
+    elif instruction.start_line is None:
+        error = "缺少位置"
+    elif instruction.start_line < 1 or instruction.end_line < instruction.start_line:
+        error = f"位置 {instruction.start_line}-{instruction.end_line} 无效"
+    elif instruction.type != "DELETE" and not instruction.content:
+        error = "缺少内容"
+    elif line_count is not None:
+        # 插入位置可以是最后一行之后
+        last_line = line_count + 1 if instruction.type == "INSERT" else line_count
+        if instruction.end_line > last_line:
+            error = f"位置 {instruction.start_line}-{instruction.end_line} 超出文件范围（共 {line_count} 行）"
+
+    instruction.valid = error is None
+    instruction.error = error
+    return instruction
+
+
+class StreamingInstructionParser:
+    """增量解析流式输出中的修改指令"""
+
+    def __init__(self, line_count: Optional[int] = None):
+        """
+        Args:
+            line_count: 原文件行数，用于校验行号范围
+        """
+        self.line_count = line_count
+        self.instructions: List[ModificationInstruction] = []
+        self.blocks: List[str] = []
+        self._pending = ""
+        self._block: Optional[List[str]] = None
+        self._in_fence = False
+        self._has_content_field = False
+
+    def feed(self, delta: str) -> List[ModificationInstruction]:
+        """
+        输入一段增量文本
+
+        Returns:
+            本次输入后完成的指令
+        """
+        self._pending += delta
+        if "\n" not in delta:
+            return []
+        *lines, self._pending = self._pending.split("\n")
+        completed: List[ModificationInstruction] = []
+        for line in lines:
+            completed.extend(self._process_line(line))
+        return completed
+
+    def finish(self) -> List[ModificationInstruction]:
+        """输出结束，返回最后一个未闭合的指令"""
+        completed = self._process_line(self._pending) if self._pending else []
+        self._pending = ""
+        return completed + self._close_block()
+
+    def _process_line(self, line: str) -> List[ModificationInstruction]:
+        completed: List[ModificationInstruction] = []
+        stripped = line.strip()
+
+        if not self._in_fence:
+            if INSTRUCTION_HEADER_PATTERN.match(line):
+                completed.extend(self._close_block())
+                self._block = [line]
+                return completed
+            # 标题、分隔线或注意事项结束当前指令块（代码块中以 # 开头的注释不算）
+            if stripped.startswith("#") or stripped == "---" or stripped.startswith("**注意"):
+                completed.extend(self._close_block())
+
+        if self._block is None:
+            if stripped.startswith("```"):
+                self._in_fence = not self._in_fence
+            return completed
+
+        self._block.append(line)
+        if stripped.startswith("```"):
+            self._in_fence = not self._in_fence
+            # 内容代码块闭合即指令结束
+            if not self._in_fence and self._has_content_field:
+                completed.extend(self._close_block())
+        elif not self._in_fence and CONTENT_FIELD_PATTERN.match(line):
+            self._has_content_field = True
+        return completed
+
+    def _close_block(self) -> List[ModificationInstruction]:
+        if self._block is None:
+            return []
+        block = "\n".join(self._block).rstrip()
+        self._block = None
+        self._has_content_field = False
+
+        self.blocks.append(block)
+        instruction = validate_instruction(parse_instruction_block(block), self.line_count)
+        self.instructions.append(instruction)
+        return [instruction]
+
+
+def dump_instructions(instructions: List[ModificationInstruction]) -> Optional[List[dict]]:
+    """转换为可保存到 JSON 列的数据，没有指令时返回 None"""
+    return [instruction.model_dump() for instruction in instructions] or None
+
+
+def parse_instructions(markdown: str, line_count: Optional[int] = None) -> List[ModificationInstruction]:
+    """解析完整审查结果中的修改指令"""
+    parser = StreamingInstructionParser(line_count)
+    parser.feed(markdown)
+    parser.finish()
+    return parser.instructions
+
+
+def split_instruction_blocks(markdown: str) -> List[str]:
+    """提取审查结果中的修改指令块原文"""
+    parser = StreamingInstructionParser()
+    parser.feed(markdown)
+    parser.finish()
+    return parser.blocks
@@ -0,0 +1,93 @@
+"""
+LLM 用量统计
+
+从模型响应中读取 token 用量，包括服务端前缀缓存命中的输入 token 数
+（OpenAI 兼容接口的 prompt_tokens_details.cached_tokens），
+用于确认提示词布局是否让重复审查命中了服务端缓存。
+"""
+from typing import Any, Dict, Optional
+
+
+def extract_usage(message: Any) -> Optional[Dict[str, int]]:
+    """
+    从 AIMessage 中读取 token 用量
+
+    Returns:
+        {input_tokens, cached_tokens, output_tokens}，响应中没有用量信息时返回 None
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if isinstance(usage, dict) and usage:
+        details = usage.get("input_token_details") or {}
+        return {
+            "input_tokens": usage.get("input_tokens", 0),
+            "cached_tokens": details.get("cache_read", 0) or 0,
+            "output_tokens": usage.get("output_tokens", 0),
+        }
+
+    # 部分兼容接口只在 response_metadata 中返回原始用量
+    metadata = getattr(message, "response_metadata", None)
+    token_usage = metadata.get("token_usage") if isinstance(metadata, dict) else None
+    if isinstance(token_usage, dict) and token_usage:
+        details = token_usage.get("prompt_tokens_details") or {}
+        return {
+            "input_tokens": token_usage.get("prompt_tokens", 0),
+            "cached_tokens": details.get("cached_tokens", 0) or 0,
+            "output_tokens": token_usage.get("completion_tokens", 0),
+        }
+    return None
+
+
+def merge_usage(total: Optional[Dict[str, int]], usage: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """累加两次调用的用量"""
+    if usage is None:
+        return total
+    if total is None:
+        return dict(usage)
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in usage}
+
+
+class LLMUsageStats:
+    """进程内累计的 LLM 用量"""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+
+    def record(self, message: Any) -> Optional[Dict[str, int]]:
+        """记录一次模型响应的用量，返回该次用量"""
+        usage = extract_usage(message)
+        if usage is not None:
+            self.calls += 1
+            self.input_tokens += usage["input_tokens"]
+            self.cached_tokens += usage["cached_tokens"]
+            self.output_tokens += usage["output_tokens"]
+        return usage
+
+    def record_result(self, result: Any) -> Optional[Dict[str, int]]:
+        """
+        记录 Agent 调用结果中每次模型响应的用量
+
+        Returns:
+            本次 Agent 调用的总用量
+        """
+        total = None
+        if result and "messages" in result:
+            for message in result["messages"]:
+                total = merge_usage(total, self.record(message))
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hit_rate": round(self.cached_tokens / self.input_tokens, 4) if self.input_tokens else 0.0
+        }
+
+
+# 全局实例
+llm_usage = LLMUsageStats()
@@ -0,0 +1,129 @@
+"""
+流式消息检查点
+
+流式生成期间由后台任务把累积的增量批量追加到消息行，
+进程中途退出时数据库中仍保留大部分已生成的内容。追加写入不会阻塞流本身。
+"""
+import asyncio
+from typing import Callable, List, Optional
+
+from sqlalchemy import func, update
+
+from app.core.config import settings
+from app.models.message import Message
+
+
+class MessageCheckpointer:
+    """
+    消息检查点写入器
+
+    每累积 every_tokens 个增量或每隔 interval_ms 毫秒（有新内容时）
+    执行一次 `content = content || :delta` 追加写入。
+
+    用法：
+        checkpointer = MessageCheckpointer(message_id, AsyncSessionLocal)
+        checkpointer.start()
+        checkpointer.append(content=delta)
+        await checkpointer.aclose()   # 正常结束，写入剩余内容
+        checkpointer.finish()         # 无法 await 时（如客户端断开），由后台任务写入剩余内容
+    """
+
+    def __init__(
+        self,
+        message_id: str,
+        session_factory: Callable,
+        every_tokens: Optional[int] = None,
+        interval_ms: Optional[float] = None
+    ):
+        """
+        Args:
+            message_id: 消息ID
+            session_factory: 异步数据库会话工厂
+            every_tokens: 累积多少个增量后写入，默认取 STREAM_CHECKPOINT_TOKENS
+            interval_ms: 最长写入间隔（毫秒），默认取 STREAM_CHECKPOINT_INTERVAL_MS
+        """
+        self.message_id = message_id
+        self.session_factory = session_factory
+        self.every_tokens = every_tokens or settings.STREAM_CHECKPOINT_TOKENS
+        self.interval = (interval_ms or settings.STREAM_CHECKPOINT_INTERVAL_MS) / 1000
+        self.flush_count = 0
+
+        self._content: List[str] = []
+        self._thinking: List[str] = []
+        self._pending_tokens = 0
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """启动后台写入任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def append(self, content: str = "", thinking: str = "") -> None:
+        """
+        追加增量（只写内存，不阻塞）
+
+        Args:
+            content: 回复内容增量
+            thinking: 思考过程增量
+        """
+        if content:
+            self._content.append(content)
+        if thinking:
+            self._thinking.append(thinking)
+        self._pending_tokens += 1
+        if self._pending_tokens >= self.every_tokens:
+            self._wakeup.set()
+
+    def finish(self) -> None:
+        """通知后台任务写入剩余内容后退出（不等待）"""
+        self._closing = True
+        self._wakeup.set()
+
+    async def aclose(self) -> None:
+        """写入剩余内容并等待后台任务退出"""
+        self.finish()
+        if self._task is not None:
+            await self._task
+
+    async def _run(self) -> None:
+        """后台循环：按增量数或时间间隔批量写入"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+        await self._flush()
+
+    async def _flush(self) -> None:
+        """把缓冲的增量追加到消息行，失败时保留缓冲等待下次重试"""
+        if not self._content and not self._thinking:
+            return
+
+        content = "".join(self._content)
+        thinking = "".join(self._thinking)
+        self._content, self._thinking = [], []
+        self._pending_tokens = 0
+
+        values = {}
+        if content:
+            values["content"] = Message.content + content
+        if thinking:
+            values["thinking_process"] = func.coalesce(Message.thinking_process, "") + thinking
+
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(Message)
+                    .where(Message.message_id == self.message_id)
+                    .values(**values)
+                )
+                await db.commit()
+            self.flush_count += 1
+        except Exception as e:
+            print(f"消息检查点写入失败: {e}")
+            self._content.insert(0, content)
+            self._thinking.insert(0, thinking)
@@ -0,0 +1,118 @@
+"""
+消息服务
+"""
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+from sqlalchemy import and_, func, literal, null, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.message import Message
+from app.utils.cursor import decode_cursor, encode_cursor
+
+
+class ContentMode(str, Enum):
+    """消息列表返回内容的方式"""
+    FULL = "full"  # 完整内容和思考过程
+    TRUNCATED = "truncated"  # 截断的内容预览，不含思考过程
+    NONE = "none"  # 只返回元数据
+
+
+class MessagePage(BaseModel):
+    """一页消息"""
+    rows: List[dict] = Field(default_factory=list, description="消息数据")
+    total: int = Field(0, description="会话消息总数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多时为 None")
+
+
+async def get_messages_page(
+    db: AsyncSession,
+    session_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    order: str = "asc",
+    content_mode: ContentMode = ContentMode.FULL,
+    preview_length: int = 200
+) -> MessagePage:
+    """
+    按 (created_at, id) keyset 分页获取会话消息
+
+    只查询需要的列：截断模式在数据库中截取内容，不读取完整的大文本列。
+
+    Args:
+        db: 数据库会话
+        session_id: 会话ID
+        limit: 每页条数，None 表示返回全部
+        cursor: 上一页返回的游标
+        order: asc（从旧到新）或 desc（从新到旧）
+        content_mode: 返回内容的方式
+        preview_length: 截断模式下保留的字符数
+
+    Returns:
+        一页消息
+
+    Raises:
+        ValueError: 游标或排序方式无效
+    """
+    if order not in ("asc", "desc"):
+        raise ValueError(f"无效的排序方式: {order}")
+
+    if content_mode == ContentMode.FULL:
+        content = Message.content
+        thinking = Message.thinking_process
+        instructions = Message.instructions
+    elif content_mode == ContentMode.TRUNCATED:
+        content = func.substr(Message.content, 1, preview_length)
+        thinking = null()
+        instructions = null()
+    else:
+        content = null()
+        thinking = null()
+        instructions = null()
+
+    stmt = select(
+        Message.id,
+        Message.message_id,
+        Message.session_id,
+        Message.role,
+        Message.created_at,
+        content.label("content"),
+        thinking.label("thinking_process"),
+        instructions.label("instructions"),
+        (func.length(Message.content) if content_mode != ContentMode.FULL else literal(None)).label("content_length")
+    ).where(Message.session_id == session_id)
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        if order == "asc":
+            stmt = stmt.where(or_(
+                Message.created_at > created_at,
+                and_(Message.created_at == created_at, Message.id > row_id)
+            ))
+        else:
+            stmt = stmt.where(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < row_id)
+            ))
+
+    if order == "asc":
+        stmt = stmt.order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+
+    if limit is not None:
+        # 多取一条判断是否还有下一页
+        stmt = stmt.limit(limit + 1)
+
+    rows = [dict(row) for row in (await db.execute(stmt)).mappings().all()]
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    total = await db.scalar(
+        select(func.count()).select_from(Message).where(Message.session_id == session_id)
+    )
+    return MessagePage(rows=rows, total=total, next_cursor=next_cursor)
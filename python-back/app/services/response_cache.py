@@ -0,0 +1,244 @@
+"""
+LLM 响应缓存
+
+用户经常对同一个文件、同一个问题重复点击审查，每次都会完整运行一遍 Agent。
+这里按 (模型, 温度, 系统提示词哈希, 规范化后的代码哈希, 问题) 缓存最终回复：
+- 存储在本地 SQLite 中，进程重启后仍可命中
+- 超过 TTL 的条目视为失效；条目数超出上限时淘汰最久未访问的条目
+
+命中时访问时间只记在内存中，随下一次写入一并提交；过期条目定期批量清理。
+异步调用方使用 aget / aset，读写在线程池中执行，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+
+def normalize_code(code: str) -> str:
+    """
+    规范化代码：统一换行符、去掉行尾空白和末尾空行
+
+    只做不影响语义的规范化，避免编辑器差异导致缓存不命中。
+    """
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).rstrip("\n")
+
+
+class ResponseCache:
+    """基于 SQLite 的 LLM 响应缓存（TTL + LRU）"""
+
+    # 清理过期条目的最小间隔（秒）
+    CLEANUP_INTERVAL = 300.0
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: float = 86400,
+        max_entries: int = 1000,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 最多保留的条目数
+            enabled: 是否启用缓存
+        """
+        self.enabled = enabled
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # 当前条目数（包含尚未清理的过期条目）
+        self._entries = 0
+        # 尚未写入数据库的访问时间 {key: last_access}
+        self._pending_touches: Dict[str, float] = {}
+        self._last_cleanup = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if enabled:
+            self._open_db(db_path)
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        system_prompt: str,
+        code: str,
+        question: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        计算缓存键
+
+        Args:
+            model: 模型名称
+            temperature: 温度
+            system_prompt: 系统提示词
+            code: 代码内容（规范化后参与哈希）
+            question: 用户问题
+            extra: 其他影响提示词的参数，例如文件名、语言、审查模式
+        """
+        header = json.dumps(
+            [
+                model,
+                temperature,
+                hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+                hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest(),
+                (question or "").strip(),
+                extra or {}
+            ],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(header.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取未过期的缓存条目"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute(
+                "SELECT value, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                # 过期条目留给下一次写入时的批量清理
+                self.misses += 1
+                return None
+
+            self._pending_touches[key] = now
+            self.hits += 1
+            return row[0]
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get 的异步版本"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存，超出条目上限时淘汰最久未访问的条目"""
+        if not self.enabled or not value:
+            return
+
+        with self._lock:
+            now = time.time()
+            self._pending_touches.pop(key, None)
+            if self._pending_touches:
+                self._conn.executemany(
+                    "UPDATE response_cache SET last_access = ? WHERE key = ?",
+                    [(last_access, touched) for touched, last_access in self._pending_touches.items()]
+                )
+                self._pending_touches.clear()
+
+            exists = self._conn.execute(
+                "SELECT 1 FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if exists is None:
+                self._entries += 1
+
+            # 定期清理过期条目，超出条目上限时再按最久未访问淘汰
+            if now - self._last_cleanup >= self.CLEANUP_INTERVAL:
+                self._entries -= self._conn.execute(
+                    "DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).rowcount
+                self._last_cleanup = now
+            if self._entries > self.max_entries:
+                overflow = self._entries - self.max_entries
+                self._conn.execute(
+                    """
+                    DELETE FROM response_cache WHERE key IN (
+                        SELECT key FROM response_cache ORDER BY last_access ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,)
+                )
+                self._entries -= overflow
+                self.evictions += overflow
+            self._conn.commit()
+
+    async def aset(self, key: str, value: str) -> None:
+        """set 的异步版本"""
+        if not self.enabled or not value:
+            return
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        """清空所有缓存"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+            self._entries = 0
+            self._pending_touches.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": self._entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _open_db(self, db_path: str) -> None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_response_cache_last_access ON response_cache (last_access)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """获取全局响应缓存（按配置懒加载）"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache(
+            db_path=settings.RESPONSE_CACHE_DB_PATH,
+            ttl_seconds=settings.RESPONSE_CACHE_TTL,
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            enabled=settings.RESPONSE_CACHE_ENABLED
+        )
+    return _default_cache
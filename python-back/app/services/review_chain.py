@@ -2,15 +2,36 @@
 代码审查链服务
 使用 LangChain 1.0 Agent 模式进行代码审查
 """
-from typing import Dict, List, Optional, Annotated
+from typing import Callable, Dict, List, Optional, Tuple, Union, Annotated
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from app.core.config import settings
-import subprocess
-import json
-import tempfile
+from app.services.analysis_cache import get_analysis_cache
+from app.services.llm_usage import llm_usage
+from app.services.response_cache import ResponseCache, get_response_cache
+from app.services.code_chunker import (
+    CodeChunk,
+    estimate_tokens,
+    remap_instruction_positions,
+    shift_instruction_positions,
+    split_code,
+)
+from app.services.code_diff import FileDiff, compute_diff, split_lines
+from app.services.instruction_parser import instruction_line_range, split_instruction_blocks
+from app.services.complexity_analyzer import (
+    ComplexityResult,
+    analyze_complexity,
+    format_complexity_report,
+)
+from app.services.security_rules import (
+    SecurityFinding,
+    default_engine as security_engine,
+    format_security_report,
+)
+from app.utils.pylint_pool import PYLINT_ARGS, get_pylint_pool, get_pylint_version
+import asyncio
 import os
 
 
@@ -31,60 +52,57 @@ class PylintAnalysisTool(BaseTool):
     args_schema: type[BaseModel] = PylintAnalysisInput
     
     def _run(self, code: str, filename: str = "temp.py") -> str:
-        """执行 Pylint 分析"""
+        """执行 Pylint 分析（提交到常驻工作进程池，结果按代码内容缓存）"""
         try:
-            # 将代码写入临时文件
-            with tempfile.NamedTemporaryFile(
-                mode='w',
-                suffix='.py',
-                delete=False,
-                encoding='utf-8'
-            ) as f:
-                f.write(code)
-                temp_file = f.name
-            
-            try:
-                # 运行 Pylint
-                result = subprocess.run(
-                    ['pylint', temp_file, '--output-format=json'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                
-                # 解析 JSON 结果
-                if result.stdout:
-                    pylint_data = json.loads(result.stdout)
-                    
-                    if not pylint_data:
-                        return "✅ 未发现静态分析问题"
-                    
-                    # 格式化输出
-                    issues = []
-                    for issue in pylint_data[:15]:  # 取前15个问题
-                        issues.append(
-                            f"- Line {issue.get('line', '?')}, "
-                            f"Column {issue.get('column', '?')}: "
-                            f"[{issue.get('type', 'unknown').upper()}] "
-                            f"{issue.get('message', '')} "
-                            f"({issue.get('symbol', '')})"
-                        )
-                    
-                    return f"发现 {len(pylint_data)} 个问题（显示前15个）：\n" + "\n".join(issues)
-                else:
-                    return "✅ 未发现静态分析问题"
-                    
-            finally:
-                # 删除临时文件
-                if os.path.exists(temp_file):
-                    os.unlink(temp_file)
-                    
-        except subprocess.TimeoutExpired:
+            return get_analysis_cache().get_or_compute(
+                code, self.name, get_pylint_version(), self._tool_config(filename),
+                lambda: self._format_report(get_pylint_pool().run(code, filename))
+            )
+        except TimeoutError:
             return "⚠️ Pylint 分析超时"
-        except FileNotFoundError:
+        except ImportError:
             return "⚠️ 未安装 Pylint，跳过静态分析。建议安装：pip install pylint"
         except Exception as e:
             return f"⚠️ Pylint 分析失败: {str(e)}"
+    
+    async def _arun(self, code: str, filename: str = "temp.py") -> str:
+        """异步执行 Pylint 分析，等待期间不阻塞事件循环"""
+        async def compute() -> str:
+            return self._format_report(await get_pylint_pool().arun(code, filename))
+        
+        try:
+            return await get_analysis_cache().aget_or_compute(
+                code, self.name, get_pylint_version(), self._tool_config(filename), compute
+            )
+        except TimeoutError:
+            return "⚠️ Pylint 分析超时"
+        except ImportError:
+            return "⚠️ 未安装 Pylint，跳过静态分析。建议安装：pip install pylint"
+        except Exception as e:
+            return f"⚠️ Pylint 分析失败: {str(e)}"
+    
+    @staticmethod
+    def _tool_config(filename: str) -> Dict:
+        """影响 Pylint 输出的配置（文件名决定报告中的模块名）"""
+        return {"args": PYLINT_ARGS, "filename": os.path.basename(filename)}
+    
+    @staticmethod
+    def _format_report(pylint_data: List[Dict]) -> str:
+        """格式化 Pylint 分析结果"""
+        if not pylint_data:
+            return "✅ 未发现静态分析问题"
+        
+        issues = []
+        for issue in pylint_data[:15]:  # 取前15个问题
+            issues.append(
+                f"- Line {issue.get('line', '?')}, "
+                f"Column {issue.get('column', '?')}: "
+                f"[{issue.get('type', 'unknown').upper()}] "
+                f"{issue.get('message', '')} "
+                f"({issue.get('symbol', '')})"
+            )
+        
+        return f"发现 {len(pylint_data)} 个问题（显示前15个）：\n" + "\n".join(issues)
 
 
 class CodeComplexityInput(BaseModel):
@@ -94,51 +112,32 @@ class CodeComplexityInput(BaseModel):
 
 
 class CodeComplexityTool(BaseTool):
-    """代码复杂度分析工具（可扩展）"""
+    """代码复杂度分析工具（基于 AST）"""
     name: str = "code_complexity_analysis"
     description: str = """分析代码的复杂度指标，包括函数长度、嵌套深度、圈复杂度等。
     帮助识别需要重构的复杂代码片段。"""
     args_schema: type[BaseModel] = CodeComplexityInput
+    tool_version: str = "2.0"
     
     def _run(self, code: str, language: str = "python") -> str:
-        """执行复杂度分析"""
-        # 简单的复杂度分析实现
-        lines = code.split('\n')
-        total_lines = len(lines)
-        code_lines = len([l for l in lines if l.strip() and not l.strip().startswith('#')])
-        comment_lines = len([l for l in lines if l.strip().startswith('#')])
-        blank_lines = len([l for l in lines if not l.strip()])
-        
-        # 计算最大嵌套深度
-        max_indent = 0
-        for line in lines:
-            if line.strip():
-                indent = len(line) - len(line.lstrip())
-                max_indent = max(max_indent, indent // 4)
-        
-        report = f"""📊 代码复杂度分析：
-- 总行数: {total_lines}
-- 代码行: {code_lines}
-- 注释行: {comment_lines}
-- 空白行: {blank_lines}
-- 最大嵌套深度: {max_indent}
-- 注释率: {(comment_lines/total_lines*100):.1f}%"""
-        
-        # 给出建议
-        suggestions = []
-        if code_lines > 300:
-            suggestions.append("⚠️ 代码行数较多，建议拆分为多个模块")
-        if max_indent > 4:
-            suggestions.append("⚠️ 嵌套层次过深，建议简化逻辑或提取函数")
-        if comment_lines / total_lines < 0.1:
-            suggestions.append("💡 注释较少，建议增加文档注释")
-        
-        if suggestions:
-            report += "\n\n" + "\n".join(suggestions)
-        else:
-            report += "\n\n✅ 代码结构良好"
-            
-        return report
+        """执行复杂度分析（结果按代码内容缓存）"""
+        return get_analysis_cache().get_or_compute(
+            code, self.name, self.tool_version, {"language": language},
+            lambda: self._analyze(code, language)
+        )
+    
+    def _analyze(self, code: str, language: str = "python") -> str:
+        """复杂度分析实现"""
+        return format_complexity_report(self.analyze(code, language))
+    
+    def analyze(self, code: str, language: str = "python") -> ComplexityResult:
+        """
+        获取结构化的复杂度分析结果
+        
+        Returns:
+            文件级统计及每个函数的圈复杂度、认知复杂度、嵌套深度、参数个数和长度
+        """
+        return analyze_complexity(code, language)
 
 
 class SecurityCheckInput(BaseModel):
@@ -148,36 +147,31 @@ class SecurityCheckInput(BaseModel):
 
 
 class SecurityCheckTool(BaseTool):
-    """代码安全检查工具（可扩展）"""
+    """代码安全检查工具（单次扫描的规则引擎）"""
     name: str = "security_check"
     description: str = """检查代码中的常见安全问题，如SQL注入、硬编码密钥、不安全的函数使用等。"""
     args_schema: type[BaseModel] = SecurityCheckInput
+    tool_version: str = "2.0"
     
     def _run(self, code: str, language: str = "python") -> str:
-        """执行安全检查"""
-        issues = []
-        
-        # 简单的安全模式匹配
-        security_patterns = {
-            "eval(": "🔴 发现 eval() 使用，存在代码注入风险",
-            "exec(": "🔴 发现 exec() 使用，存在代码注入风险",
-            "pickle.loads": "🟡 发现 pickle.loads 使用，注意反序列化安全",
-            "PASSWORD": "🟡 可能存在硬编码密码",
-            "API_KEY": "🟡 可能存在硬编码 API 密钥",
-            "SECRET": "🟡 可能存在硬编码敏感信息",
-            "os.system": "🟡 发现 os.system 使用，可能存在命令注入风险",
-            "subprocess.call": "🟡 发现 subprocess 使用，注意命令注入防护",
-            "input(": "🟡 发现 input() 使用，注意输入验证",
-        }
-        
-        for pattern, message in security_patterns.items():
-            if pattern in code:
-                issues.append(f"- {message}")
+        """执行安全检查（结果按代码内容缓存）"""
+        return get_analysis_cache().get_or_compute(
+            code, self.name, self.tool_version, {"language": language},
+            lambda: self._analyze(code, language)
+        )
+    
+    def _analyze(self, code: str, language: str = "python") -> str:
+        """安全检查实现"""
+        return format_security_report(self.scan(code, language))
+    
+    def scan(self, code: str, language: str = "python") -> List[SecurityFinding]:
+        """
+        获取结构化的安全检查结果
         
-        if issues:
-            return "🔒 安全检查发现以下问题：\n" + "\n".join(issues)
-        else:
-            return "✅ 未发现明显的安全问题"
+        Returns:
+            每条发现包含规则、严重程度、行号和列号
+        """
+        return security_engine.scan(code, language)
 
 
 # ==================== Agent 配置 ====================
@@ -203,7 +197,9 @@ class CodeReviewChain:
                 pool=5.0        # 连接池超时
             ),
             # 增加最大重试次数
-            max_retries=2
+            max_retries=2,
+            # 流式响应的最后一个数据块附带 token 用量（含缓存命中数）
+            stream_usage=settings.OPENAI_STREAM_USAGE
         )
         
         # 定义可用工具
@@ -236,7 +232,22 @@ class CodeReviewChain:
 3. 使用 security_check 检查安全问题
 4. 综合工具分析结果和你的专业知识，给出全面的代码审查报告
 
-**审查维度**：
+""" + self._get_review_guidelines()
+    
+    def _get_pipeline_system_prompt(self) -> str:
+        """获取流水线模式的系统提示（工具已在本地预先执行）"""
+        return """你是一位经验丰富的代码审查专家，精通多种编程语言和最佳实践。
+
+**审查流程**：
+1. 用户消息中已附带本地预先执行的自动化分析结果（Pylint、复杂度、安全检查），无需也无法再调用工具
+2. 核对自动化分析结果，剔除误报
+3. 综合分析结果和你的专业知识，给出全面的代码审查报告
+
+""" + self._get_review_guidelines()
+    
+    def _get_review_guidelines(self) -> str:
+        """获取审查维度与输出格式要求（Agent 模式与流水线模式共用）"""
+        return """**审查维度**：
 - 代码质量：风格、命名、可读性
 - 潜在问题：bug、逻辑错误、边界处理
 - 性能优化：算法效率、资源使用
@@ -351,117 +362,563 @@ class CodeReviewChain:
         code: str,
         filename: str,
         language: str = "python",
-        user_question: Optional[str] = None
+        user_question: Optional[str] = None,
+        mode: Optional[str] = None
     ) -> str:
         """
-        使用 Agent 模式审查代码
+        审查代码
         
         Args:
             code: 代码内容
             filename: 文件名
             language: 编程语言
             user_question: 用户提出的具体问题
+            mode: 审查模式，"agent"（由 Agent 决定调用工具）或
+                  "pipeline"（本地并行预分析后单次调用 LLM），默认取 REVIEW_MODE
             
         Returns:
             审查结果（Markdown格式）
         """
+        mode = mode or settings.REVIEW_MODE
+        
+        # 相同的代码和问题直接返回缓存的审查结果
+        response_cache = get_response_cache()
+        cache_key = None
+        if response_cache.enabled:
+            system_prompt = (
+                self._get_pipeline_system_prompt() if mode == "pipeline" else self._get_system_prompt()
+            )
+            cache_key = self.get_response_cache_key(
+                code, user_question, system_prompt=system_prompt,
+                filename=filename, language=language, mode=mode
+            )
+            cached = await response_cache.aget(cache_key)
+            if cached is not None:
+                print(f"命中响应缓存: {filename}")
+                return cached
+        
         try:
-            # 构建用户请求消息
-            user_message = f"""请审查以下代码：
-
-**文件名**: {filename}
-**编程语言**: {language}
-
-**代码内容**:
-```{language}
-{code}
-```
-
-{f"**用户问题**: {user_question}" if user_question else ""}
-
-请使用你的工具对代码进行全面分析，并给出详细的审查报告。"""
-            
-            # 调用 Agent
-            result = await self.agent.ainvoke({
-                "messages": [{"role": "user", "content": user_message}]
-            })
-            
-            # 提取最终响应
-            if result and "messages" in result:
-                # 获取最后一条消息（AI的最终回复）
-                last_message = result["messages"][-1]
-                if hasattr(last_message, "content"):
-                    return last_message.content
-                elif isinstance(last_message, dict):
-                    return last_message.get("content", "未能生成审查报告")
+            complete = True
+            if estimate_tokens(code) > settings.REVIEW_CHUNK_MAX_TOKENS:
+                review_result, complete = await self._review_in_chunks(
+                    code, filename, language, user_question, mode
+                )
+            elif mode == "pipeline":
+                review_result = await self._review_with_pipeline(code, filename, language, user_question)
+            else:
+                review_result = await self._review_with_agent(code, filename, language, user_question)
             
-            return "未能生成审查报告"
+            # 部分分块失败的结果不缓存
+            if cache_key and complete:
+                await response_cache.aset(cache_key, review_result)
+            return review_result
             
         except Exception as e:
             # 捕获并处理异常
             error_msg = str(e)
             print(f"代码审查失败: {error_msg}")
-            
-            # 检查是否是连接错误
-            if "Connection" in error_msg or "connection" in error_msg.lower():
-                raise ConnectionError(
-                    f"无法连接到 OpenAI API。请检查：\n"
-                    f"1. 网络连接是否正常\n"
-                    f"2. OPENAI_API_KEY 是否正确配置\n"
-                    f"3. API 服务是否可用\n"
-                    f"原始错误: {error_msg}"
-                )
-            elif "API key" in error_msg.lower() or "authentication" in error_msg.lower():
-                raise ValueError(
-                    f"OpenAI API 认证失败。请检查 OPENAI_API_KEY 是否正确配置。\n"
-                    f"原始错误: {error_msg}"
+            raise self._review_error(error_msg)
+    
+    @staticmethod
+    def _review_error(error_msg: str) -> Exception:
+        """把审查过程中的异常转换为接口可以区分的异常类型"""
+        # 检查是否是连接错误
+        if "Connection" in error_msg or "connection" in error_msg.lower():
+            return ConnectionError(
+                f"无法连接到 OpenAI API。请检查：\n"
+                f"1. 网络连接是否正常\n"
+                f"2. OPENAI_API_KEY 是否正确配置\n"
+                f"3. API 服务是否可用\n"
+                f"原始错误: {error_msg}"
+            )
+        elif "API key" in error_msg.lower() or "authentication" in error_msg.lower():
+            return ValueError(
+                f"OpenAI API 认证失败。请检查 OPENAI_API_KEY 是否正确配置。\n"
+                f"原始错误: {error_msg}"
+            )
+        else:
+            # 其他错误，保留原始错误信息
+            return Exception(f"代码审查失败: {error_msg}")
+    
+    @staticmethod
+    def _build_review_message(
+        code: str,
+        filename: str,
+        language: str,
+        user_question: Optional[str],
+        scope: Optional[str] = None,
+        analysis_text: Optional[str] = None,
+        instruction: str = ""
+    ) -> str:
+        """
+        构建审查请求消息
+        
+        服务端提示词缓存按前缀匹配：系统提示词和工具定义之后紧跟代码内容，
+        文件名、语言、代码范围和用户问题放在末尾。同一份代码换一个问题或重复审查时，
+        前面的长前缀可以直接命中缓存。
+        
+        Args:
+            code: 代码内容
+            filename: 文件名
+            language: 编程语言
+            user_question: 用户问题
+            scope: 代码范围说明（分块审查时使用）
+            analysis_text: 本地自动化分析结果（流水线模式）
+            instruction: 结尾的审查指令
+        """
+        parts = [f"请审查以下代码：\n\n**代码内容**:\n```{language}\n{code}\n```"]
+        if analysis_text is not None:
+            parts.append(f"**自动化分析结果**（已在本地执行完毕）:\n{analysis_text}")
+        
+        metadata = f"**文件名**: {filename}\n**编程语言**: {language}"
+        if scope:
+            metadata += f"\n**代码范围**: {scope}"
+        parts.append(metadata)
+        
+        if user_question:
+            parts.append(f"**用户问题**: {user_question}")
+        if instruction:
+            parts.append(instruction)
+        return "\n\n".join(parts)
+    
+    @staticmethod
+    def _record_usage(filename: str, usage: Optional[Dict[str, int]]) -> None:
+        """输出单次审查的 token 用量"""
+        if usage:
+            print(
+                f"审查 {filename} 用量: 输入 {usage['input_tokens']} tokens"
+                f"（缓存命中 {usage['cached_tokens']}），输出 {usage['output_tokens']} tokens"
+            )
+    
+    async def _review_with_agent(
+        self,
+        code: str,
+        filename: str,
+        language: str,
+        user_question: Optional[str],
+        scope: Optional[str] = None
+    ) -> str:
+        """Agent 模式：由 Agent 自行决定调用哪些分析工具"""
+        user_message = self._build_review_message(
+            code, filename, language, user_question, scope,
+            instruction="请使用你的工具对代码进行全面分析，并给出详细的审查报告。"
+        )
+        
+        # 调用 Agent
+        result = await self.agent.ainvoke({
+            "messages": [{"role": "user", "content": user_message}]
+        })
+        self._record_usage(filename, llm_usage.record_result(result))
+        return self._extract_final_content(result)
+    
+    async def _review_with_pipeline(
+        self,
+        code: str,
+        filename: str,
+        language: str,
+        user_question: Optional[str],
+        scope: Optional[str] = None,
+        analysis_code: Optional[str] = None
+    ) -> str:
+        """
+        流水线模式：本地并行执行所有适用的分析工具，再把精简结果注入单次 LLM 调用
+        
+        省去 Agent 每次决定调用工具的模型往返，以及工具参数中重复发送的代码。
+        预分析失败时回退到 Agent 模式。
+        
+        Args:
+            analysis_code: 交给本地分析工具的代码（行号与 code 一致），默认为 code
+        """
+        try:
+            analysis = await self.run_pre_analysis(analysis_code or code, filename, language)
+        except Exception as e:
+            print(f"本地预分析失败，回退到 Agent 模式: {e}")
+            return await self._review_with_agent(code, filename, language, user_question, scope)
+        
+        analysis_text = "\n\n".join(
+            f"#### {tool_name}\n{output}" for tool_name, output in analysis.items()
+        )
+        user_message = self._build_review_message(
+            code, filename, language, user_question, scope,
+            analysis_text=analysis_text,
+            instruction="请结合自动化分析结果，给出详细的审查报告。"
+        )
+        
+        response = await self.llm.ainvoke([
+            {"role": "system", "content": self._get_pipeline_system_prompt()},
+            {"role": "user", "content": user_message}
+        ])
+        self._record_usage(filename, llm_usage.record(response))
+        return response.content or "未能生成审查报告"
+    
+    async def _review_in_chunks(
+        self,
+        code: str,
+        filename: str,
+        language: str,
+        user_question: Optional[str],
+        mode: str
+    ) -> Tuple[str, bool]:
+        """
+        分块审查大文件
+        
+        按函数/类边界（非 Python 按行窗口）切分后有界并发地审查各分块，
+        并把各分块修改指令中的片段内行号映射回原文件行号。
+        
+        Returns:
+            (合并后的审查结果（Markdown格式，分块顺序与原文件一致）, 是否所有分块都审查成功)
+        """
+        chunks = await asyncio.to_thread(split_code, code, language, settings.REVIEW_CHUNK_MAX_TOKENS)
+        skipped = chunks[settings.REVIEW_MAX_CHUNKS:]
+        chunks = chunks[:settings.REVIEW_MAX_CHUNKS]
+        total_lines = code.count("\n") + 1
+        print(f"文件 {filename} 过大，分为 {len(chunks)} 段审查")
+        
+        reviews = await self._review_segments(chunks, total_lines, filename, language, user_question, mode)
+        
+        results = [f"# 📝 分块代码审查报告（共 {len(chunks)} 段）\n"]
+        for chunk, review_result in zip(chunks, reviews):
+            title = f"\n## 第 {chunk.index + 1} 段：第 {chunk.start_line}-{chunk.end_line} 行"
+            if chunk.symbols:
+                symbols = "、".join(chunk.symbols[:5])
+                title += f"（{symbols}{' 等' if len(chunk.symbols) > 5 else ''}）"
+            results.append(title + "\n")
+            results.append(self._format_segment_result(review_result))
+            results.append("\n---\n")
+        
+        if skipped:
+            results.append(
+                f"\n⚠️ 文件过大，第 {skipped[0].start_line}-{skipped[-1].end_line} 行"
+                f"（{len(skipped)} 段）未审查\n"
+            )
+        complete = not any(isinstance(r, BaseException) for r in reviews)
+        return "\n".join(results), complete
+    
+    async def _review_segments(
+        self,
+        chunks: List[CodeChunk],
+        total_lines: int,
+        filename: str,
+        language: str,
+        user_question: Optional[str],
+        mode: str,
+        note: Optional[str] = None
+    ) -> List[Union[str, BaseException]]:
+        """
+        有界并发地审查代码片段
+        
+        各片段修改指令中的片段内行号映射回原文件行号。
+        
+        Args:
+            chunks: 代码片段
+            total_lines: 原文件行数
+            note: 附加在范围说明中的提示（可选）
+        
+        Returns:
+            与 chunks 顺序一致的审查结果，失败的片段为对应的异常
+        
+        Raises:
+            所有片段都失败时抛出第一个异常
+        """
+        semaphore = asyncio.Semaphore(settings.REVIEW_MAX_CONCURRENCY)
+        
+        async def review_chunk(chunk: CodeChunk) -> str:
+            scope = f"原文件第 {chunk.start_line}-{chunk.end_line} 行（共 {total_lines} 行）的片段，"
+            if note:
+                scope += f"{note}，"
+            scope += "修改指令中的行号请以片段第一行为第 1 行"
+            if mode == "pipeline":
+                # 拆分后的类成员带缩进，本地预分析使用去掉公共缩进的代码
+                review = self._review_with_pipeline(
+                    chunk.code, filename, language, user_question, scope,
+                    analysis_code=chunk.analysis_code()
                 )
             else:
-                # 其他错误，抛出原始异常
-                raise Exception(f"代码审查失败: {error_msg}")
+                review = self._review_with_agent(chunk.code, filename, language, user_question, scope)
+            async with semaphore:
+                result = await asyncio.wait_for(review, timeout=settings.REVIEW_FILE_TIMEOUT)
+            return shift_instruction_positions(result, chunk.start_line - 1)
+        
+        reviews = await asyncio.gather(
+            *(review_chunk(chunk) for chunk in chunks), return_exceptions=True
+        )
+        errors = [r for r in reviews if isinstance(r, BaseException)]
+        if errors and len(errors) == len(reviews):
+            # 所有片段都失败时按单文件失败处理
+            raise errors[0]
+        return reviews
+    
+    @staticmethod
+    def _format_segment_result(review_result: Union[str, BaseException]) -> str:
+        """片段审查结果，失败时输出失败原因"""
+        if isinstance(review_result, asyncio.TimeoutError):
+            return f"❌ **审查失败**：审查超时（超过 {settings.REVIEW_FILE_TIMEOUT:g} 秒）"
+        if isinstance(review_result, BaseException):
+            return f"❌ **审查失败**：{review_result}"
+        return review_result
+    
+    async def review_changes(
+        self,
+        code: str,
+        previous_code: str,
+        previous_review: str,
+        filename: str,
+        language: str = "python",
+        user_question: Optional[str] = None,
+        mode: Optional[str] = None
+    ) -> str:
+        """
+        增量审查：只审查与上一版本相比修改过的部分
+        
+        修改块前后扩展 REVIEW_INCREMENTAL_CONTEXT_LINES 行上下文后分段审查；
+        上一版本审查结果中位于未修改区域的修改指令映射到新行号后保留，
+        位于修改区域的指令由本次审查结果取代。修改行数超过
+        REVIEW_INCREMENTAL_MAX_CHANGE_RATIO 时改为完整审查。
+        
+        Args:
+            code: 新版本代码
+            previous_code: 上一版本代码
+            previous_review: 上一版本的审查结果
+            filename: 文件名
+            language: 编程语言
+            user_question: 用户提出的具体问题
+            mode: 审查模式，默认取 REVIEW_MODE
+            
+        Returns:
+            审查结果（Markdown格式）
+        """
+        mode = mode or settings.REVIEW_MODE
+        diff = compute_diff(previous_code, code)
+        if not diff.hunks:
+            return f"✅ 文件内容与上一版本相同，沿用上一版本的审查结果。\n\n{previous_review}"
+        
+        if diff.changed_lines > diff.new_line_count * settings.REVIEW_INCREMENTAL_MAX_CHANGE_RATIO:
+            print(f"文件 {filename} 修改较多（{diff.changed_lines} 行），改为完整审查")
+            return await self.review_code(code, filename, language, user_question, mode)
+        
+        context = settings.REVIEW_INCREMENTAL_CONTEXT_LINES
+        regions = diff.changed_regions(context)
+        lines = split_lines(code)
+        chunks: List[CodeChunk] = []
+        for start, end in regions:
+            # 单个修改范围超出 token 预算时继续切分
+            for piece in split_code("\n".join(lines[start - 1:end]), language, settings.REVIEW_CHUNK_MAX_TOKENS):
+                chunks.append(CodeChunk(
+                    index=len(chunks),
+                    start_line=start + piece.start_line - 1,
+                    end_line=start + piece.end_line - 1,
+                    code=piece.code
+                ))
+        print(f"文件 {filename} 增量审查：{len(diff.hunks)} 处修改，{len(chunks)} 段")
+        
+        note = f"包含本次修改的代码及前后最多 {context} 行上下文，请重点审查修改的部分"
+        try:
+            reviews = await self._review_segments(
+                chunks, diff.new_line_count, filename, language, user_question, mode, note
+            )
+        except Exception as e:
+            error_msg = str(e)
+            print(f"增量审查失败: {error_msg}")
+            raise self._review_error(error_msg)
+        
+        added = sum(hunk.added for hunk in diff.hunks)
+        removed = sum(hunk.removed for hunk in diff.hunks)
+        results = [
+            "# 🔁 增量代码审查报告\n",
+            f"与上一版本相比有 {len(diff.hunks)} 处修改（+{added} / -{removed} 行），"
+            f"本次只审查修改部分及前后 {context} 行上下文，未修改区域沿用上一版本的审查结论。\n",
+            "## 修改部分审查\n"
+        ]
+        for chunk, review_result in zip(chunks, reviews):
+            results.append(f"\n### 第 {chunk.start_line}-{chunk.end_line} 行\n")
+            results.append(self._format_segment_result(review_result))
+            results.append("\n---\n")
+        
+        carried = self._carry_over_instructions(previous_review, diff, regions)
+        results.append("\n## 沿用的修改指令（未修改区域）\n")
+        if carried:
+            results.append("\n\n".join(carried))
+        else:
+            results.append("上一版本在未修改区域没有待处理的修改指令。")
+        return "\n".join(results)
+    
+    @staticmethod
+    def _carry_over_instructions(
+        previous_review: str,
+        diff: FileDiff,
+        regions: List[Tuple[int, int]]
+    ) -> List[str]:
+        """
+        保留上一版本审查结果中仍然适用的修改指令
+        
+        指令涉及的行都未修改、且不在本次重新审查的范围内时，把行号映射到新版本后保留。
+        """
+        carried = []
+        for block in split_instruction_blocks(previous_review):
+            line_range = instruction_line_range(block)
+            if line_range is None:
+                continue
+            mapped = [diff.map_old_line(line) for line in range(line_range[0], line_range[1] + 1)]
+            if not mapped or None in mapped:
+                continue
+            if any(start <= line <= end for line in mapped for start, end in regions):
+                continue
+            carried.append(remap_instruction_positions(block, diff.map_old_line))
+        return carried
+    
+    def get_response_cache_key(
+        self,
+        code: str,
+        question: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **extra
+    ) -> str:
+        """
+        计算响应缓存键
+        
+        Args:
+            code: 代码内容
+            question: 用户问题
+            system_prompt: 系统提示词，默认为 Agent 的系统提示词
+            **extra: 其他影响提示词的参数
+        """
+        return ResponseCache.make_key(
+            model=self.llm.model_name,
+            temperature=self.llm.temperature,
+            system_prompt=system_prompt or self._get_system_prompt(),
+            code=code,
+            question=question,
+            extra=extra
+        )
+    
+    def _get_applicable_tools(self, language: str) -> List[BaseTool]:
+        """获取适用于指定语言的分析工具（Pylint 仅适用于 Python）"""
+        return [
+            tool for tool in self.tools
+            if not (isinstance(tool, PylintAnalysisTool) and language != "python")
+        ]
+    
+    async def run_pre_analysis(
+        self,
+        code: str,
+        filename: str,
+        language: str = "python"
+    ) -> Dict[str, str]:
+        """
+        并行执行所有适用的分析工具
+        
+        Returns:
+            {工具名: 精简后的工具输出}，顺序与 self.tools 一致
+        """
+        tools = self._get_applicable_tools(language)
+        
+        async def run_tool(tool: BaseTool) -> str:
+            fields = tool.args_schema.model_fields if tool.args_schema else {}
+            args = {"code": code}
+            if "filename" in fields:
+                args["filename"] = filename
+            if "language" in fields:
+                args["language"] = language
+            return str(await tool.ainvoke(args))
+        
+        outputs = await asyncio.gather(*(run_tool(tool) for tool in tools))
+        return {
+            tool.name: self._compact_tool_output(output)
+            for tool, output in zip(tools, outputs)
+        }
+    
+    @staticmethod
+    def _compact_tool_output(output: str, max_chars: int = 2000) -> str:
+        """截断过长的工具输出，控制注入提示词的 token 数"""
+        if len(output) <= max_chars:
+            return output
+        return output[:max_chars] + "\n...（已截断）"
+    
+    @staticmethod
+    def _extract_final_content(result) -> str:
+        """从 Agent 调用结果中提取最终回复"""
+        if result and "messages" in result:
+            # 获取最后一条消息（AI的最终回复）
+            last_message = result["messages"][-1]
+            if hasattr(last_message, "content"):
+                return last_message.content
+            elif isinstance(last_message, dict):
+                return last_message.get("content", "未能生成审查报告")
+        
+        return "未能生成审查报告"
     
     async def review_multiple_files(
         self,
         files: List[Dict[str, str]],
-        user_question: Optional[str] = None
+        user_question: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        file_timeout: Optional[float] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> str:
         """
-        审查多个文件
+        审查多个文件（有界并发）
         
         Args:
             files: 文件列表，每个文件包含 {filename, code, language}
             user_question: 用户提出的具体问题
+            max_concurrency: 同时审查的最大文件数，默认取 REVIEW_MAX_CONCURRENCY
+            file_timeout: 单个文件的审查超时（秒），默认取 REVIEW_FILE_TIMEOUT
+            progress_callback: 每个文件审查结束后调用，参数为 (已完成数, 总数)
             
         Returns:
-            综合审查结果（Markdown格式）
+            综合审查结果（Markdown格式），文件顺序与输入一致
         """
+        max_concurrency = max_concurrency or settings.REVIEW_MAX_CONCURRENCY
+        file_timeout = file_timeout or settings.REVIEW_FILE_TIMEOUT
+        semaphore = asyncio.Semaphore(max_concurrency)
+        completed = 0
+        
+        async def review_one(file_info: Dict[str, str]) -> str:
+            """审查单个文件并报告进度"""
+            nonlocal completed
+            result = await review_one_file(file_info)
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, len(files))
+            return result
+        
+        async def review_one_file(file_info: Dict[str, str]) -> str:
+            """审查单个文件，失败时返回错误说明而不是抛出异常"""
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(
+                        self.review_code(
+                            code=file_info['code'],
+                            filename=file_info['filename'],
+                            language=file_info.get('language', 'python'),
+                            user_question=user_question
+                        ),
+                        timeout=file_timeout
+                    )
+                except asyncio.TimeoutError:
+                    print(f"文件 {file_info['filename']} 审查超时（{file_timeout} 秒）")
+                    return f"❌ **审查失败**：审查超时（超过 {file_timeout:g} 秒）"
+                except ConnectionError as e:
+                    # 连接错误，记录并继续处理其他文件
+                    error_msg = str(e)
+                    print(f"文件 {file_info['filename']} 审查失败（连接错误）: {error_msg}")
+                    return f"❌ **审查失败**：无法连接到 OpenAI API\n\n{error_msg}"
+                except Exception as e:
+                    # 其他错误，记录并继续处理其他文件
+                    error_msg = str(e)
+                    print(f"文件 {file_info['filename']} 审查失败: {error_msg}")
+                    return f"❌ **审查失败**：{error_msg}"
+        
+        # 并发审查，gather 保证结果顺序与输入一致
+        reviews = await asyncio.gather(*(review_one(file_info) for file_info in files))
+        
         results = []
         
         results.append("# 📝 多文件代码审查报告\n")
         
-        # 逐个审查文件
-        for i, file_info in enumerate(files, 1):
+        for i, (file_info, review_result) in enumerate(zip(files, reviews), 1):
             results.append(f"\n## {i}. {file_info['filename']}\n")
-            
-            try:
-                review_result = await self.review_code(
-                    code=file_info['code'],
-                    filename=file_info['filename'],
-                    language=file_info.get('language', 'python'),
-                    user_question=user_question 
-                )
-                results.append(review_result)
-            except ConnectionError as e:
-                # 连接错误，记录并继续处理其他文件
-                error_msg = str(e)
-                results.append(f"❌ **审查失败**：无法连接到 OpenAI API\n\n{error_msg}")
-                print(f"文件 {file_info['filename']} 审查失败（连接错误）: {error_msg}")
-            except Exception as e:
-                # 其他错误，记录并继续处理其他文件
-                error_msg = str(e)
-                results.append(f"❌ **审查失败**：{error_msg}")
-                print(f"文件 {file_info['filename']} 审查失败: {error_msg}")
-            
+            results.append(review_result)
             results.append("\n---\n")
         
         # 添加综合建议
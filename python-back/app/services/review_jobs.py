@@ -0,0 +1,251 @@
+"""
+后台代码审查任务
+
+提交审查后立即返回任务ID，由进程内的异步队列按配置的并发数执行，
+客户端通过轮询查询状态、进度和结果，不再长时间占用 HTTP 连接。
+审查结果与同步接口一样保存为 AI 消息。
+
+任务状态只保存在内存中，服务重启后未完成的任务会丢失（已完成任务的结果已保存为消息）。
+"""
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.services.review_chain import review_chain
+from app.services.review_service import load_review_files, review_file, save_review_message
+
+
+class ReviewJobStatus(str, Enum):
+    """审查任务状态"""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (ReviewJobStatus.SUCCEEDED, ReviewJobStatus.FAILED, ReviewJobStatus.CANCELLED)
+
+# 取消执行中的任务时等待其响应的最长时间（秒）
+CANCEL_WAIT_SECONDS = 5.0
+
+
+class ReviewJob(BaseModel):
+    """审查任务"""
+    job_id: str = Field(description="任务ID")
+    kind: str = Field(description="任务类型：single 或 multiple")
+    session_id: str = Field(description="会话ID")
+    file_ids: List[str] = Field(description="文件ID列表")
+    user_question: Optional[str] = Field(None, description="用户提出的具体问题")
+    incremental: bool = Field(True, description="单文件审查时是否允许增量审查")
+    status: ReviewJobStatus = Field(ReviewJobStatus.PENDING, description="任务状态")
+    completed_files: int = Field(0, description="已审查完成的文件数")
+    total_files: int = Field(0, description="文件总数")
+    message_id: Optional[str] = Field(None, description="审查结果对应的消息ID")
+    result: Optional[str] = Field(None, description="审查结果（Markdown格式）")
+    error: Optional[str] = Field(None, description="失败原因")
+    cancel_requested: bool = Field(False, description="是否已请求取消（执行中的任务尚未结束时为 True）")
+    created_at: datetime = Field(default_factory=datetime.utcnow, description="创建时间")
+    started_at: Optional[datetime] = Field(None, description="开始时间")
+    finished_at: Optional[datetime] = Field(None, description="结束时间")
+
+
+class ReviewJobQueue:
+    """进程内审查任务队列"""
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        max_history: Optional[int] = None,
+        session_factory: Callable = AsyncSessionLocal
+    ):
+        """
+        Args:
+            concurrency: 同时执行的任务数，默认取 REVIEW_JOB_CONCURRENCY
+            max_history: 内存中最多保留的任务数，默认取 REVIEW_JOB_MAX_HISTORY
+            session_factory: 异步数据库会话工厂
+        """
+        self.concurrency = concurrency or settings.REVIEW_JOB_CONCURRENCY
+        self.max_history = max_history or settings.REVIEW_JOB_MAX_HISTORY
+        self.session_factory = session_factory
+        self._jobs: "OrderedDict[str, ReviewJob]" = OrderedDict()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def submit(
+        self,
+        kind: str,
+        session_id: str,
+        file_ids: List[str],
+        user_question: Optional[str] = None,
+        incremental: bool = True
+    ) -> ReviewJob:
+        """
+        提交审查任务
+
+        Args:
+            kind: single 或 multiple
+            session_id: 会话ID
+            file_ids: 文件ID列表
+            user_question: 用户提出的具体问题
+            incremental: 单文件审查时是否允许增量审查
+
+        Returns:
+            新建的任务
+        """
+        self._ensure_workers()
+        job = ReviewJob(
+            job_id=f"job_{uuid.uuid4().hex[:16]}",
+            kind=kind,
+            session_id=session_id,
+            file_ids=file_ids,
+            user_question=user_question,
+            incremental=incremental,
+            total_files=len(file_ids)
+        )
+        self._jobs[job.job_id] = job
+        self._trim_history()
+        self._queue.put_nowait(job.job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReviewJob]:
+        """获取任务"""
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[ReviewJob]:
+        """
+        取消任务：排队中的任务直接标记取消，执行中的任务取消其协程并等待其结束
+
+        审查结果已经开始保存时不再取消，任务按成功结束。
+
+        Returns:
+            任务，不存在时返回 None；执行中的任务在 CANCEL_WAIT_SECONDS 内未结束时
+            状态仍为 running，cancel_requested 为 True
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return job
+
+        task = self._running.get(job_id)
+        if task is None:
+            self._finish(job, ReviewJobStatus.CANCELLED)
+            return job
+
+        if not job.cancel_requested:
+            job.cancel_requested = True
+            task.cancel()
+        await asyncio.wait({task}, timeout=CANCEL_WAIT_SECONDS)
+        if task.cancelled() and job.status not in FINISHED_STATUSES:
+            # 任务在开始执行前被取消
+            self._finish(job, ReviewJobStatus.CANCELLED)
+        return job
+
+    async def shutdown(self) -> None:
+        """停止所有工作协程"""
+        for task in [*self._running.values(), *self._workers]:
+            task.cancel()
+        await asyncio.gather(*self._running.values(), *self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def _ensure_workers(self) -> None:
+        """首次提交时启动工作协程"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+            ]
+
+    def _trim_history(self) -> None:
+        """超出上限时淘汰最早结束的任务"""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_history:
+                break
+            if self._jobs[job_id].status in FINISHED_STATUSES:
+                del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        """从队列中取出任务并执行"""
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != ReviewJobStatus.PENDING:
+                continue
+
+            task = asyncio.create_task(self._execute(job))
+            self._running[job_id] = task
+            # 不直接 await 任务，取消任务时工作协程本身不受影响
+            await asyncio.wait({task})
+            self._running.pop(job_id, None)
+            if task.cancelled() and job.status not in FINISHED_STATUSES:
+                self._finish(job, ReviewJobStatus.CANCELLED)
+
+    async def _execute(self, job: ReviewJob) -> None:
+        """执行审查并保存结果"""
+        job.status = ReviewJobStatus.RUNNING
+        job.started_at = datetime.utcnow()
+
+        def on_progress(completed: int, total: int) -> None:
+            job.completed_files = completed
+
+        try:
+            async with self.session_factory() as db:
+                line_count = None
+                if job.kind == "single":
+                    review_result, line_count = await review_file(
+                        db, job.file_ids[0], job.user_question, incremental=job.incremental
+                    )
+                    job.completed_files = 1
+                else:
+                    files = await load_review_files(db, job.file_ids)
+                    review_result = await review_chain.review_multiple_files(
+                        files=files,
+                        user_question=job.user_question,
+                        progress_callback=on_progress
+                    )
+
+                # 保存审查结果是最后一步，开始保存后不再响应取消，保存完成即按成功结束
+                save = asyncio.ensure_future(self._save_result(db, job, review_result, line_count))
+                try:
+                    await asyncio.shield(save)
+                except asyncio.CancelledError:
+                    await save
+        except asyncio.CancelledError:
+            self._finish(job, ReviewJobStatus.CANCELLED)
+            raise
+        except Exception as e:
+            print(f"审查任务 {job.job_id} 失败: {e}")
+            self._finish(job, ReviewJobStatus.FAILED, error=str(e))
+
+    async def _save_result(
+        self,
+        db,
+        job: ReviewJob,
+        review_result: str,
+        line_count: Optional[int]
+    ) -> None:
+        """保存审查结果为 AI 消息并标记任务成功"""
+        ai_message = await save_review_message(
+            db, job.session_id, review_result, line_count=line_count
+        )
+        job.result = review_result
+        job.message_id = ai_message.message_id
+        self._finish(job, ReviewJobStatus.SUCCEEDED)
+
+    @staticmethod
+    def _finish(job: ReviewJob, status: ReviewJobStatus, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.utcnow()
+
+
+# 全局实例
+review_job_queue = ReviewJobQueue()
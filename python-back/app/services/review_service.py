@@ -0,0 +1,154 @@
+"""
+代码审查服务
+
+同步审查接口和后台审查任务共用的文件读取与结果保存逻辑。
+"""
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.file import File
+from app.models.message import Message
+from app.services.code_context import get_file_records, load_code_files
+from app.services.instruction_parser import dump_instructions, parse_instructions
+from app.services.review_chain import review_chain
+
+
+async def validate_review_files(db: AsyncSession, file_ids: List[str]) -> None:
+    """
+    检查待审查的文件是否存在（一次查询）
+
+    Raises:
+        FileNotFoundError: 文件记录或文件内容不存在
+    """
+    records = await get_file_records(db, file_ids)
+    for file_id in file_ids:
+        record = records.get(file_id)
+        if record is None:
+            raise FileNotFoundError(f"文件不存在: {file_id}")
+        if not record.content and not os.path.exists(record.filepath):
+            raise FileNotFoundError(f"文件内容不存在: {record.filename}")
+
+
+async def load_review_files(db: AsyncSession, file_ids: List[str]) -> List[Dict[str, str]]:
+    """
+    读取待审查的文件
+
+    Args:
+        db: 数据库会话
+        file_ids: 文件ID列表
+
+    Returns:
+        文件列表，每个文件包含 {filename, code, language}，顺序与 file_ids 一致
+
+    Raises:
+        FileNotFoundError: 文件记录或文件内容不存在
+    """
+    files = await load_code_files(db, file_ids)
+    return [
+        {'filename': f.filename, 'code': f.code, 'language': f.language}
+        for f in files
+    ]
+
+
+async def get_file_with_parent(db: AsyncSession, file_id: str) -> Dict[str, File]:
+    """一次查询取出文件及其上一版本的记录，返回 file_id 到记录的映射"""
+    parent_id = select(File.parent_file_id).where(File.file_id == file_id).scalar_subquery()
+    records = await db.scalars(select(File).where(or_(File.file_id == file_id, File.file_id == parent_id)))
+    return {record.file_id: record for record in records}
+
+
+async def review_file(
+    db: AsyncSession,
+    file_id: str,
+    user_question: Optional[str] = None,
+    incremental: bool = True
+) -> Tuple[str, int]:
+    """
+    审查单个文件，并把结果记录到文件上供下一版本增量审查（不提交事务）
+
+    文件有上一版本且上一版本审查过时，只审查两个版本之间修改过的部分。
+
+    Args:
+        db: 数据库会话
+        file_id: 文件ID
+        user_question: 用户提出的具体问题
+        incremental: 是否允许增量审查
+
+    Returns:
+        (审查结果（Markdown格式）, 文件行数)，行数用于 save_review_message 校验修改指令
+
+    Raises:
+        FileNotFoundError: 文件记录或文件内容不存在
+    """
+    records = await get_file_with_parent(db, file_id)
+    record = records.get(file_id)
+    parent = records.get(record.parent_file_id) if record is not None and incremental else None
+    if parent is None or not parent.review_result:
+        parent = None
+
+    # 当前版本和上一版本的内容一并读取，上一版本内容丢失时回退为完整审查
+    file_ids = [file_id, parent.file_id] if parent is not None else [file_id]
+    files = await load_code_files(db, file_ids, skip_missing=True, records=records)
+    if not files or files[0].file_id != file_id:
+        # 按不跳过的方式重新检查，抛出对应的异常
+        await load_code_files(db, [file_id], records=records)
+    file_info = files[0]
+    previous = files[1] if len(files) > 1 else None
+
+    if previous is not None:
+        review_result = await review_chain.review_changes(
+            code=file_info.code,
+            previous_code=previous.code,
+            previous_review=parent.review_result,
+            filename=file_info.filename,
+            language=file_info.language,
+            user_question=user_question
+        )
+    else:
+        review_result = await review_chain.review_code(
+            code=file_info.code,
+            filename=file_info.filename,
+            language=file_info.language,
+            user_question=user_question
+        )
+
+    await db.execute(
+        update(File).where(File.file_id == file_id).values(review_result=review_result)
+    )
+    return review_result, file_info.code.count("\n") + 1
+
+
+async def save_review_message(
+    db: AsyncSession,
+    session_id: str,
+    review_result: str,
+    line_count: Optional[int] = None
+) -> Message:
+    """
+    保存审查结果为 AI 消息，并解析其中的结构化修改指令
+
+    Args:
+        db: 数据库会话
+        session_id: 会话ID
+        review_result: 审查结果
+        line_count: 单文件审查时的文件行数，用于校验修改指令的行号范围
+
+    Returns:
+        消息模型
+    """
+    message_id = f"msg_{uuid.uuid4().hex[:16]}"
+    ai_message = Message(
+        message_id=message_id,
+        session_id=session_id,
+        role='assistant',
+        content=review_result,
+        instructions=dump_instructions(parse_instructions(review_result, line_count))
+    )
+    db.add(ai_message)
+    await db.commit()
+    await db.refresh(ai_message)
+    return ai_message
@@ -0,0 +1,361 @@
+"""
+安全检查规则引擎
+
+所有规则的正则被编译成一个带命名分组的组合正则，对代码只扫描一遍，
+规则数量增加不会线性拖慢检查速度。组合正则放在零宽的前瞻中，
+多条规则在同一位置或互相重叠的位置匹配时都能报告。对 Python 代码：
+- 通过 tokenize 排除注释和字符串中的匹配
+- 对函数调用类规则，用 AST 确认匹配位置确实是一次调用（而不是文档字符串里的单词）
+每条发现都带有行号和列号。
+"""
+import ast
+import bisect
+import io
+import re
+import tokenize
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+SEVERITY_ICONS = {
+    "high": "🔴",
+    "medium": "🟡",
+    "low": "🔵",
+}
+
+
+class SecurityRule(BaseModel):
+    """安全规则"""
+    rule_id: str = Field(description="规则标识")
+    pattern: str = Field(description="匹配位置为问题起点的正则（不能包含命名分组）")
+    message: str = Field(description="问题描述")
+    severity: str = Field(default="medium", description="严重程度：high / medium / low")
+    languages: Optional[FrozenSet[str]] = Field(default=None, description="适用语言，为空表示所有语言")
+    call_names: Optional[FrozenSet[str]] = Field(
+        default=None,
+        description="Python 中需要 AST 确认的调用名（例如 eval、os.system），为空表示不做调用确认"
+    )
+    code_only: bool = Field(default=True, description="是否忽略注释和字符串中的匹配")
+
+
+class SecurityFinding(BaseModel):
+    """一条安全检查发现"""
+    rule_id: str
+    severity: str
+    message: str
+    line: int = Field(description="行号（从 1 开始）")
+    column: int = Field(description="列号（从 1 开始）")
+    snippet: str = Field(description="匹配到的代码片段")
+
+
+PYTHON = frozenset({"python"})
+JAVASCRIPT = frozenset({"javascript", "typescript", "vue", "html"})
+
+DEFAULT_RULES: List[SecurityRule] = [
+    SecurityRule(
+        rule_id="eval-call", pattern=r"\beval\s*\(", severity="high",
+        message="发现 eval() 使用，存在代码注入风险", call_names=frozenset({"eval"})
+    ),
+    SecurityRule(
+        rule_id="exec-call", pattern=r"\bexec\s*\(", severity="high",
+        message="发现 exec() 使用，存在代码注入风险", call_names=frozenset({"exec"})
+    ),
+    SecurityRule(
+        rule_id="pickle-load", pattern=r"\b(?:cPickle|pickle|dill)\.loads?\s*\(",
+        message="发现 pickle.loads 使用，注意反序列化安全",
+        call_names=frozenset({"pickle.loads", "pickle.load", "cPickle.loads", "cPickle.load", "dill.loads", "dill.load"})
+    ),
+    SecurityRule(
+        rule_id="marshal-load", pattern=r"\bmarshal\.loads?\s*\(",
+        message="发现 marshal 反序列化，注意反序列化安全",
+        call_names=frozenset({"marshal.loads", "marshal.load"})
+    ),
+    SecurityRule(
+        rule_id="yaml-load", pattern=r"\byaml\.load\s*\((?![^)]*SafeLoader)",
+        message="发现 yaml.load 未指定 SafeLoader，存在反序列化风险",
+        call_names=frozenset({"yaml.load"})
+    ),
+    SecurityRule(
+        rule_id="os-system", pattern=r"\bos\.(?:system|popen)\s*\(",
+        message="发现 os.system 使用，可能存在命令注入风险",
+        call_names=frozenset({"os.system", "os.popen"})
+    ),
+    SecurityRule(
+        rule_id="subprocess-call", pattern=r"\bsubprocess\.(?:call|run|Popen|check_call|check_output)\s*\(",
+        message="发现 subprocess 使用，注意命令注入防护",
+        call_names=frozenset({
+            "subprocess.call", "subprocess.run", "subprocess.Popen",
+            "subprocess.check_call", "subprocess.check_output"
+        })
+    ),
+    SecurityRule(
+        rule_id="shell-true", pattern=r"\bshell\s*=\s*True\b", severity="high",
+        message="发现 shell=True，存在命令注入风险", languages=PYTHON
+    ),
+    SecurityRule(
+        rule_id="input-call", pattern=r"\binput\s*\(",
+        message="发现 input() 使用，注意输入验证", call_names=frozenset({"input"})
+    ),
+    SecurityRule(
+        rule_id="sql-format", severity="high",
+        pattern=r"\b(?:execute|executemany|raw)\s*\(\s*(?:f[\"']|[\"'][^\"']*[\"']\s*(?:%|\+|\.format\b))",
+        message="发现拼接字符串构造 SQL，存在 SQL 注入风险"
+    ),
+    SecurityRule(
+        rule_id="hardcoded-password", code_only=False,
+        pattern=r"(?i:\b\w*(?:PASSWORD|PASSWD|PWD)\w*[\"']?\s*[:=]\s*[\"'][^\"'\s]+[\"'])",
+        message="可能存在硬编码密码"
+    ),
+    SecurityRule(
+        rule_id="hardcoded-api-key", code_only=False,
+        pattern=r"(?i:\b\w*(?:API_?KEY|ACCESS_?KEY)\w*[\"']?\s*[:=]\s*[\"'][^\"'\s]+[\"'])",
+        message="可能存在硬编码 API 密钥"
+    ),
+    SecurityRule(
+        rule_id="hardcoded-secret", code_only=False,
+        pattern=r"(?i:\b\w*(?:SECRET|TOKEN|PRIVATE_?KEY)\w*[\"']?\s*[:=]\s*[\"'][^\"'\s]+[\"'])",
+        message="可能存在硬编码敏感信息"
+    ),
+    SecurityRule(
+        rule_id="weak-hash", pattern=r"\bhashlib\.(?:md5|sha1)\s*\(", severity="low",
+        message="发现弱哈希算法（md5/sha1），不应用于密码或签名",
+        call_names=frozenset({"hashlib.md5", "hashlib.sha1"})
+    ),
+    SecurityRule(
+        rule_id="tls-verify-disabled", pattern=r"\bverify\s*=\s*False\b",
+        message="发现 verify=False，TLS 证书校验被关闭", languages=PYTHON
+    ),
+    SecurityRule(
+        rule_id="js-new-function", pattern=r"\bnew\s+Function\s*\(", severity="high",
+        message="发现 new Function()，存在代码注入风险", languages=JAVASCRIPT
+    ),
+    SecurityRule(
+        rule_id="js-inner-html", pattern=r"\.(?:innerHTML|outerHTML)\s*=(?!=)",
+        message="发现直接写入 innerHTML，存在 XSS 风险", languages=JAVASCRIPT
+    ),
+    SecurityRule(
+        rule_id="js-document-write", pattern=r"\bdocument\.write(?:ln)?\s*\(",
+        message="发现 document.write()，存在 XSS 风险", languages=JAVASCRIPT
+    ),
+    SecurityRule(
+        rule_id="vue-v-html", pattern=r"\bv-html\s*=",
+        message="发现 v-html 指令，注意内容需经过转义", languages=frozenset({"vue"}), code_only=False
+    ),
+]
+
+
+# ==================== 辅助函数 ====================
+
+def _python_non_code_spans(code: str, line_starts: List[int]) -> Optional[List[Tuple[int, int]]]:
+    """用 tokenize 找出注释和字符串所在的字符区间，失败时返回 None"""
+    non_code_types = {tokenize.COMMENT, tokenize.STRING}
+    fstring_middle = getattr(tokenize, "FSTRING_MIDDLE", None)
+    if fstring_middle is not None:
+        non_code_types.add(fstring_middle)
+
+    spans = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in non_code_types:
+                start = line_starts[token.start[0] - 1] + token.start[1]
+                end = line_starts[token.end[0] - 1] + token.end[1]
+                spans.append((start, end))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    return spans
+
+
+def _c_like_non_code_spans(code: str) -> List[Tuple[int, int]]:
+    """扫描 C 风格语言中的注释和字符串区间"""
+    spans = []
+    i, n = 0, len(code)
+    while i < n:
+        ch = code[i]
+        if ch in "\"'`":
+            start = i
+            i += 1
+            while i < n and code[i] != ch:
+                i += 2 if code[i] == "\\" else 1
+            spans.append((start, min(i + 1, n)))
+        elif code.startswith("//", i):
+            end = code.find("\n", i)
+            end = n if end == -1 else end
+            spans.append((i, end))
+            i = end
+        elif code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            spans.append((i, end))
+            i = end
+            continue
+        i += 1
+    return spans
+
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    """获取调用目标的点分名称，例如 os.system"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def _python_calls(code: str, lines: List[str]) -> Optional[Dict[Tuple[int, int], str]]:
+    """
+    收集所有函数调用的位置
+
+    Returns:
+        {(行号, 字符列号): 点分调用名}，代码无法解析时返回 None
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+
+    calls = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name is None:
+                continue
+            lineno, col = node.func.lineno, node.func.col_offset
+            line = lines[lineno - 1] if lineno - 1 < len(lines) else ""
+            if not line.isascii():
+                # AST 的列号是 UTF-8 字节偏移，需要换算成字符偏移
+                col = len(line.encode("utf-8")[:col].decode("utf-8", errors="ignore"))
+            calls[(lineno, col)] = name
+    return calls
+
+
+def _in_spans(spans: List[Tuple[int, int]], span_starts: List[int], offset: int) -> bool:
+    """判断偏移是否落在某个区间内（spans 按起点有序且互不重叠）"""
+    index = bisect.bisect_right(span_starts, offset) - 1
+    return index >= 0 and spans[index][0] <= offset < spans[index][1]
+
+
+# ==================== 引擎 ====================
+
+class SecurityRuleEngine:
+    """单次扫描的多规则安全检查引擎"""
+
+    def __init__(self, rules: Optional[List[SecurityRule]] = None):
+        self.rules = list(rules if rules is not None else DEFAULT_RULES)
+        self._compiled: Dict[str, Tuple[Optional[re.Pattern], List[SecurityRule], List[re.Pattern]]] = {}
+
+    def _compile_for(self, language: str) -> Tuple[Optional[re.Pattern], List[SecurityRule], List[re.Pattern]]:
+        """
+        按语言编译组合正则（带缓存）
+
+        Returns:
+            (组合正则, 适用的规则, 各规则单独编译的正则)；
+            组合正则只报告同一位置第一条匹配的规则，其后的规则用单独的正则补充检查
+        """
+        if language not in self._compiled:
+            rules = [r for r in self.rules if r.languages is None or language in r.languages]
+            pattern = None
+            if rules:
+                alternatives = "|".join(f"(?P<r{i}>{rule.pattern})" for i, rule in enumerate(rules))
+                pattern = re.compile(f"(?={alternatives})")
+            self._compiled[language] = (pattern, rules, [re.compile(rule.pattern) for rule in rules])
+        return self._compiled[language]
+
+    def scan(self, code: str, language: str = "python", confirm_with_ast: bool = True) -> List[SecurityFinding]:
+        """
+        扫描代码
+
+        Args:
+            code: 代码内容
+            language: 编程语言
+            confirm_with_ast: Python 代码是否用 AST 确认调用类规则
+
+        Returns:
+            按出现位置排序的发现列表
+        """
+        pattern, rules, rule_patterns = self._compile_for(language)
+        if pattern is None:
+            return []
+
+        lines = code.split("\n")
+        line_starts = [0]
+        for line in lines[:-1]:
+            line_starts.append(line_starts[-1] + len(line) + 1)
+
+        if language == "python":
+            spans = _python_non_code_spans(code, line_starts) or []
+            calls = _python_calls(code, lines) if confirm_with_ast else None
+        else:
+            spans = _c_like_non_code_spans(code)
+            calls = None
+        span_starts = [start for start, _ in spans]
+
+        findings = []
+        # 每条规则上一次匹配的结束位置，同一规则的匹配互不重叠
+        last_ends = [0] * len(rules)
+        for match in pattern.finditer(code):
+            offset = match.start()
+            first = int(match.lastgroup[1:])
+            matched = [(first, match.end(match.lastgroup))]
+            for index in range(first + 1, len(rules)):
+                other = rule_patterns[index].match(code, offset)
+                if other:
+                    matched.append((index, other.end()))
+
+            line_index = bisect.bisect_right(line_starts, offset) - 1
+            column = offset - line_starts[line_index]
+            in_non_code = _in_spans(spans, span_starts, offset)
+
+            for index, end in matched:
+                if offset < last_ends[index]:
+                    continue
+                last_ends[index] = end
+
+                rule = rules[index]
+                if rule.code_only and in_non_code:
+                    continue
+                if rule.call_names and calls is not None:
+                    if calls.get((line_index + 1, column)) not in rule.call_names:
+                        continue
+
+                findings.append(SecurityFinding(
+                    rule_id=rule.rule_id,
+                    severity=rule.severity,
+                    message=rule.message,
+                    line=line_index + 1,
+                    column=column + 1,
+                    snippet=lines[line_index].strip()[:120]
+                ))
+        return findings
+
+
+def format_security_report(findings: List[SecurityFinding], max_locations: int = 5) -> str:
+    """
+    将发现按规则分组格式化为文本报告
+
+    Args:
+        findings: 安全检查发现
+        max_locations: 每条规则最多列出的位置数
+    """
+    if not findings:
+        return "✅ 未发现明显的安全问题"
+
+    grouped: Dict[str, List[SecurityFinding]] = {}
+    for finding in findings:
+        grouped.setdefault(finding.rule_id, []).append(finding)
+
+    issues = []
+    for items in grouped.values():
+        first = items[0]
+        locations = "、".join(f"第 {f.line} 行第 {f.column} 列" for f in items[:max_locations])
+        if len(items) > max_locations:
+            locations += f" 等 {len(items)} 处"
+        issues.append(f"- {SEVERITY_ICONS.get(first.severity, '🟡')} {first.message}（{locations}）")
+
+    return "🔒 安全检查发现以下问题：\n" + "\n".join(issues)
+
+
+# 默认引擎实例（按语言缓存编译结果）
+default_engine = SecurityRuleEngine()
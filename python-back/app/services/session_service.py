@@ -5,6 +5,7 @@ import uuid
 from sqlalchemy.orm import Session
 from app.models.session import Session as SessionModel
 from app.schemas.session import SessionCreate, SessionUpdate
+from app.services.blob_store import release_blob_sync, remove_blob_file, restore_blob_file
 
 
 def generate_session_id() -> str:
@@ -60,7 +61,19 @@ def delete_session(db: Session, session_id: str) -> bool:
     if not db_session:
         return False
     
-    db.delete(db_session)
-    db.commit()
+    # 级联删除文件记录前释放其引用的内容块
+    blob_paths = [
+        release_blob_sync(db, file.blob_hash) for file in db_session.files if file.blob_hash
+    ]
+    
+    try:
+        db.delete(db_session)
+        db.commit()
+    except BaseException:
+        for blob_path in blob_paths:
+            restore_blob_file(blob_path)
+        raise
+    for blob_path in blob_paths:
+        remove_blob_file(blob_path)
     return True
 
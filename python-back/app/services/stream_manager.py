@@ -0,0 +1,190 @@
+"""
+可恢复的流式生成管理
+
+生成过程在后台任务中运行，与 HTTP 连接解耦。每个事件分配递增序号并记录到
+按消息划分的有界环形缓冲中；客户端断线后携带 Last-Event-ID 重连即可补发
+错过的事件并继续接收后续事件，不需要重新运行 Agent 和工具。
+"""
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+
+# 环形缓冲中淘汰的事件会折叠进快照，这些类型的 delta 需要累积
+_SNAPSHOT_FIELDS = {"content": "content", "thinking": "thinking"}
+
+
+class StreamBuffer:
+    """单条消息的事件环形缓冲"""
+
+    def __init__(self, message_id: str, max_events: int):
+        """
+        Args:
+            message_id: AI 消息ID
+            max_events: 最多保留的事件数
+        """
+        self.message_id = message_id
+        self.max_events = max_events
+        self.events: Deque[Tuple[int, Dict]] = deque()
+        self.last_seq = 0
+        self.done = False
+        self.subscribers = 0
+
+        # 已被淘汰事件的累积内容，重连时作为快照发送
+        self._evicted = {"content": "", "thinking": ""}
+        self._changed = asyncio.Event()
+
+    def publish(self, event: Dict) -> int:
+        """
+        记录事件并唤醒订阅者
+
+        Returns:
+            事件序号
+        """
+        self.last_seq += 1
+        self.events.append((self.last_seq, event))
+        while len(self.events) > self.max_events:
+            _, evicted = self.events.popleft()
+            field = _SNAPSHOT_FIELDS.get(evicted.get("type"))
+            if field:
+                self._evicted[field] += evicted.get("delta", "")
+        self._notify()
+        return self.last_seq
+
+    def close(self) -> None:
+        """标记生成结束"""
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        从指定序号之后开始订阅事件
+
+        如果需要的事件已被淘汰，先发送一个 snapshot 事件，包含被淘汰部分的完整内容。
+
+        Args:
+            last_event_id: 客户端已收到的最后一个事件序号
+
+        Yields:
+            (序号, 事件)
+        """
+        cursor = last_event_id
+        self.subscribers += 1
+        try:
+            while True:
+                waiter = self._changed
+                oldest = self.events[0][0] if self.events else self.last_seq + 1
+                if cursor < oldest - 1:
+                    # 客户端错过的事件已被淘汰，用快照补齐
+                    cursor = oldest - 1
+                    yield cursor, {
+                        "type": "snapshot",
+                        "message_id": self.message_id,
+                        "content": self._evicted["content"],
+                        "thinking": self._evicted["thinking"]
+                    }
+
+                pending = [(seq, event) for seq, event in self.events if seq > cursor]
+                for seq, event in pending:
+                    cursor = seq
+                    yield seq, event
+
+                if pending:
+                    continue
+                if self.done:
+                    return
+                await waiter.wait()
+        finally:
+            self.subscribers -= 1
+
+
+class StreamManager:
+    """管理后台生成任务及其事件缓冲"""
+
+    def __init__(
+        self,
+        max_events: Optional[int] = None,
+        retain_seconds: Optional[float] = None,
+        orphan_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            max_events: 每条消息最多缓冲的事件数，默认取 STREAM_BUFFER_MAX_EVENTS
+            retain_seconds: 生成结束后缓冲保留的时间（秒），默认取 STREAM_BUFFER_TTL
+            orphan_timeout: 没有客户端连接时继续生成的最长时间（秒），默认取 STREAM_RESUME_TIMEOUT
+        """
+        self.max_events = max_events or settings.STREAM_BUFFER_MAX_EVENTS
+        self.retain_seconds = retain_seconds if retain_seconds is not None else settings.STREAM_BUFFER_TTL
+        self.orphan_timeout = orphan_timeout if orphan_timeout is not None else settings.STREAM_RESUME_TIMEOUT
+        self._buffers: Dict[str, StreamBuffer] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self, message_id: str, events: AsyncIterator[Dict]) -> StreamBuffer:
+        """
+        在后台任务中消费事件流并写入缓冲
+
+        Args:
+            message_id: AI 消息ID
+            events: 事件流
+
+        Returns:
+            事件缓冲
+        """
+        buffer = StreamBuffer(message_id, self.max_events)
+        self._buffers[message_id] = buffer
+        task = asyncio.create_task(self._produce(buffer, events))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return buffer
+
+    def get(self, message_id: str) -> Optional[StreamBuffer]:
+        """获取消息的事件缓冲（生成中或结束后保留期内）"""
+        return self._buffers.get(message_id)
+
+    async def _produce(self, buffer: StreamBuffer, events: AsyncIterator[Dict]) -> None:
+        """消费事件流；长时间没有客户端连接时停止生成"""
+        loop = asyncio.get_running_loop()
+        orphaned_since: Optional[float] = None
+        iterator = events.__aiter__()
+        try:
+            while True:
+                try:
+                    event = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                buffer.publish(event)
+
+                if buffer.subscribers:
+                    orphaned_since = None
+                elif orphaned_since is None:
+                    orphaned_since = loop.time()
+                elif loop.time() - orphaned_since > self.orphan_timeout:
+                    print(f"消息 {buffer.message_id} 已无客户端连接超过 {self.orphan_timeout:g} 秒，停止生成")
+                    break
+        except Exception as e:
+            print(f"后台生成任务失败: {e}")
+            buffer.publish({"type": "error", "error": f"流式响应错误: {str(e)}"})
+        finally:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+            buffer.close()
+            loop.call_later(self.retain_seconds, self._discard, buffer)
+
+    def _discard(self, buffer: StreamBuffer) -> None:
+        if self._buffers.get(buffer.message_id) is buffer:
+            del self._buffers[buffer.message_id]
+
+    async def shutdown(self) -> None:
+        """取消所有仍在运行的生成任务"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# 全局实例
+stream_manager = StreamManager()
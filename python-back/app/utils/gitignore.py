@@ -0,0 +1,111 @@
+"""
+.gitignore 风格的路径匹配
+
+支持注释、空行、! 取反、结尾 / 只匹配目录、以 / 开头或包含 / 的模式相对根目录匹配，
+以及 *、?、[...] 和 ** 通配符。与 git 一致，目录被排除后其中的文件不能再被 ! 规则恢复。
+"""
+import re
+from typing import Iterable, List, Pattern, Tuple
+
+
+def _translate(pattern: str) -> str:
+    """把通配符模式转换为正则表达式片段"""
+    i, n = 0, len(pattern)
+    parts = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            parts.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif c == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    return "".join(parts)
+
+
+class GitIgnoreMatcher:
+    """按 .gitignore 规则判断路径是否被排除"""
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Args:
+            patterns: .gitignore 格式的规则行
+        """
+        # (正则, 是否取反, 是否只匹配目录)
+        self._rules: List[Tuple[Pattern, bool, bool]] = []
+        for line in patterns:
+            self._add(line)
+
+    @classmethod
+    def from_text(cls, text: str) -> "GitIgnoreMatcher":
+        """从 .gitignore 文本创建"""
+        return cls(text.splitlines())
+
+    def _add(self, line: str) -> None:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return
+
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return
+
+        # 包含 / 的模式相对根目录匹配，否则匹配任意层级
+        anchored = "/" in line
+        line = line.lstrip("/")
+        prefix = "^" if anchored else "^(?:.*/)?"
+        self._rules.append((re.compile(prefix + _translate(line) + "$"), negate, dir_only))
+
+    def _match(self, path: str, is_dir: bool) -> bool:
+        ignored = False
+        for regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                ignored = not negate
+        return ignored
+
+    def is_ignored(self, path: str, is_dir: bool = False) -> bool:
+        """
+        判断相对路径是否被排除
+
+        Args:
+            path: 以 / 分隔的相对路径
+            is_dir: 路径是否为目录
+        """
+        parts = path.strip("/").split("/")
+        # 任一上级目录被排除时，其中的文件也被排除
+        for i in range(1, len(parts)):
+            if self._match("/".join(parts[:i]), True):
+                return True
+        return self._match("/".join(parts), is_dir)
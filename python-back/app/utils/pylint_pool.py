@@ -0,0 +1,336 @@
+"""
+Pylint 常驻工作进程池
+
+每次分析都 fork 一个 pylint 子进程需要重新启动解释器并加载 astroid，
+耗时 1~3 秒。这里维护一组预热好的工作进程，在进程内通过 pylint.lint.Run
+执行分析，并支持单任务超时和按任务数回收进程（防止 astroid 缓存膨胀）。
+每个工作进程使用独立的管道，任务超时只终止卡住的那个进程并补充新进程，
+其他进程上正在执行和排队的任务不受影响。
+
+注意：工作进程使用 spawn 方式启动，会重新导入本模块，
+因此本模块放在 app.utils 下，避免连带导入数据库等重量级依赖。
+"""
+import asyncio
+import importlib.metadata
+import importlib.util
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# 进程内运行 pylint 时使用的固定参数
+PYLINT_ARGS = [
+    "--reports=n",
+    "--score=n",
+    "--clear-cache-post-run=y",
+]
+
+
+# ==================== 工作进程侧 ====================
+
+def _warm_up_worker() -> None:
+    """工作进程初始化：预先导入 pylint 与 astroid，后续任务无需再付启动成本"""
+    import pylint.lint  # noqa: F401
+    import astroid  # noqa: F401
+
+
+def _lint_in_worker(code: str, filename: str) -> List[Dict]:
+    """
+    在工作进程中执行一次 Pylint 分析
+
+    Args:
+        code: Python 代码内容
+        filename: 文件名（用于生成临时文件名，使报告中的模块名与原文件一致）
+
+    Returns:
+        与 `pylint --output-format=json` 相同结构的问题列表
+    """
+    from pylint.lint import Run
+    from pylint.reporters import CollectingReporter
+    from pylint.reporters.json_reporter import JSONReporter
+
+    basename = os.path.basename(filename) or "temp.py"
+    if not basename.endswith(".py"):
+        basename += ".py"
+
+    with tempfile.TemporaryDirectory(prefix="pylint_") as temp_dir:
+        temp_file = os.path.join(temp_dir, basename)
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(code)
+
+        reporter = CollectingReporter()
+        Run([temp_file, *PYLINT_ARGS], reporter=reporter, exit=False)
+        return [JSONReporter.serialize(message) for message in reporter.messages]
+
+
+def _worker_main(conn) -> None:
+    """
+    工作进程主循环：预热后逐个执行主进程发来的任务
+
+    每个任务先回复 ("started", None)，主进程从此刻开始计算超时，
+    再回复 ("ok", 结果) 或 ("error", 错误信息)。收到 None 或管道关闭时退出。
+    """
+    _warm_up_worker()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        func, args = job
+        conn.send(("started", None))
+        try:
+            conn.send(("ok", func(*args)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+# ==================== 主进程侧 ====================
+
+class _Worker:
+    """单个工作进程及其专用管道"""
+
+    def __init__(self, ctx, generation: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.generation = generation
+        self.jobs = 0
+
+    def stop(self, kill: bool = False) -> None:
+        """
+        停止工作进程
+
+        Args:
+            kill: 是否强制终止（任务卡住时使用），否则通知进程自行退出
+        """
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class PylintWorkerPool:
+    """Pylint 工作进程池"""
+
+    def __init__(
+        self,
+        size: int = 2,
+        job_timeout: float = 10.0,
+        max_jobs_per_worker: int = 100
+    ):
+        """
+        Args:
+            size: 工作进程数量
+            job_timeout: 单个分析任务的超时时间（秒），从工作进程开始执行该任务时计时，
+                排队等待空闲进程的时间不计入
+            max_jobs_per_worker: 每个工作进程处理多少个任务后被回收重建
+        """
+        self.size = size
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle: List[_Worker] = []
+        # 等待空闲进程的调用方，回调返回 False 表示调用方已不再等待
+        self._waiters: Deque[Callable[[_Worker], bool]] = deque()
+        # 每次 shutdown 后递增，旧代的工作进程归还时直接停止
+        self._generation = 0
+        self._started = False
+
+    @staticmethod
+    def is_available() -> bool:
+        """检查当前环境是否安装了 pylint"""
+        return importlib.util.find_spec("pylint") is not None
+
+    def start(self) -> None:
+        """启动进程池（已启动时不做任何事）"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            generation = self._generation
+        for _ in range(self.size):
+            self._release(_Worker(self._ctx, generation), count_job=False)
+
+    def shutdown(self) -> None:
+        """关闭进程池（正在执行任务的进程在任务结束后停止）"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+            self._started = False
+        for worker in idle:
+            worker.stop()
+
+    def _release(self, worker: _Worker, healthy: bool = True, count_job: bool = True) -> None:
+        """
+        归还工作进程：卡住或异常的进程被强制终止，达到任务数上限的进程被回收，
+        并各自补充一个新进程；随后交给等待中的调用方或放回空闲列表
+
+        Args:
+            worker: 工作进程
+            healthy: 任务是否正常结束
+            count_job: 是否计入该进程的任务数（新启动或未执行任务的进程不计）
+        """
+        if count_job:
+            worker.jobs += 1
+        stale = worker.generation != self._generation
+        if stale or not healthy or (self.max_jobs_per_worker and worker.jobs >= self.max_jobs_per_worker):
+            worker.stop(kill=not healthy)
+            if stale:
+                return
+            worker = _Worker(self._ctx, worker.generation)
+
+        with self._lock:
+            if worker.generation != self._generation:
+                stale_worker = worker
+            else:
+                stale_worker = None
+                while self._waiters:
+                    if self._waiters.popleft()(worker):
+                        return
+                self._idle.append(worker)
+        if stale_worker is not None:
+            stale_worker.stop()
+
+    def _acquire(self) -> _Worker:
+        """同步获取空闲工作进程，没有时阻塞等待"""
+        self.start()
+        slot: "queue.SimpleQueue[_Worker]" = queue.SimpleQueue()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self._waiters.append(lambda worker: slot.put(worker) or True)
+        return slot.get()
+
+    async def _aacquire(self) -> _Worker:
+        """异步获取空闲工作进程，排队期间不占用线程"""
+        if not self._started:
+            await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+
+        def _deliver(worker: _Worker) -> None:
+            if future.done():
+                # 调用方已取消，转交给下一个等待者
+                self._release(worker, count_job=False)
+            else:
+                future.set_result(worker)
+
+        def _waiter(worker: _Worker) -> bool:
+            try:
+                loop.call_soon_threadsafe(_deliver, worker)
+                return True
+            except RuntimeError:
+                # 事件循环已关闭
+                return False
+
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self._waiters.append(_waiter)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(future.result(), count_job=False)
+            raise
+
+    def _execute(self, worker: _Worker, func: Callable, args: Tuple) -> Any:
+        """
+        在已分配的工作进程中执行任务并归还进程
+
+        Raises:
+            TimeoutError: 任务开始执行后超过 job_timeout 未完成（只终止该进程）
+            RuntimeError: 任务抛出异常或工作进程异常退出
+        """
+        healthy = False
+        try:
+            worker.conn.send((func, args))
+            # 等待进程开始执行（新进程需要先完成预热），之后才开始计时
+            worker.conn.recv()
+            if not worker.conn.poll(self.job_timeout):
+                raise TimeoutError(f"Pylint 分析超过 {self.job_timeout} 秒")
+            status, payload = worker.conn.recv()
+            healthy = True
+        except TimeoutError:
+            raise
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"Pylint 工作进程异常退出: {e}") from e
+        finally:
+            self._release(worker, healthy)
+        if status == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def _call(self, func: Callable, *args) -> Any:
+        """同步执行任意可序列化的函数"""
+        return self._execute(self._acquire(), func, args)
+
+    async def _acall(self, func: Callable, *args) -> Any:
+        """异步执行任意可序列化的函数"""
+        worker = await self._aacquire()
+        return await asyncio.to_thread(self._execute, worker, func, args)
+
+    def run(self, code: str, filename: str = "temp.py") -> List[Dict]:
+        """
+        同步提交分析任务并等待结果
+
+        Raises:
+            ImportError: 未安装 pylint
+            TimeoutError: 分析超时
+        """
+        if not self.is_available():
+            raise ImportError("pylint is not installed")
+        return self._call(_lint_in_worker, code, filename)
+
+    async def arun(self, code: str, filename: str = "temp.py") -> List[Dict]:
+        """
+        异步提交分析任务，排队期间不占用事件循环和线程池
+
+        Raises:
+            ImportError: 未安装 pylint
+            TimeoutError: 分析超时
+        """
+        if not self.is_available():
+            raise ImportError("pylint is not installed")
+        return await self._acall(_lint_in_worker, code, filename)
+
+
+_default_pool: Optional[PylintWorkerPool] = None
+_pylint_version: Optional[str] = None
+
+
+def get_pylint_version() -> str:
+    """获取已安装的 pylint 版本（未安装时返回 "unknown"）"""
+    global _pylint_version
+    if _pylint_version is None:
+        try:
+            _pylint_version = importlib.metadata.version("pylint")
+        except importlib.metadata.PackageNotFoundError:
+            _pylint_version = "unknown"
+    return _pylint_version
+
+
+def get_pylint_pool() -> PylintWorkerPool:
+    """获取全局 Pylint 进程池（按配置懒加载）"""
+    global _default_pool
+    if _default_pool is None:
+        from app.core.config import settings
+        _default_pool = PylintWorkerPool(
+            size=settings.PYLINT_POOL_SIZE,
+            job_timeout=settings.PYLINT_JOB_TIMEOUT,
+            max_jobs_per_worker=settings.PYLINT_MAX_JOBS_PER_WORKER
+        )
+    return _default_pool
@@ -0,0 +1,117 @@
+"""
+Server-Sent Events 工具
+
+提供 SSE 帧格式化，以及把连续的增量事件按时间/大小预算合并为帧，
+减少长回复中每个 token 一次的 json.dumps 和写操作。
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+# 可以合并的增量事件类型（相邻的同类型事件的 delta 直接拼接）
+MERGEABLE_EVENT_TYPES = ("content", "thinking")
+
+
+def format_sse_event(data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """
+    格式化为 SSE 数据帧
+
+    Args:
+        data: 事件数据
+        event_id: 事件序号，提供时输出 "id:" 行，客户端重连时通过 Last-Event-ID 回传
+
+    Returns:
+        "data: {...}\\n\\n" 格式的字符串
+    """
+    frame = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event_id is not None:
+        frame = f"id: {event_id}\n" + frame
+    return frame
+
+
+def _is_mergeable(event: Dict[str, Any]) -> bool:
+    """只包含 type 和 delta 的增量事件才可以合并"""
+    return event.get("type") in MERGEABLE_EVENT_TYPES and set(event) == {"type", "delta"}
+
+
+async def coalesce_deltas(
+    events: AsyncIterator[Dict[str, Any]],
+    flush_interval_ms: float = 20,
+    flush_max_bytes: int = 512
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    合并相邻的同类型增量事件
+
+    第一个增量到达后最多等待 flush_interval_ms 毫秒，或累计超过 flush_max_bytes
+    字节即输出；类型变化或遇到其他事件时先输出已缓冲的内容，保证事件顺序不变。
+    flush_interval_ms <= 0 时不合并，事件到达即输出。
+
+    Args:
+        events: 增量事件流，例如 {"type": "content", "delta": "..."}
+        flush_interval_ms: 合并时间窗口（毫秒）
+        flush_max_bytes: 单帧最大缓冲字节数
+
+    Yields:
+        合并后的事件
+    """
+    if flush_interval_ms <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    interval = flush_interval_ms / 1000
+    pending: Optional[Dict[str, Any]] = None
+    pending_bytes = 0
+    deadline = 0.0
+    next_event: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+
+            # 有缓冲内容时最多等到截止时间，否则一直等待下一个事件
+            timeout = None if pending is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({next_event}, timeout=timeout)
+            if not done:
+                yield pending
+                pending = None
+                continue
+
+            task, next_event = next_event, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                break
+            except BaseException:
+                # 上游出错时先输出已缓冲的内容
+                if pending is not None:
+                    yield pending
+                    pending = None
+                raise
+
+            if pending is not None and _is_mergeable(event) and event["type"] == pending["type"]:
+                pending["delta"] += event["delta"]
+                pending_bytes += len(event["delta"].encode("utf-8"))
+            else:
+                if pending is not None:
+                    yield pending
+                    pending = None
+                if _is_mergeable(event):
+                    pending = dict(event)
+                    pending_bytes = len(event["delta"].encode("utf-8"))
+                    deadline = loop.time() + interval
+                else:
+                    yield event
+
+            if pending is not None and pending_bytes >= flush_max_bytes:
+                yield pending
+                pending = None
+
+        if pending is not None:
+            yield pending
+    finally:
+        if next_event is not None and not next_event.done():
+            next_event.cancel()
@@ -0,0 +1,74 @@
+"""
+增量文本编码识别
+
+在流式写入上传文件的同时逐块尝试解码，不需要写完后再读一遍文件。
+"""
+import codecs
+from typing import List, Optional, Tuple
+
+UTF8_BOM = codecs.BOM_UTF8
+
+
+class IncrementalEncodingDetector:
+    """
+    按候选编码顺序增量解码，返回第一个能完整解码全部内容的编码
+
+    用法：
+        detector = IncrementalEncodingDetector(["utf-8", "gb18030"])
+        for chunk in chunks:
+            detector.feed(chunk)
+        encoding, text = detector.finish()
+    """
+
+    def __init__(self, candidates: List[str], keep_text: bool = False):
+        """
+        Args:
+            candidates: 候选编码（按优先级排序）
+            keep_text: 是否保留解码后的文本
+        """
+        self.keep_text = keep_text
+        self._candidates = list(candidates)
+        self._decoders = {name: codecs.getincrementaldecoder(name)() for name in candidates}
+        self._texts = {name: [] for name in candidates}
+        self._started = False
+
+    def feed(self, chunk: bytes) -> None:
+        """输入下一块字节，无法解码的候选编码被淘汰"""
+        if not self._started:
+            self._started = True
+            if chunk.startswith(UTF8_BOM):
+                # 带 BOM 的 UTF-8，解码时去掉 BOM
+                self._candidates = ["utf-8-sig"]
+                self._decoders = {"utf-8-sig": codecs.getincrementaldecoder("utf-8-sig")()}
+                self._texts = {"utf-8-sig": []}
+
+        for name in list(self._candidates):
+            try:
+                text = self._decoders[name].decode(chunk)
+            except UnicodeDecodeError:
+                self._discard(name)
+                continue
+            if self.keep_text:
+                self._texts[name].append(text)
+
+    def finish(self) -> Tuple[Optional[str], Optional[str]]:
+        """
+        结束输入
+
+        Returns:
+            (编码, 文本)；没有候选编码能解码时返回 (None, None)；
+            keep_text=False 时文本为 None
+        """
+        for name in list(self._candidates):
+            try:
+                tail = self._decoders[name].decode(b"", final=True)
+            except UnicodeDecodeError:
+                self._discard(name)
+                continue
+            text = "".join(self._texts[name]) + tail if self.keep_text else None
+            return name, text
+        return None, None
+
+    def _discard(self, name: str) -> None:
+        self._candidates.remove(name)
+        self._texts.pop(name, None)
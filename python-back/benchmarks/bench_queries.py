@@ -0,0 +1,216 @@
+"""
+会话 / 消息 / 文件查询的性能基准
+
+在临时 SQLite 数据库中执行迁移并写入大量数据（默认 100 万条消息），
+然后通过 ASGI 直接请求关键接口，检查 p95 延迟是否在预算内，
+并输出对应查询的执行计划，确认使用了复合索引。
+
+用法（在 python-back 目录下）：
+    python -m benchmarks.bench_queries
+    python -m benchmarks.bench_queries --messages 100000 --budget-ms 30
+
+延迟超出预算或查询计划出现全表扫描时以非零状态码退出。
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db.database import (  # noqa: E402
+    get_async_db,
+    get_db,
+    get_engine_options,
+    register_sqlite_pragmas,
+    run_migrations,
+)
+from app.main import app  # noqa: E402
+
+BATCH_SIZE = 50000
+BASE_TIME = datetime(2025, 1, 1)
+
+# 接口查询对应的 SQL，用于检查执行计划
+QUERY_PLANS = {
+    "会话列表": "SELECT * FROM sessions ORDER BY updated_at DESC LIMIT 100",
+    "消息分页": (
+        "SELECT id, message_id, created_at FROM messages WHERE session_id = 'sess_0' "
+        "AND (created_at > '2025-01-01' OR (created_at = '2025-01-01' AND id > 0)) "
+        "ORDER BY created_at, id LIMIT 51"
+    ),
+    "消息计数": "SELECT count(*) FROM messages WHERE session_id = 'sess_0'",
+    "会话文件": "SELECT * FROM files WHERE session_id = 'sess_0' ORDER BY created_at DESC LIMIT 100",
+}
+
+
+def seed(db_path: str, sessions: int, messages: int, files_per_session: int) -> None:
+    """用 sqlite3 批量写入测试数据"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    conn.executemany(
+        "INSERT INTO sessions (session_id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        [
+            (f"sess_{i}", f"会话 {i}", BASE_TIME, BASE_TIME + timedelta(seconds=random.randint(0, 10 ** 7)))
+            for i in range(sessions)
+        ]
+    )
+
+    content = "这是一条用于基准测试的消息内容。" * 10
+    for start in range(0, messages, BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + BATCH_SIZE, messages)):
+            rows.append((
+                f"msg_{i}",
+                f"sess_{i % sessions}",
+                "ASSISTANT" if i % 2 else "USER",
+                content,
+                BASE_TIME + timedelta(seconds=i // sessions)
+            ))
+        conn.executemany(
+            "INSERT INTO messages (message_id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+        print(f"  已写入消息 {min(start + BATCH_SIZE, messages)}/{messages}", end="\r")
+    print()
+
+    conn.executemany(
+        "INSERT INTO files (file_id, session_id, filename, filepath, file_type, file_size, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (f"file_{s}_{j}", f"sess_{s}", f"f{j}.py", f"/tmp/f{j}.py", ".py", 100, BASE_TIME + timedelta(seconds=j))
+            for s in range(sessions)
+            for j in range(files_per_session)
+        ]
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def check_query_plans(db_path: str) -> bool:
+    """输出执行计划，出现全表扫描时返回 False"""
+    conn = sqlite3.connect(db_path)
+    ok = True
+    for name, sql in QUERY_PLANS.items():
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        full_scan = any(step.startswith("SCAN") and "INDEX" not in step for step in plan)
+        ok = ok and not full_scan
+        print(f"  {'❌' if full_scan else '✅'} {name}: {' | '.join(plan)}")
+    conn.close()
+    return ok
+
+
+async def measure(client: AsyncClient, url: str, requests: int) -> list:
+    """多次请求接口，返回每次的耗时（毫秒）"""
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return timings
+
+
+async def run_endpoints(db_url: str, sessions: int, requests: int, budget_ms: float) -> bool:
+    """请求关键接口并检查延迟预算"""
+    # 与应用使用相同的连接池和 PRAGMA 配置
+    sync_engine = create_engine(db_url, **get_engine_options(db_url))
+    async_engine = create_async_engine(
+        db_url.replace("sqlite://", "sqlite+aiosqlite://"), **get_engine_options(db_url, is_async=True)
+    )
+    register_sqlite_pragmas(sync_engine)
+    register_sqlite_pragmas(async_engine.sync_engine)
+    sync_factory = sessionmaker(bind=sync_engine)
+    async_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def override_get_db():
+        db = sync_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+
+    session_id = f"sess_{sessions // 2}"
+    ok = True
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            first_page = (await client.get(
+                f"/api/v1/code/messages/session/{session_id}", params={"limit": 50}
+            )).json()["data"]
+            endpoints = {
+                "会话列表": "/api/v1/code/sessions/?limit=50",
+                "消息首页": f"/api/v1/code/messages/session/{session_id}?limit=50",
+                "消息预览": f"/api/v1/code/messages/session/{session_id}?limit=50&content_mode=truncated",
+                "会话文件": f"/api/v1/code/files/session/{session_id}",
+            }
+            # 会话消息不足一页时没有下一页
+            if first_page["next_cursor"]:
+                endpoints["消息翻页"] = (
+                    f"/api/v1/code/messages/session/{session_id}?limit=50&cursor={first_page['next_cursor']}"
+                )
+            for name, url in endpoints.items():
+                timings = await measure(client, url, requests)
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1]
+                passed = p95 <= budget_ms
+                ok = ok and passed
+                print(f"  {'✅' if passed else '❌'} {name}: p50={p50:.1f}ms p95={p95:.1f}ms（预算 {budget_ms}ms）")
+    finally:
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        sync_engine.dispose()
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="会话/消息/文件查询性能基准")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="消息总数")
+    parser.add_argument("--sessions", type=int, default=2000, help="会话数")
+    parser.add_argument("--files-per-session", type=int, default=5, help="每个会话的文件数")
+    parser.add_argument("--requests", type=int, default=50, help="每个接口的请求次数")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="p95 延迟预算（毫秒）")
+    parser.add_argument("--db", help="数据库文件路径（默认使用临时文件）")
+    args = parser.parse_args()
+
+    db_path = args.db or str(Path(tempfile.mkdtemp()) / "bench.db")
+    db_url = f"sqlite:///{db_path}"
+
+    print(f"📦 执行迁移: {db_path}")
+    run_migrations(db_url)
+    print(f"📝 写入 {args.sessions} 个会话、{args.messages} 条消息")
+    started = time.perf_counter()
+    seed(db_path, args.sessions, args.messages, args.files_per_session)
+    print(f"  写入耗时 {time.perf_counter() - started:.1f}s")
+
+    print("🔍 查询计划")
+    plans_ok = check_query_plans(db_path)
+    print("⏱️ 接口延迟")
+    latency_ok = asyncio.run(run_endpoints(db_url, args.sessions, args.requests, args.budget_ms))
+
+    return 0 if plans_ok and latency_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
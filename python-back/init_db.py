@@ -1,25 +1,28 @@
 """
 初始化数据库脚本 - 确保使用最新的模型定义
 """
-from sqlalchemy import inspect
-from app.db.database import Base, engine
+from sqlalchemy import inspect, text
+from app.db.database import Base, engine, run_migrations
 
 # 强制导入所有模型（确保使用最新定义）
 from app.models.session import Session
 from app.models.message import Message, MessageRole
 from app.models.file import File
+from app.models.blob import Blob
 
 if __name__ == "__main__":
     print("正在初始化数据库...")
     print(f"数据库路径: {engine.url}")
     
-    # 先删除所有表
+    # 先删除所有表（包括迁移版本表）
     print("删除旧表...")
     Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
     
-    # 创建所有表
+    # 执行迁移创建所有表
     print("创建新表...")
-    Base.metadata.create_all(bind=engine)
+    run_migrations()
     
     print("\n数据库初始化完成！")
     print("=" * 50)
@@ -0,0 +1,64 @@
+"""初始表结构：sessions、messages、files
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2025-11-20 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sessions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("session_id", sa.String(50), nullable=False, comment="会话唯一标识"),
+        sa.Column("title", sa.String(200), nullable=False, comment="会话标题"),
+        sa.Column("summary", sa.Text(), nullable=True, comment="会话摘要"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, comment="更新时间"),
+    )
+    op.create_index("ix_sessions_id", "sessions", ["id"])
+    op.create_index("ix_sessions_session_id", "sessions", ["session_id"], unique=True)
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("message_id", sa.String(50), nullable=False, comment="消息唯一标识"),
+        sa.Column("session_id", sa.String(50), sa.ForeignKey("sessions.session_id"), nullable=False, comment="所属会话ID"),
+        sa.Column("role", sa.Enum("USER", "ASSISTANT", "SYSTEM", name="messagerole"), nullable=False, comment="消息角色"),
+        sa.Column("content", sa.Text(), nullable=False, comment="消息内容"),
+        sa.Column("thinking_process", sa.Text(), nullable=True, comment="AI思考过程"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, comment="创建时间"),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+    op.create_index("ix_messages_message_id", "messages", ["message_id"], unique=True)
+
+    op.create_table(
+        "files",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("file_id", sa.String(50), nullable=False, comment="文件唯一标识"),
+        sa.Column("session_id", sa.String(50), sa.ForeignKey("sessions.session_id"), nullable=False, comment="所属会话ID"),
+        sa.Column("filename", sa.String(255), nullable=False, comment="文件名"),
+        sa.Column("filepath", sa.String(500), nullable=False, comment="文件路径"),
+        sa.Column("file_type", sa.String(20), nullable=True, comment="文件类型"),
+        sa.Column("file_size", sa.Integer(), nullable=False, comment="文件大小（字节）"),
+        sa.Column("content", sa.Text(), nullable=True, comment="文件内容"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, comment="创建时间"),
+    )
+    op.create_index("ix_files_id", "files", ["id"])
+    op.create_index("ix_files_file_id", "files", ["file_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("files")
+    op.drop_table("messages")
+    op.drop_table("sessions")
+    sa.Enum(name="messagerole").drop(op.get_bind(), checkfirst=True)
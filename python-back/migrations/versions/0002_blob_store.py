@@ -0,0 +1,49 @@
+"""内容寻址存储：blobs 表，files.blob_hash / files.encoding
+
+Revision ID: 0002_blob_store
+Revises: 0001_baseline
+Create Date: 2025-11-24 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002_blob_store"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 引入 Alembic 之前启动时会自动补列，已有数据库可能已经包含这些结构
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("blobs"):
+        op.create_table(
+            "blobs",
+            sa.Column("sha256", sa.String(64), primary_key=True, comment="内容的 sha256 哈希"),
+            sa.Column("size", sa.Integer(), nullable=False, comment="内容大小（字节）"),
+            sa.Column("path", sa.String(500), nullable=False, comment="存储路径"),
+            sa.Column("refcount", sa.Integer(), nullable=False, comment="引用该内容的文件数"),
+            sa.Column("created_at", sa.DateTime(), nullable=False, comment="创建时间"),
+        )
+
+    columns = {column["name"] for column in inspector.get_columns("files")}
+    with op.batch_alter_table("files") as batch_op:
+        if "blob_hash" not in columns:
+            batch_op.add_column(sa.Column("blob_hash", sa.String(64), nullable=True, comment="内容块 sha256（指向 blobs 表）"))
+        if "encoding" not in columns:
+            batch_op.add_column(sa.Column("encoding", sa.String(20), nullable=True, comment="文本编码（上传时识别）"))
+
+    indexes = {index["name"] for index in inspector.get_indexes("files")}
+    if "ix_files_blob_hash" not in indexes:
+        op.create_index("ix_files_blob_hash", "files", ["blob_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_files_blob_hash", table_name="files")
+    with op.batch_alter_table("files") as batch_op:
+        batch_op.drop_column("encoding")
+        batch_op.drop_column("blob_hash")
+    op.drop_table("blobs")
@@ -0,0 +1,38 @@
+"""按实际查询补充复合索引
+
+- messages (session_id, created_at, id)：按会话分页获取消息
+- files (session_id, created_at)：按会话列出文件
+- sessions (updated_at DESC)：会话列表
+
+Revision ID: 0003_query_indexes
+Revises: 0002_blob_store
+Create Date: 2025-11-26 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0003_query_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_blob_store"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_messages_session_created_id", "messages", ["session_id", "created_at", "id"]),
+    ("ix_files_session_created", "files", ["session_id", "created_at"]),
+    ("ix_sessions_updated_at", "sessions", [sa.text("updated_at DESC")]),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
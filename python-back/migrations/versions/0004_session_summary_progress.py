@@ -0,0 +1,27 @@
+"""会话摘要进度：sessions.summary_until_id
+
+Revision ID: 0004_session_summary_progress
+Revises: 0003_query_indexes
+Create Date: 2025-11-28 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0004_session_summary_progress"
+down_revision: Union[str, Sequence[str], None] = "0003_query_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("sessions")}
+    if "summary_until_id" not in columns:
+        with op.batch_alter_table("sessions") as batch_op:
+            batch_op.add_column(sa.Column("summary_until_id", sa.Integer(), nullable=True, comment="摘要已覆盖到的最后一条消息（messages.id）"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("sessions") as batch_op:
+        batch_op.drop_column("summary_until_id")
@@ -0,0 +1,40 @@
+"""文件版本：files.parent_file_id、files.review_result
+
+Revision ID: 0005_file_versions
+Revises: 0004_session_summary_progress
+Create Date: 2025-12-02 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005_file_versions"
+down_revision: Union[str, Sequence[str], None] = "0004_session_summary_progress"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("files")}
+    new_columns = [
+        sa.Column("parent_file_id", sa.String(length=50), nullable=True, comment="上一版本的文件ID"),
+        sa.Column("review_result", sa.Text(), nullable=True, comment="最近一次单文件审查结果（供下一版本增量审查）"),
+    ]
+    missing = [column for column in new_columns if column.name not in columns]
+    if missing:
+        with op.batch_alter_table("files") as batch_op:
+            for column in missing:
+                batch_op.add_column(column)
+
+    indexes = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("files")}
+    if "ix_files_parent_file_id" not in indexes:
+        op.create_index("ix_files_parent_file_id", "files", ["parent_file_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_files_parent_file_id", table_name="files")
+    with op.batch_alter_table("files") as batch_op:
+        batch_op.drop_column("review_result")
+        batch_op.drop_column("parent_file_id")
@@ -0,0 +1,27 @@
+"""结构化修改指令：messages.instructions
+
+Revision ID: 0006_message_instructions
+Revises: 0005_file_versions
+Create Date: 2025-12-05 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006_message_instructions"
+down_revision: Union[str, Sequence[str], None] = "0005_file_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("messages")}
+    if "instructions" not in columns:
+        with op.batch_alter_table("messages") as batch_op:
+            batch_op.add_column(sa.Column("instructions", sa.JSON(), nullable=True, comment="结构化修改指令（服务端解析并校验）"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages") as batch_op:
+        batch_op.drop_column("instructions")
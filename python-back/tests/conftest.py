@@ -0,0 +1,54 @@
+"""
+pytest 公共配置
+"""
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.database import Base
+from app.models.session import Session as SessionModel
+
+
+def pytest_addoption(parser):
+    """添加 pytest 命令行选项"""
+    parser.addoption(
+        "--run-integration",
+        action="store_true",
+        default=False,
+        help="运行集成测试（需要有效的 API key）"
+    )
+
+
+@pytest_asyncio.fixture
+async def db_engine(tmp_path):
+    """基于临时 SQLite 文件的异步引擎（已建表）"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def db_factory(db_engine):
+    """临时数据库的异步会话工厂"""
+    return async_sessionmaker(db_engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    """把上传目录指向临时目录"""
+    path = tmp_path / "uploads"
+    with patch("app.services.blob_store.settings.UPLOAD_DIR", str(path)):
+        yield path
+
+
+@pytest_asyncio.fixture
+async def db(db_factory, upload_dir):
+    """带有会话 s1 的临时数据库会话，上传目录指向临时目录"""
+    async with db_factory() as session:
+        session.add(SessionModel(session_id="s1"))
+        await session.commit()
+        yield session
@@ -100,6 +100,8 @@ class TestCodeReviewChain:
             mock_settings.OPENAI_MODEL = "gpt-4o-mini"
             mock_settings.OPENAI_TEMPERATURE = 0.2
             mock_settings.OPENAI_MAX_TOKENS = 8000
+            mock_settings.OPENAI_BASE_URL = None
+            mock_settings.OPENAI_STREAM_USAGE = True
             
             chain = CodeReviewChain()
             return chain
@@ -204,6 +206,28 @@ class TestCodeReviewChain:
             assert "messages" in call_args
             assert "用户问题" in call_args["messages"][0]["content"]
     
+    def test_review_message_stable_prefix_first(self, review_chain):
+        """测试审查消息 - 代码在前，文件名、语言和用户问题在后"""
+        message = review_chain._build_review_message(
+            "def hello(): pass", "test.py", "python", "有什么问题？",
+            scope="第 1-10 行", analysis_text="#### security_check\n无问题"
+        )
+
+        positions = [
+            message.index("def hello(): pass"),
+            message.index("自动化分析结果"),
+            message.index("test.py"),
+            message.index("第 1-10 行"),
+            message.index("有什么问题？"),
+        ]
+        assert positions == sorted(positions)
+
+        other = review_chain._build_review_message(
+            "def hello(): pass", "other.py", "python", "换一个问题"
+        )
+        prefix = message[:message.index("```\n") + 4]
+        assert other.startswith(prefix)
+
     @pytest.mark.asyncio
     async def test_review_multiple_files(self, review_chain):
         """测试多文件审查"""
@@ -235,6 +259,160 @@ class TestCodeReviewChain:
             assert "test2.py" in result
             assert "综合建议" in result
 
+    @pytest.mark.asyncio
+    async def test_review_code_pipeline_mode(self, review_chain):
+        """测试流水线模式 - 本地预分析结果注入单次 LLM 调用，不经过 Agent"""
+        mock_llm = Mock()
+        mock_llm.ainvoke = AsyncMock(return_value=Mock(content="流水线报告"))
+
+        with patch.object(review_chain, 'llm', mock_llm), \
+             patch.object(review_chain.agent, 'ainvoke') as mock_agent:
+            result = await review_chain.review_code(
+                code="result = eval(user_input)\n",
+                filename="test.py",
+                language="python",
+                mode="pipeline"
+            )
+
+        assert result == "流水线报告"
+        mock_agent.assert_not_called()
+        messages = mock_llm.ainvoke.call_args[0][0]
+        assert messages[0]["role"] == "system"
+        assert "自动化分析结果" in messages[1]["content"]
+        assert "security_check" in messages[1]["content"]
+        assert "eval" in messages[1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_pre_analysis_skips_pylint_for_other_languages(self, review_chain):
+        """测试预分析 - 非 Python 代码不执行 Pylint"""
+        analysis = await review_chain.run_pre_analysis("let a = 1;", "a.js", "javascript")
+
+        assert "pylint_analysis" not in analysis
+        assert "code_complexity_analysis" in analysis
+        assert "security_check" in analysis
+
+    @pytest.mark.asyncio
+    async def test_review_code_pipeline_falls_back_to_agent(self, review_chain):
+        """测试流水线模式 - 预分析失败时回退到 Agent 模式"""
+        mock_message = Mock()
+        mock_message.content = "Agent 报告"
+
+        with patch.object(review_chain, 'run_pre_analysis', side_effect=RuntimeError("boom")), \
+             patch.object(review_chain.agent, 'ainvoke', return_value={"messages": [mock_message]}):
+            result = await review_chain.review_code(
+                code="def hello(): pass",
+                filename="test.py",
+                mode="pipeline"
+            )
+
+        assert result == "Agent 报告"
+
+    @pytest.mark.asyncio
+    async def test_review_multiple_files_concurrent_keeps_order(self, review_chain):
+        """测试多文件并发审查 - 并发数受限且结果顺序与输入一致"""
+        import asyncio
+
+        running = 0
+        peak = 0
+
+        async def fake_review(code, filename, language="python", user_question=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            # 靠前的文件耗时更长，验证结果不按完成顺序排列
+            await asyncio.sleep(0.05 if filename == "a.py" else 0.01)
+            running -= 1
+            if filename == "c.py":
+                raise Exception("模型返回异常")
+            return f"{filename} 的报告"
+
+        files = [
+            {"filename": name, "code": "pass", "language": "python"}
+            for name in ["a.py", "b.py", "c.py", "d.py"]
+        ]
+
+        with patch.object(review_chain, 'review_code', side_effect=fake_review):
+            result = await review_chain.review_multiple_files(files, max_concurrency=2)
+
+        assert peak == 2
+        positions = [result.index(f"## {i}. {name}") for i, name in enumerate(["a.py", "b.py", "c.py", "d.py"], 1)]
+        assert positions == sorted(positions)
+        assert result.index("a.py 的报告") < result.index("b.py 的报告")
+        assert "❌ **审查失败**：模型返回异常" in result
+        assert "d.py 的报告" in result
+
+    @pytest.mark.asyncio
+    async def test_review_multiple_files_timeout(self, review_chain):
+        """测试多文件审查 - 单文件超时只标记该文件失败"""
+        import asyncio
+
+        async def fake_review(code, filename, language="python", user_question=None):
+            if filename == "slow.py":
+                await asyncio.sleep(10)
+            return f"{filename} 的报告"
+
+        files = [
+            {"filename": "slow.py", "code": "pass"},
+            {"filename": "fast.py", "code": "pass"}
+        ]
+
+        with patch.object(review_chain, 'review_code', side_effect=fake_review):
+            result = await review_chain.review_multiple_files(files, file_timeout=0.05)
+
+        assert "审查超时" in result
+        assert "fast.py 的报告" in result
+
+    @pytest.mark.asyncio
+    async def test_review_code_chunks_large_file(self, review_chain):
+        """测试大文件分块审查 - 修改指令行号映射回原文件"""
+        code = "\n".join(f"def func_{i}():\n    return {i}\n" for i in range(40))
+
+        async def fake_review(code, filename, language, user_question, scope=None):
+            return "**修改1：示例**\n- 操作类型：DELETE\n- 位置：1"
+
+        with patch('app.services.review_chain.settings') as mock_settings, \
+             patch.object(review_chain, '_review_with_agent', side_effect=fake_review):
+            mock_settings.REVIEW_MODE = "agent"
+            mock_settings.REVIEW_CHUNK_MAX_TOKENS = 100
+            mock_settings.REVIEW_MAX_CHUNKS = 50
+            mock_settings.REVIEW_MAX_CONCURRENCY = 4
+            mock_settings.REVIEW_FILE_TIMEOUT = 5.0
+            result = await review_chain.review_code(code=code, filename="big.py")
+
+        assert "分块代码审查报告" in result
+        assert "- 位置：1" in result.split("## 第 2 段")[0]
+        second_start = int(result.split("## 第 2 段：第 ")[1].split("-")[0])
+        assert f"- 位置：{second_start}" in result
+
+    @pytest.mark.asyncio
+    async def test_pipeline_chunks_pre_analyze_dedented_members(self, review_chain):
+        """测试流水线模式下拆分的类成员去掉缩进后再做本地预分析"""
+        import ast
+
+        methods = "\n".join(f"    def method_{i}(self):\n        return {i}\n" for i in range(30))
+        code = f"class Big:\n{methods}"
+        analyzed = []
+
+        async def fake_pre_analysis(code, filename, language="python"):
+            analyzed.append(code)
+            return {}
+
+        response = Mock(content="审查结果", usage_metadata=None)
+        with patch('app.services.review_chain.settings') as mock_settings, \
+             patch.object(review_chain, 'run_pre_analysis', side_effect=fake_pre_analysis), \
+             patch.object(review_chain, 'llm') as mock_llm:
+            mock_llm.ainvoke = AsyncMock(return_value=response)
+            mock_settings.REVIEW_MODE = "pipeline"
+            mock_settings.REVIEW_CHUNK_MAX_TOKENS = 100
+            mock_settings.REVIEW_MAX_CHUNKS = 50
+            mock_settings.REVIEW_MAX_CONCURRENCY = 4
+            mock_settings.REVIEW_FILE_TIMEOUT = 5.0
+            await review_chain.review_code(code=code, filename="big.py", mode="pipeline")
+
+        assert len(analyzed) > 1
+        for analysis_code in analyzed:
+            ast.parse(analysis_code)
+
 
 class TestSystemPrompt:
     """测试系统提示"""
@@ -246,6 +424,8 @@ class TestSystemPrompt:
             mock_settings.OPENAI_MODEL = "gpt-4o-mini"
             mock_settings.OPENAI_TEMPERATURE = 0.2
             mock_settings.OPENAI_MAX_TOKENS = 8000
+            mock_settings.OPENAI_BASE_URL = None
+            mock_settings.OPENAI_STREAM_USAGE = True
             
             chain = CodeReviewChain()
             prompt = chain._get_system_prompt()
@@ -264,13 +444,12 @@ class TestSystemPrompt:
 class TestIntegration:
     """集成测试"""
     
-    @pytest.mark.skipif(
-        not pytest.config.getoption("--run-integration"),
-        reason="需要 --run-integration 标志来运行集成测试"
-    )
     @pytest.mark.asyncio
-    async def test_real_code_review(self):
+    async def test_real_code_review(self, request):
         """真实的代码审查测试（需要有效的 API key）"""
+        if not request.config.getoption("--run-integration"):
+            pytest.skip("需要 --run-integration 标志来运行集成测试")
+
         from app.services.review_chain import review_chain
         
         code = """
@@ -296,16 +475,6 @@ def calculate_sum(numbers):
             pytest.skip(f"集成测试失败（可能是 API 配置问题）: {e}")
 
 
-def pytest_addoption(parser):
-    """添加 pytest 命令行选项"""
-    parser.addoption(
-        "--run-integration",
-        action="store_true",
-        default=False,
-        help="运行集成测试（需要有效的 API key）"
-    )
-
-
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
@@ -0,0 +1,121 @@
+"""
+测试静态分析结果缓存
+"""
+import sqlite3
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from app.services.analysis_cache import AnalysisCache
+
+
+class TestAnalysisCache:
+    """测试内存层与 SQLite 磁盘层"""
+
+    def test_key_depends_on_all_parts(self):
+        """测试缓存键由代码、工具名、版本和配置共同决定"""
+        base = AnalysisCache.make_key("x = 1", "security_check", "1.0", {"language": "python"})
+
+        assert base == AnalysisCache.make_key("x = 1", "security_check", "1.0", {"language": "python"})
+        assert base != AnalysisCache.make_key("x = 2", "security_check", "1.0", {"language": "python"})
+        assert base != AnalysisCache.make_key("x = 1", "pylint_analysis", "1.0", {"language": "python"})
+        assert base != AnalysisCache.make_key("x = 1", "security_check", "1.1", {"language": "python"})
+        assert base != AnalysisCache.make_key("x = 1", "security_check", "1.0", {"language": "go"})
+
+    def test_get_or_compute_skips_repeated_analysis(self):
+        """测试重复分析同一份代码时只计算一次"""
+        cache = AnalysisCache()
+        compute = Mock(return_value="report")
+
+        for _ in range(3):
+            assert cache.get_or_compute("code", "tool", "1", None, compute) == "report"
+
+        assert compute.call_count == 1
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["memory_hits"] == 2
+
+    def test_memory_lru_eviction_by_size(self):
+        """测试内存层超出字节上限时淘汰最久未使用的条目"""
+        cache = AnalysisCache(max_memory_bytes=10)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        cache.get("a")
+        cache.set("c", "cccc")
+
+        assert cache.get("a") == "aaaa"
+        assert cache.get("b") is None
+        assert cache.get("c") == "cccc"
+        assert cache.stats()["evictions"] == 1
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """测试磁盘层在新实例中仍可命中"""
+        db_path = str(tmp_path / "cache.db")
+        AnalysisCache(db_path=db_path).set("key", "value")
+
+        cache = AnalysisCache(db_path=db_path)
+        assert cache.get("key") == "value"
+        assert cache.stats()["disk_hits"] == 1
+
+    def test_disk_eviction_by_size(self, tmp_path):
+        """测试磁盘层超出字节上限时淘汰最久未访问的条目"""
+        cache = AnalysisCache(db_path=str(tmp_path / "cache.db"), max_disk_bytes=10, max_memory_bytes=1)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        cache.set("c", "cccc")
+
+        assert cache.get("a") is None
+        assert cache.get("c") == "cccc"
+        assert cache.stats()["disk_bytes"] <= 10
+
+    def test_disk_hit_defers_access_time_update(self, tmp_path):
+        """测试磁盘层命中不立即写库，访问时间随下一次写入提交并影响淘汰顺序"""
+        db_path = str(tmp_path / "cache.db")
+        cache = AnalysisCache(db_path=db_path, max_disk_bytes=10, max_memory_bytes=1)
+        cache.TOUCH_INTERVAL = 0
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        stored = sqlite3.connect(db_path).execute(
+            "SELECT last_access FROM analysis_cache WHERE key = 'a'"
+        ).fetchone()[0]
+
+        assert cache.get("a") == "aaaa"
+        assert not cache._conn.in_transaction
+        assert sqlite3.connect(db_path).execute(
+            "SELECT last_access FROM analysis_cache WHERE key = 'a'"
+        ).fetchone()[0] == stored
+
+        cache.set("c", "cccc")
+
+        assert cache.get("a") == "aaaa"
+        assert cache.get("b") is None
+
+    @pytest.mark.asyncio
+    async def test_async_disk_access_off_event_loop(self, tmp_path):
+        """测试异步调用时磁盘层读写不在事件循环线程中执行"""
+        cache = AnalysisCache(db_path=str(tmp_path / "cache.db"))
+        threads = []
+        disk_get = cache._disk_get
+
+        def recording_disk_get(key):
+            threads.append(threading.get_ident())
+            return disk_get(key)
+
+        cache._disk_get = recording_disk_get
+
+        async def compute():
+            return "report"
+
+        assert await cache.aget_or_compute("code", "tool", "1", None, compute) == "report"
+        assert threads and threading.get_ident() not in threads
+
+    def test_disabled_cache(self):
+        """测试禁用缓存时每次都重新计算"""
+        cache = AnalysisCache(enabled=False)
+        compute = Mock(return_value="report")
+
+        cache.get_or_compute("code", "tool", "1", None, compute)
+        cache.get_or_compute("code", "tool", "1", None, compute)
+
+        assert compute.call_count == 2
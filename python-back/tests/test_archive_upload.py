@@ -0,0 +1,205 @@
+"""
+测试压缩包上传
+"""
+import asyncio
+import io
+import tarfile
+import threading
+import zipfile
+from unittest.mock import patch
+
+import pytest
+from fastapi import UploadFile
+
+from app.services import archive_service, file_service
+from app.utils.gitignore import GitIgnoreMatcher
+
+
+def _zip(members: dict) -> UploadFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename="project.zip")
+
+
+def _tar_gz(members: dict, symlinks: dict = None) -> UploadFile:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        for name, target in (symlinks or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            archive.addfile(info)
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename="project.tar.gz")
+
+
+class TestGitIgnoreMatcher:
+    """测试 .gitignore 风格匹配"""
+
+    def test_directory_and_glob_rules(self):
+        matcher = GitIgnoreMatcher(["node_modules/", "*.min.js", "/build", "docs/**/*.md"])
+        assert matcher.is_ignored("node_modules/a.js")
+        assert matcher.is_ignored("web/node_modules/a.js")
+        assert matcher.is_ignored("static/app.min.js")
+        assert matcher.is_ignored("build/main.py")
+        assert not matcher.is_ignored("src/build/main.py")
+        assert matcher.is_ignored("docs/a/b/readme.md")
+        assert not matcher.is_ignored("src/app.js")
+
+    def test_negation(self):
+        matcher = GitIgnoreMatcher.from_text("# 注释\n*.py\n!main.py\n")
+        assert matcher.is_ignored("utils.py")
+        assert not matcher.is_ignored("src/main.py")
+
+    def test_excluded_directory_cannot_be_reincluded(self):
+        matcher = GitIgnoreMatcher(["vendor/", "!vendor/keep.py"])
+        assert matcher.is_ignored("vendor/keep.py")
+
+
+class TestNormalizeMemberPath:
+    """测试成员路径校验"""
+
+    @pytest.mark.parametrize("name", ["../evil.py", "/etc/passwd.py", "a/../../b.py", "C:\\x.py"])
+    def test_rejects_traversal(self, name):
+        assert archive_service.normalize_member_path(name) is None
+
+    def test_normalizes(self):
+        assert archive_service.normalize_member_path("./src\\app.py") == "src/app.py"
+
+
+class TestExtractArchive:
+    """测试流式解压"""
+
+    @pytest.mark.asyncio
+    async def test_zip_filters_and_registers(self, db):
+        """测试 zip 按扩展名、默认排除规则和请求排除规则过滤"""
+        upload = _zip({
+            "src/main.py": b"print(1)\n",
+            "src/util.py": b"x = 1\n",
+            "README.md": b"# readme\n",
+            "node_modules/lib/index.js": b"module.exports = 1\n",
+            "tests/test_main.py": b"def test(): pass\n",
+            "../evil.py": b"x = 0\n",
+        })
+        result = await archive_service.extract_archive(db, upload, "s1", exclude="tests/\n")
+
+        assert sorted(f.filename for f in result.files) == ["src/main.py", "src/util.py"]
+        assert {s.path: s.reason for s in result.skipped} == {
+            "README.md": "不支持的文件类型",
+            "node_modules/lib/index.js": "被排除规则忽略",
+            "tests/test_main.py": "被排除规则忽略",
+            "../evil.py": "非法路径",
+        }
+        assert await file_service.get_file_count_by_session(db, "s1") == 2
+        main = next(f for f in result.files if f.filename == "src/main.py")
+        assert await file_service.get_file_content(db, main.file_id) == "print(1)\n"
+
+    @pytest.mark.asyncio
+    async def test_tar_gz_skips_symlinks(self, db):
+        """测试 tar.gz 流式解压并跳过符号链接"""
+        upload = _tar_gz({"app.py": b"a = 1\n"}, symlinks={"link.py": "/etc/passwd"})
+        result = await archive_service.extract_archive(db, upload, "s1")
+
+        assert [f.filename for f in result.files] == ["app.py"]
+        assert [(s.path, s.reason) for s in result.skipped] == [("link.py", "不是普通文件")]
+
+    @pytest.mark.asyncio
+    async def test_members_scanned_off_event_loop(self, db):
+        """测试成员遍历（包括跳过的成员）不在事件循环线程中进行"""
+        members = {f"node_modules/pkg{i}/index.js": b"x" * 100 for i in range(50)}
+        members["app.py"] = b"a = 1\n"
+        upload = _tar_gz(members)
+        threads = []
+        iter_tar = archive_service._iter_tar
+
+        def recording_iter_tar(fileobj):
+            for entry in iter_tar(fileobj):
+                threads.append(threading.get_ident())
+                yield entry
+
+        with patch.object(archive_service, "_iter_tar", recording_iter_tar):
+            result = await archive_service.extract_archive(db, upload, "s1")
+
+        assert [f.filename for f in result.files] == ["app.py"]
+        assert len(threads) == 51
+        assert threading.get_ident() not in threads
+
+    @pytest.mark.asyncio
+    async def test_cancel_during_last_member_discards_files(self, db):
+        """测试在写入最后一个成员时取消请求，已写入的临时文件全部删除"""
+        upload = _zip({"a.py": b"a = 1\n", "b.py": b"b = 2\n"})
+        save_upload_file = file_service.save_upload_file
+        started = asyncio.Event()
+        release = asyncio.Event()
+        discarded = threading.Event()
+        discard = archive_service._discard
+
+        async def slow_save(upload_file, file_id, max_size=None):
+            if upload_file.filename == "b.py":
+                started.set()
+                await release.wait()
+            return await save_upload_file(upload_file, file_id, max_size=max_size)
+
+        def recording_discard(entries):
+            discard(entries)
+            discarded.set()
+
+        with patch.object(file_service, "save_upload_file", slow_save), \
+                patch.object(archive_service, "_discard", recording_discard):
+            task = asyncio.create_task(archive_service.extract_archive(db, upload, "s1"))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            release.set()
+            assert await asyncio.to_thread(discarded.wait, 5)
+
+        assert list((file_service.get_blob_dir() / "tmp").iterdir()) == []
+        assert await file_service.get_file_count_by_session(db, "s1") == 0
+
+    @pytest.mark.asyncio
+    async def test_per_file_and_count_limits(self, db):
+        """测试单文件大小和文件数量限制"""
+        upload = _zip({
+            "big.py": b"x" * 100,
+            "a.py": b"a = 1\n",
+            "b.py": b"b = 2\n",
+            "c.py": b"c = 3\n",
+        })
+        with patch("app.services.archive_service.settings.MAX_UPLOAD_SIZE", 50), \
+                patch("app.services.archive_service.settings.ARCHIVE_MAX_FILES", 2):
+            result = await archive_service.extract_archive(db, upload, "s1")
+
+        assert [f.filename for f in result.files] == ["a.py", "b.py"]
+        assert result.truncated
+        assert [s.reason for s in result.skipped] == ["文件大小超过限制", "超过文件数量上限"]
+        assert list((file_service.get_blob_dir() / "tmp").iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_total_size_limit(self, db):
+        """测试解压总大小限制"""
+        upload = _tar_gz({"a.py": b"a" * 40, "b.py": b"b" * 40})
+        with patch("app.services.archive_service.settings.ARCHIVE_MAX_TOTAL_SIZE", 60):
+            result = await archive_service.extract_archive(db, upload, "s1")
+
+        assert [f.filename for f in result.files] == ["a.py"]
+        assert result.truncated
+
+    @pytest.mark.asyncio
+    async def test_invalid_archive(self, db):
+        """测试损坏的压缩包和不支持的格式"""
+        with pytest.raises(ValueError):
+            await archive_service.extract_archive(
+                db, UploadFile(file=io.BytesIO(b"not a zip"), filename="x.zip"), "s1"
+            )
+        with pytest.raises(ValueError):
+            await archive_service.extract_archive(
+                db, UploadFile(file=io.BytesIO(b""), filename="x.rar"), "s1"
+            )
@@ -0,0 +1,195 @@
+"""
+测试异步数据库层
+"""
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+from app.api.v1 import chat
+from app.db.database import get_async_database_url, get_async_db
+from app.main import app
+from app.models.message import Message
+from app.models.session import Session as SessionModel
+
+
+@pytest_asyncio.fixture
+async def session_factory(db_factory):
+    """基于临时 SQLite 文件的异步会话工厂"""
+    async with db_factory() as db:
+        db.add(SessionModel(session_id="s1", title="新对话"))
+        await db.commit()
+
+    return db_factory
+
+
+@pytest_asyncio.fixture
+async def client(session_factory):
+    """使用临时数据库的测试客户端"""
+    async def override_get_async_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+class TestAsyncDatabaseUrl:
+    """测试异步驱动 URL 转换"""
+
+    def test_sqlite(self):
+        assert get_async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+    def test_postgresql(self):
+        url = get_async_database_url("postgresql+psycopg2://u:p@localhost/db")
+        assert url == "postgresql+asyncpg://u:p@localhost/db"
+
+    def test_async_url_unchanged(self):
+        assert get_async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+
+class TestAsyncRouters:
+    """测试路由通过异步会话访问数据库"""
+
+    @pytest.mark.asyncio
+    async def test_message_crud(self, client):
+        """测试消息创建、查询、更新、删除"""
+        created = await client.post("/api/v1/code/messages/", json={"session_id": "s1", "content": "你好"})
+        message_id = created.json()["data"]["message_id"]
+
+        listed = await client.get("/api/v1/code/messages/session/s1")
+        assert listed.json()["data"]["total"] == 1
+
+        updated = await client.patch(f"/api/v1/code/messages/{message_id}", json={"content": "更新"})
+        assert updated.json()["data"]["content"] == "更新"
+
+        deleted = await client.delete(f"/api/v1/code/messages/{message_id}")
+        assert deleted.status_code == 200
+        assert (await client.get(f"/api/v1/code/messages/{message_id}")).status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_stream_persists_messages(self, client, session_factory):
+        """测试流式对话使用独立异步会话保存消息"""
+        class Chunk:
+            def __init__(self, content):
+                self.content = content
+
+        async def fake_events(*args, **kwargs):
+            for delta in ("你", "好"):
+                yield {"event": "on_chat_model_stream", "data": {"chunk": Chunk(delta)}}
+
+        with patch.object(chat, "AsyncSessionLocal", session_factory), \
+             patch.object(chat.review_chain.agent, "astream_events", side_effect=fake_events):
+            response = await client.post(
+                "/api/v1/code/chat/stream", json={"session_id": "s1", "message": "请帮我看看"}
+            )
+
+        assert '"type": "done"' in response.text
+        async with session_factory() as db:
+            messages = (await db.scalars(select(Message).order_by(Message.id))).all()
+            session = await db.scalar(select(SessionModel))
+        assert [m.content for m in messages] == ["请帮我看看", "你好"]
+        assert session.title == "请帮我看看"
+
+    @pytest.mark.asyncio
+    async def test_stream_includes_history(self, client, session_factory):
+        """测试流式对话把之前的对话作为历史发送给 Agent"""
+        async with session_factory() as db:
+            db.add(Message(message_id="m1", session_id="s1", role="user", content="a.py 有什么问题"))
+            db.add(Message(message_id="m2", session_id="s1", role="assistant", content="第 3 行可能除零"))
+            await db.commit()
+
+        received = []
+
+        async def fake_events(payload, **kwargs):
+            received.append(payload["messages"])
+            yield {"event": "on_chat_model_stream", "data": {"chunk": type("Chunk", (), {"content": "好"})()}}
+
+        with patch.object(chat, "AsyncSessionLocal", session_factory), \
+             patch.object(chat.review_chain.agent, "astream_events", side_effect=fake_events):
+            await client.post("/api/v1/code/chat/stream", json={"session_id": "s1", "message": "怎么修"})
+
+        assert received[0] == [
+            {"role": "user", "content": "a.py 有什么问题"},
+            {"role": "assistant", "content": "第 3 行可能除零"},
+            {"role": "user", "content": "怎么修"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_stream_reports_usage(self, client, session_factory):
+        """测试流式对话在完成事件中返回 token 用量（含缓存命中数）"""
+        from langchain_core.messages import AIMessageChunk
+
+        async def fake_events(*args, **kwargs):
+            yield {"event": "on_chat_model_stream", "data": {"chunk": AIMessageChunk(content="好")}}
+            yield {"event": "on_chat_model_stream", "data": {"chunk": AIMessageChunk(
+                content="",
+                usage_metadata={
+                    "input_tokens": 3000, "output_tokens": 20, "total_tokens": 3020,
+                    "input_token_details": {"cache_read": 2560},
+                },
+            )}}
+
+        with patch.object(chat, "AsyncSessionLocal", session_factory), \
+             patch.object(chat.review_chain.agent, "astream_events", side_effect=fake_events):
+            response = await client.post("/api/v1/code/chat/stream", json={"session_id": "s1", "message": "你好"})
+
+        assert '"usage": {"input_tokens": 3000, "cached_tokens": 2560, "output_tokens": 20}' in response.text
+
+    @pytest.mark.asyncio
+    async def test_stream_emits_instructions(self, client, session_factory):
+        """测试流式对话把修改指令作为独立事件发送并保存到消息"""
+        reply = "**修改1：删除调试输出**\n- 操作类型：DELETE\n- 位置：2\n\n### 总结\n"
+
+        async def fake_events(*args, **kwargs):
+            for delta in reply.split("\n\n"):
+                yield {"event": "on_chat_model_stream", "data": {"chunk": type("Chunk", (), {"content": delta + "\n\n"})()}}
+
+        with patch.object(chat, "AsyncSessionLocal", session_factory), \
+             patch.object(chat.review_chain.agent, "astream_events", side_effect=fake_events):
+            response = await client.post("/api/v1/code/chat/stream", json={"session_id": "s1", "message": "怎么改"})
+
+        assert '"type": "instruction"' in response.text
+        assert response.text.index('"type": "instruction"') < response.text.index('"type": "done"')
+        async with session_factory() as db:
+            message = await db.scalar(select(Message).where(Message.role == "assistant"))
+        assert message.instructions[0]["type"] == "DELETE"
+        assert message.instructions[0]["start_line"] == 2
+
+    @pytest.mark.asyncio
+    async def test_stream_error_resets_instructions(self, client, session_factory):
+        """测试生成出错时通知客户端丢弃已发送的修改指令"""
+        async def fake_events(*args, **kwargs):
+            delta = "**修改1：删除调试输出**\n- 操作类型：DELETE\n- 位置：2\n\n### 总结\n"
+            yield {"event": "on_chat_model_stream", "data": {"chunk": type("Chunk", (), {"content": delta})()}}
+            raise RuntimeError("连接中断")
+
+        with patch.object(chat, "AsyncSessionLocal", session_factory), \
+             patch.object(chat.review_chain.agent, "astream_events", side_effect=fake_events):
+            response = await client.post("/api/v1/code/chat/stream", json={"session_id": "s1", "message": "怎么改"})
+
+        text = response.text
+        assert text.index('"type": "instruction"') < text.index('"type": "instructions_reset"') \
+            < text.index('"type": "error"')
+        async with session_factory() as db:
+            message = await db.scalar(select(Message).where(Message.role == "assistant"))
+        assert not message.instructions
+
+    @pytest.mark.asyncio
+    async def test_stream_resume_after_buffer_expired(self, client, session_factory):
+        """测试事件缓冲过期后重连返回已保存消息的快照"""
+        async with session_factory() as db:
+            db.add(Message(message_id="m1", session_id="s1", role="assistant", content="完整回复"))
+            await db.commit()
+
+        response = await client.get(
+            "/api/v1/code/chat/stream/m1", headers={"Last-Event-ID": "42"}
+        )
+
+        assert '"type": "snapshot"' in response.text
+        assert "完整回复" in response.text
+        assert '"type": "done"' in response.text
+        assert (await client.get("/api/v1/code/chat/stream/missing")).status_code == 404
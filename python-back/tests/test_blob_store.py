@@ -0,0 +1,156 @@
+"""
+测试内容寻址的文件存储
+"""
+import hashlib
+import io
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.blob import Blob
+from app.models.session import Session as SessionModel
+from app.services import file_service
+
+
+@pytest_asyncio.fixture
+async def db(db):
+    """在公共数据库会话基础上再添加会话 s2"""
+    db.add(SessionModel(session_id="s2"))
+    await db.commit()
+    yield db
+
+
+def _upload(content: bytes, filename: str = "test_sample.py") -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+class TestBlobStore:
+    """测试内容去重与引用计数"""
+
+    @pytest.mark.asyncio
+    async def test_identical_uploads_share_blob(self, db):
+        """测试跨会话的相同内容只保存一份，且不再写入 content 列"""
+        content = b"def hello():\n    return 1\n"
+        first = await file_service.upload_file(db, _upload(content), "s1")
+        second = await file_service.upload_file(db, _upload(content), "s2")
+
+        assert first.blob_hash == second.blob_hash == hashlib.sha256(content).hexdigest()
+        assert first.filepath == second.filepath
+        assert first.content is None
+        blob = await db.get(Blob, first.blob_hash, populate_existing=True)
+        assert blob.refcount == 2
+        assert await file_service.get_file_content(db, second.file_id) == content.decode()
+
+    @pytest.mark.asyncio
+    async def test_blob_removed_when_last_reference_deleted(self, db):
+        """测试最后一个引用删除后才删除内容块"""
+        first = await file_service.upload_file(db, _upload(b"x = 1\n"), "s1")
+        second = await file_service.upload_file(db, _upload(b"x = 1\n"), "s2")
+
+        await file_service.delete_file(db, first.file_id)
+        assert os.path.exists(second.filepath)
+        assert (await db.get(Blob, second.blob_hash, populate_existing=True)).refcount == 1
+
+        await file_service.delete_file(db, second.file_id)
+        assert not os.path.exists(second.filepath)
+        assert (await db.scalars(select(Blob))).all() == []
+
+    @pytest.mark.asyncio
+    async def test_upload_between_delete_commit_and_file_removal(self, db):
+        """测试删除提交后、删除文件前并发上传相同内容，新文件不会被误删"""
+        content = b"y = 2\n"
+        first = await file_service.upload_file(db, _upload(content), "s1")
+        pending = []
+
+        with patch.object(file_service, "remove_blob_file", side_effect=pending.append):
+            await file_service.delete_file(db, first.file_id)
+        async with AsyncSession(db.bind, expire_on_commit=False) as other:
+            second = await file_service.upload_file(other, _upload(content), "s2")
+        for path in pending:
+            file_service.remove_blob_file(path)
+
+        assert second.filepath == first.filepath
+        assert os.path.exists(second.filepath)
+        assert await file_service.get_file_content(db, second.file_id) == content.decode()
+
+    @pytest.mark.asyncio
+    async def test_failed_delete_restores_blob_file(self, db):
+        """测试删除事务失败时内容块文件恢复原名"""
+        uploaded = await file_service.upload_file(db, _upload(b"z = 3\n"), "s1")
+        file_id, blob_path = uploaded.file_id, Path(uploaded.filepath)
+
+        with patch.object(db, "commit", side_effect=RuntimeError("提交失败")):
+            with pytest.raises(RuntimeError):
+                await file_service.delete_file(db, file_id)
+        await db.rollback()
+
+        assert [p.name for p in blob_path.parent.iterdir()] == [blob_path.name]
+        assert await file_service.get_file_content(db, file_id) == "z = 3\n"
+
+    @pytest.mark.asyncio
+    async def test_size_limit_removes_temp_file(self, db):
+        """测试超过大小限制时不留下临时文件"""
+        with patch("app.services.file_service.settings.MAX_UPLOAD_SIZE", 4):
+            with pytest.raises(ValueError):
+                await file_service.upload_file(db, _upload(b"x = 12345\n"), "s1")
+
+        temp_dir = file_service.get_blob_dir() / "tmp"
+        assert list(temp_dir.iterdir()) == []
+        assert (await db.scalars(select(Blob))).all() == []
+
+
+class TestBulkUpload:
+    """测试批量上传"""
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_single_commit(self, db):
+        """测试部分文件失败时其他文件仍成功，且只提交一次"""
+        uploads = [
+            _upload(b"a = 1\n", "a.py"),
+            _upload(b"binary", "image.png"),
+            _upload(b"a = 1\n", "b.py"),
+            _upload(b"c = 3\n", "c.py"),
+        ]
+        original_commit = db.commit
+        with patch.object(db, "commit", side_effect=original_commit) as commit:
+            results = await file_service.bulk_upload_files(db, uploads, "s1")
+        assert commit.call_count == 1
+
+        assert [r.filename for r in results] == ["a.py", "image.png", "b.py", "c.py"]
+        assert results[1].file is None and "不支持的文件类型" in results[1].error
+        assert all(r.file is not None for r in (results[0], results[2], results[3]))
+        assert results[0].file.filepath == results[2].file.filepath
+
+        blob = await db.get(Blob, results[0].file.blob_hash, populate_existing=True)
+        assert blob.refcount == 2
+        assert await file_service.get_file_count_by_session(db, "s1") == 3
+        assert list((file_service.get_blob_dir() / "tmp").iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_retry_failure_discards_temp_files(self, db):
+        """测试重试后仍失败时删除已写入的临时文件"""
+        uploads = [_upload(b"a = 1\n", "a.py"), _upload(b"b = 2\n", "b.py")]
+        error = IntegrityError("INSERT", None, Exception("conflict"))
+        with patch.object(file_service, "store_blobs", side_effect=error) as store_blobs:
+            with pytest.raises(IntegrityError):
+                await file_service.bulk_upload_files(db, uploads, "s1")
+
+        assert store_blobs.call_count == 2
+        assert list((file_service.get_blob_dir() / "tmp").iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_existing_blob_reused(self, db):
+        """测试批量上传复用已存在的内容块"""
+        single = await file_service.upload_file(db, _upload(b"x = 1\n"), "s1")
+        results = await file_service.bulk_upload_files(db, [_upload(b"x = 1\n")], "s2")
+
+        assert results[0].file.blob_hash == single.blob_hash
+        blob = await db.get(Blob, single.blob_hash, populate_existing=True)
+        assert blob.refcount == 2
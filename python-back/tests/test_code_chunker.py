@@ -0,0 +1,107 @@
+"""
+测试大文件分块
+"""
+import ast
+
+from app.services.code_chunker import (
+    estimate_tokens,
+    remap_instruction_positions,
+    shift_instruction_positions,
+    split_code,
+)
+
+
+def _functions(count: int, body_lines: int = 20) -> str:
+    body = "\n".join(f"    value_{i} = compute_something({i})" for i in range(body_lines))
+    return "\n\n".join(f"def func_{n}():\n{body}\n    return value_0" for n in range(count)) + "\n"
+
+
+class TestSplitCode:
+    """测试分块切分"""
+
+    def test_small_code_single_chunk(self):
+        """测试未超出预算时只有一个分块"""
+        chunks = split_code("def a():\n    return 1\n", max_tokens=1000)
+
+        assert len(chunks) == 1
+        assert (chunks[0].start_line, chunks[0].end_line) == (1, 3)
+
+    def test_splits_on_function_boundaries(self):
+        """测试按函数边界切分且拼接后与原代码一致"""
+        code = _functions(10)
+        chunks = split_code(code, max_tokens=400)
+
+        assert len(chunks) > 1
+        assert "\n".join(c.code for c in chunks) == code
+        for chunk in chunks:
+            assert chunk.code.lstrip().startswith("def ")
+            assert estimate_tokens(chunk.code) <= 400
+        # 行范围连续
+        for prev, cur in zip(chunks, chunks[1:]):
+            assert cur.start_line == prev.end_line + 1
+
+    def test_large_class_split_by_methods(self):
+        """测试超出预算的类按方法切分"""
+        methods = "\n".join("    " + line if line else line for line in _functions(6).split("\n"))
+        code = "class Big:\n    '''doc'''\n\n" + methods
+        chunks = split_code(code, max_tokens=400)
+
+        symbols = [s for c in chunks for s in c.symbols]
+        assert "Big.func_0" in symbols
+        assert "\n".join(c.code for c in chunks) == code
+
+    def test_split_class_chunks_parse_after_dedent(self):
+        """测试拆分后的类成员分块去掉公共缩进后可以单独解析，行号不变"""
+        methods = "\n".join("    " + line if line else line for line in _functions(20).split("\n"))
+        code = "class Big(Base):\n" + methods + "\ndef after():\n    return 1\n"
+        chunks = split_code(code, "python", 400)
+
+        assert len(chunks) > 2
+        assert chunks[0].code.startswith("class Big(Base):\n    def func_0")
+        assert chunks[1].indent == 4
+        for chunk in chunks:
+            analysis_code = chunk.analysis_code()
+            ast.parse(analysis_code)
+            assert analysis_code.count("\n") == chunk.code.count("\n")
+
+    def test_estimate_tokens_mixed_text(self):
+        """测试 ASCII 约 4 字符/token、非 ASCII 约 1 字符/token"""
+        assert estimate_tokens("abcdefgh") == 3
+        assert estimate_tokens("代码审查") == 5
+        assert estimate_tokens("") == 1
+
+    def test_non_python_uses_line_windows(self):
+        """测试非 Python 代码按行窗口切分"""
+        code = "\n".join(f"const v{i} = compute({i});" for i in range(500))
+        chunks = split_code(code, "javascript", max_tokens=300)
+
+        assert len(chunks) > 1
+        assert chunks[-1].end_line == 500
+        assert all(estimate_tokens(c.code) <= 300 for c in chunks)
+
+    def test_syntax_error_falls_back(self):
+        """测试无法解析的 Python 代码退化为行窗口"""
+        code = "def broken(:\n" + "x = 1\n" * 400
+        chunks = split_code(code, max_tokens=200)
+
+        assert len(chunks) > 1
+        assert "\n".join(c.code for c in chunks) == code
+
+
+class TestInstructionPositions:
+    """测试修改指令行号映射"""
+
+    def test_shift_single_and_range(self):
+        """测试单行与范围位置都被偏移"""
+        text = "**修改1：替换**\n- 操作类型：REPLACE\n- 位置：3-5\n\n**修改2：插入**\n- 位置：7\n"
+
+        shifted = shift_instruction_positions(text, 100)
+
+        assert "- 位置：103-105" in shifted
+        assert "- 位置：107" in shifted
+
+    def test_other_numbers_untouched(self):
+        """测试位置字段之外的数字保持不变"""
+        text = "第 3 行存在问题\n- 位置：3\n"
+
+        assert remap_instruction_positions(text, lambda n: n * 10) == "第 3 行存在问题\n- 位置：30\n"
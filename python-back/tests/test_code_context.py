@@ -0,0 +1,94 @@
+"""
+测试代码上下文构建
+"""
+import io
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+from sqlalchemy import event
+
+from app.models.file import File
+from app.services import code_context, file_service
+
+
+@pytest_asyncio.fixture
+async def db(db, db_engine):
+    """临时数据库，记录执行的 SQL 语句"""
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    code_context.content_cache.clear()
+    db.statements = statements
+    yield db
+
+
+async def _upload(db, filename: str, content: str) -> str:
+    upload = UploadFile(file=io.BytesIO(content.encode("utf-8")), filename=filename)
+    return (await file_service.upload_file(db, upload, "s1")).file_id
+
+
+class TestLoadCodeFiles:
+    """测试批量读取代码"""
+
+    @pytest.mark.asyncio
+    async def test_single_query_and_request_order(self, db):
+        """测试一次查询取出所有文件，结果按请求顺序返回"""
+        ids = [await _upload(db, f"f{i}.py", f"x = {i}\n") for i in range(5)]
+        requested = [ids[3], ids[0], ids[4], ids[0]]
+
+        db.statements.clear()
+        files = await code_context.load_code_files(db, requested)
+
+        assert [f.file_id for f in files] == requested
+        assert [f.code for f in files] == ["x = 3\n", "x = 0\n", "x = 4\n", "x = 0\n"]
+        assert files[0].language == "python"
+        assert len([s for s in db.statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+    @pytest.mark.asyncio
+    async def test_missing_files(self, db):
+        """测试缺失的文件：默认抛出异常，skip_missing 时跳过"""
+        file_id = await _upload(db, "a.py", "a = 1\n")
+        with pytest.raises(FileNotFoundError):
+            await code_context.load_code_files(db, [file_id, "file_missing"])
+
+        files = await code_context.load_code_files(db, [file_id, "file_missing"], skip_missing=True)
+        assert [f.file_id for f in files] == [file_id]
+
+    @pytest.mark.asyncio
+    async def test_cached_and_db_content_skip_disk_reads(self, db):
+        """测试缓存命中和数据库中的旧内容不再读取文件"""
+        file_id = await _upload(db, "a.py", "a = 1\n")
+        db.add(File(
+            file_id="legacy", session_id="s1", filename="old.js",
+            filepath="/nonexistent/old.js", file_size=5, content="var a;"
+        ))
+        await db.commit()
+
+        await code_context.load_code_files(db, [file_id])
+        with patch("app.services.code_context.read_file_content", new=AsyncMock()) as read:
+            files = await code_context.load_code_files(db, [file_id, "legacy"])
+        read.assert_not_called()
+        assert [f.code for f in files] == ["a = 1\n", "var a;"]
+        assert files[1].language == "javascript"
+
+
+def test_build_code_context():
+    files = [code_context.CodeFile(file_id="f1", filename="a.py", language="python", code="x = 1")]
+    assert code_context.build_code_context(files) == "\n\n**文件**: a.py\n```python\nx = 1\n```\n"
+
+
+def test_content_cache_evicts_oldest():
+    cache = code_context.ContentCache(max_chars=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.get("a")
+    cache.set("c", "123")
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    cache.set("big", "x" * 11)
+    assert cache.get("big") is None
@@ -0,0 +1,83 @@
+"""
+测试基于 AST 的复杂度分析
+"""
+from app.services.complexity_analyzer import analyze_complexity, format_complexity_report
+
+
+def _function(result, name):
+    return next(f for f in result.functions if f.name == name)
+
+
+class TestComplexityAnalyzer:
+    """测试复杂度指标计算"""
+
+    def test_cyclomatic_and_cognitive(self):
+        """测试圈复杂度与认知复杂度"""
+        code = """
+def check(items, limit):
+    for item in items:             # 圈 +1, 认知 +1
+        if item > limit and item:  # 圈 +2, 认知 +2 (嵌套) +1 (布尔序列)
+            return item
+        elif item < 0:             # 圈 +1, 认知 +1
+            continue
+        else:                      # 认知 +1
+            pass
+    return None
+"""
+        metrics = _function(analyze_complexity(code), "check")
+
+        assert metrics.cyclomatic == 5
+        assert metrics.cognitive == 6
+        assert metrics.max_nesting == 2
+        assert metrics.params == 2
+        assert metrics.length == 9
+
+    def test_methods_and_nested_functions(self):
+        """测试方法限定名、self 不计入参数、嵌套函数单独统计"""
+        code = """
+class Service:
+    def run(self, a, *args, **kwargs):
+        def helper(x):
+            return x if x else 0
+        return helper(a)
+"""
+        result = analyze_complexity(code)
+
+        run = _function(result, "Service.run")
+        helper = _function(result, "Service.run.helper")
+        assert run.params == 3
+        assert run.cyclomatic == 1
+        assert helper.cyclomatic == 2
+
+    def test_tabs_and_two_space_indentation(self):
+        """测试制表符和 2 空格缩进不影响嵌套深度"""
+        tabs = "def f(x):\n\tif x:\n\t\tif x > 1:\n\t\t\treturn 1\n"
+        spaces = "def f(x):\n  if x:\n    if x > 1:\n      return 1\n"
+
+        assert analyze_complexity(tabs).max_nesting == 2
+        assert analyze_complexity(spaces).max_nesting == 2
+
+    def test_syntax_error_falls_back_to_lines(self):
+        """测试无法解析时退化为基于行的统计"""
+        result = analyze_complexity("def broken(:\n  pass\n")
+
+        assert result.parse_error
+        assert result.functions == []
+        assert "无法解析" in format_complexity_report(result)
+
+    def test_brace_language_nesting(self):
+        """测试大括号语言的嵌套深度忽略字符串中的括号"""
+        code = 'function a() {\n  if (x) {\n    const s = "{{{";\n  }\n}\n'
+
+        assert analyze_complexity(code, "javascript").max_nesting == 2
+
+    def test_report_flags_complex_functions(self):
+        """测试文本摘要中列出过于复杂的函数"""
+        branches = "\n".join(f"    if x == {i}:\n        return {i}" for i in range(12))
+        code = f"def big(x):\n{branches}\n"
+
+        report = format_complexity_report(analyze_complexity(code))
+
+        assert "big" in report
+        assert "圈复杂度 13" in report
+        assert "建议拆分或简化" in report
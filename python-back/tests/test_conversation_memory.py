@@ -0,0 +1,156 @@
+"""
+测试对话记忆
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.models.message import Message
+from app.models.session import Session as SessionModel
+from app.services.conversation_memory import ConversationSummarizer, build_chat_history
+
+BASE_TIME = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest_asyncio.fixture
+async def factory(db_factory):
+    """包含 6 条对话（每条约 100 token）的会话"""
+    async with db_factory() as db:
+        db.add(SessionModel(session_id="s1", title="会话"))
+        for i in range(6):
+            db.add(Message(
+                message_id=f"m{i}",
+                session_id="s1",
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"第{i}条" + "x" * 396,
+                created_at=BASE_TIME + timedelta(seconds=i)
+            ))
+        await db.commit()
+
+    return db_factory
+
+
+class TestBuildChatHistory:
+    """测试按 token 预算打包历史"""
+
+    @pytest.mark.asyncio
+    async def test_keeps_most_recent_within_budget(self, factory):
+        async with factory() as db:
+            history = await build_chat_history(db, "s1", exclude_message_ids=["m5"], max_tokens=250)
+        assert [h["content"][:3] for h in history] == ["第3条", "第4条"]
+        assert [h["role"] for h in history] == ["assistant", "user"]
+
+    @pytest.mark.asyncio
+    async def test_skips_placeholders_and_errors(self, factory):
+        async with factory() as db:
+            db.add_all([
+                Message(message_id="e1", session_id="s1", role="assistant",
+                        content="AI 响应错误: timeout", created_at=BASE_TIME + timedelta(seconds=10)),
+                Message(message_id="p1", session_id="s1", role="assistant",
+                        content="", created_at=BASE_TIME + timedelta(seconds=11)),
+            ])
+            await db.commit()
+            history = await build_chat_history(db, "s1", max_tokens=150)
+        assert [h["content"][:3] for h in history] == ["第5条"]
+
+    @pytest.mark.asyncio
+    async def test_summary_replaces_older_turns(self, factory):
+        async with factory() as db:
+            session = await db.scalar(select(SessionModel))
+            m2 = await db.scalar(select(Message).where(Message.message_id == "m2"))
+            session.summary = "讨论了 a.py 的空指针问题"
+            session.summary_until_id = m2.id
+            await db.commit()
+
+            history = await build_chat_history(db, "s1", max_tokens=10000)
+        assert history[0]["role"] == "system"
+        assert "a.py 的空指针问题" in history[0]["content"]
+        assert [h["content"][:3] for h in history[1:]] == ["第3条", "第4条", "第5条"]
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, factory):
+        async with factory() as db:
+            assert await build_chat_history(db, "s1", max_tokens=0) == []
+
+
+class TestConversationSummarizer:
+    """测试后台增量摘要"""
+
+    @pytest.mark.asyncio
+    async def test_summarizes_messages_outside_window(self, factory):
+        calls = []
+
+        async def fake_summarize(previous, messages):
+            calls.append((previous, [m.message_id for m in messages]))
+            return f"摘要{len(calls)}"
+
+        summarizer = ConversationSummarizer(summarize=fake_summarize)
+        with patch("app.services.conversation_memory.settings.CHAT_HISTORY_MAX_TOKENS", 250), \
+             patch("app.services.conversation_memory.settings.CHAT_SUMMARY_MIN_TOKENS", 100):
+            task = summarizer.schedule("s1", factory)
+            await task
+
+            async with factory() as db:
+                session = await db.scalar(select(SessionModel))
+                history = await build_chat_history(db, "s1")
+
+            assert calls == [(None, ["m0", "m1", "m2", "m3"])]
+            assert session.summary == "摘要1"
+            assert history[0]["content"].endswith("摘要1")
+            assert [h["content"][:3] for h in history[1:]] == ["第4条", "第5条"]
+
+            # 没有新消息移出窗口时不再调用
+            async with factory() as db:
+                assert await summarizer.update_summary(db, "s1") is False
+            assert len(calls) == 1
+
+            # 新增对话后只摘要新移出窗口的消息，并带上已有摘要
+            async with factory() as db:
+                for i in (6, 7):
+                    db.add(Message(message_id=f"m{i}", session_id="s1", role="user",
+                                   content="y" * 400, created_at=BASE_TIME + timedelta(seconds=i)))
+                await db.commit()
+                assert await summarizer.update_summary(db, "s1") is True
+            assert calls[1] == ("摘要1", ["m4", "m5"])
+
+    @pytest.mark.asyncio
+    async def test_below_threshold_not_summarized(self, factory):
+        async def fake_summarize(previous, messages):
+            raise AssertionError("不应调用")
+
+        summarizer = ConversationSummarizer(summarize=fake_summarize)
+        with patch("app.services.conversation_memory.settings.CHAT_HISTORY_MAX_TOKENS", 500):
+            async with factory() as db:
+                assert await summarizer.update_summary(db, "s1") is False
+
+    @pytest.mark.asyncio
+    async def test_window_matches_history_with_filtered_messages(self, factory):
+        """占位和错误消息不占窗口名额，历史与摘要恰好覆盖全部有效消息"""
+        calls = []
+
+        async def fake_summarize(previous, messages):
+            calls.append([m.message_id for m in messages])
+            return "摘要"
+
+        async with factory() as db:
+            db.add_all([
+                Message(message_id="e1", session_id="s1", role="assistant",
+                        content="流式响应错误: reset", created_at=BASE_TIME + timedelta(seconds=4, milliseconds=500)),
+                Message(message_id="p1", session_id="s1", role="assistant",
+                        content="", created_at=BASE_TIME + timedelta(seconds=10)),
+            ])
+            await db.commit()
+
+        summarizer = ConversationSummarizer(summarize=fake_summarize)
+        with patch("app.services.conversation_memory.settings.CHAT_HISTORY_MAX_TOKENS", 10000), \
+             patch("app.services.conversation_memory.settings.CHAT_HISTORY_MAX_MESSAGES", 3), \
+             patch("app.services.conversation_memory.settings.CHAT_SUMMARY_MIN_TOKENS", 100):
+            async with factory() as db:
+                history = await build_chat_history(db, "s1")
+                assert await summarizer.update_summary(db, "s1") is True
+
+        assert [h["content"][:3] for h in history] == ["第3条", "第4条", "第5条"]
+        assert calls == [["m0", "m1", "m2"]]
@@ -0,0 +1,56 @@
+"""
+测试数据库连接参数
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.database import get_engine_options, register_sqlite_pragmas
+
+
+class TestEngineOptions:
+    """测试引擎参数"""
+
+    def test_postgres_pool_options(self):
+        options = get_engine_options("postgresql://u:p@localhost/db", is_async=True)
+        assert options["pool_pre_ping"] is True
+        assert options["pool_size"] == 5
+        assert options["max_overflow"] == 10
+        assert options["pool_recycle"] == 1800
+        assert "connect_args" not in options
+
+    def test_sqlite_file_pool_options(self):
+        options = get_engine_options("sqlite:///./app.db")
+        assert options["connect_args"] == {"check_same_thread": False}
+        assert options["pool_size"] == 5
+        assert "pool_pre_ping" not in options
+
+    def test_sqlite_memory_uses_default_pool(self):
+        assert get_engine_options("sqlite://") == {"connect_args": {"check_same_thread": False}}
+        assert get_engine_options("sqlite+aiosqlite:///:memory:", is_async=True) == {}
+
+
+def test_sync_engine_pragmas(tmp_path):
+    """测试同步引擎的连接设置了 PRAGMA"""
+    url = f"sqlite:///{tmp_path / 'sync.db'}"
+    engine = create_engine(url, **get_engine_options(url))
+    register_sqlite_pragmas(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -64000
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_async_engine_pragmas(tmp_path):
+    """测试异步引擎的连接设置了 PRAGMA"""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'async.db'}"
+    engine = create_async_engine(url, **get_engine_options(url, is_async=True))
+    register_sqlite_pragmas(engine.sync_engine)
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+    await engine.dispose()
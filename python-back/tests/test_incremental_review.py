@@ -0,0 +1,207 @@
+"""
+测试文件版本差异与增量审查
+"""
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select
+
+from app.models.file import File
+from app.models.session import Session as SessionModel
+from app.services import review_service
+from app.services.code_diff import compute_diff
+from app.services.instruction_parser import split_instruction_blocks
+from app.services.review_chain import review_chain
+
+OLD_CODE = "\n".join(f"line_{i} = {i}" for i in range(1, 41))
+
+
+def _instruction(number: int, position: str) -> str:
+    return f"**修改{number}：示例{number}**\n- 操作类型：REPLACE\n- 位置：{position}\n- 内容：\n```python\n# 注释\nx = 1\n```"
+
+
+class TestComputeDiff:
+    """测试行差异与行号映射"""
+
+    def test_unchanged(self):
+        diff = compute_diff(OLD_CODE, OLD_CODE)
+        assert diff.hunks == []
+        assert diff.map_old_line(10) == 10
+
+    def test_insert_shifts_following_lines(self):
+        lines = OLD_CODE.split("\n")
+        new_code = "\n".join(lines[:10] + ["inserted_a = 0", "inserted_b = 0"] + lines[10:])
+
+        diff = compute_diff(OLD_CODE, new_code)
+
+        assert len(diff.hunks) == 1
+        hunk = diff.hunks[0]
+        assert (hunk.tag, hunk.new_start, hunk.new_end, hunk.added, hunk.removed) == ("insert", 11, 12, 2, 0)
+        assert diff.map_old_line(5) == 5
+        assert diff.map_old_line(30) == 32
+        assert diff.changed_regions(context=3) == [(8, 15)]
+
+    def test_replaced_lines_not_mapped(self):
+        lines = OLD_CODE.split("\n")
+        lines[19] = "line_20 = 'changed'"
+        diff = compute_diff(OLD_CODE, "\n".join(lines))
+
+        assert diff.map_old_line(20) is None
+        assert diff.map_old_line(21) == 21
+        assert diff.changed_lines == 1
+
+    def test_delete_region_and_merge(self):
+        """纯删除取删除位置前后的行；相邻的范围合并"""
+        lines = OLD_CODE.split("\n")
+        new_lines = lines[:5] + lines[7:]
+        new_lines[7] = "changed = 1"
+        diff = compute_diff(OLD_CODE, "\n".join(new_lines))
+
+        assert diff.changed_regions(context=0) == [(5, 6), (8, 8)]
+        assert diff.changed_regions(context=1) == [(4, 9)]
+
+
+class TestSplitInstructionBlocks:
+    """测试提取结构化修改指令块"""
+
+    def test_blocks_end_at_heading(self):
+        markdown = "\n\n".join([
+            "### 💡 改进建议",
+            _instruction(1, "3"),
+            _instruction(2, "10-12"),
+            "### 其他说明\n不属于指令",
+        ])
+
+        blocks = split_instruction_blocks(markdown)
+
+        assert len(blocks) == 2
+        # 代码块中的 # 注释不会结束指令块
+        assert blocks[0].endswith("x = 1\n```")
+        assert "不属于指令" not in blocks[1]
+
+
+class TestReviewChanges:
+    """测试增量审查"""
+
+    @pytest.mark.asyncio
+    async def test_reviews_changed_region_and_keeps_old_findings(self):
+        lines = OLD_CODE.split("\n")
+        new_code = "\n".join(lines[:20] + ["added = compute()"] + lines[20:])
+        previous_review = "\n\n".join([
+            "## 📊 代码审查报告",
+            _instruction(1, "3"),         # 未修改区域，保留
+            _instruction(2, "30-31"),     # 未修改区域，行号后移一行
+            _instruction(3, "20"),        # 位于重新审查的范围内，被本次审查取代
+        ])
+        calls = []
+
+        async def fake_review(code, filename, language, user_question, scope=None):
+            calls.append((code, scope))
+            return "**修改1：处理异常**\n- 操作类型：REPLACE\n- 位置：6"
+
+        with patch.object(review_chain, "_review_with_agent", side_effect=fake_review), \
+             patch("app.services.review_chain.settings.REVIEW_MODE", "agent"), \
+             patch("app.services.review_chain.settings.REVIEW_INCREMENTAL_CONTEXT_LINES", 5):
+            result = await review_chain.review_changes(
+                new_code, OLD_CODE, previous_review, "a.py", "python"
+            )
+
+        assert len(calls) == 1
+        assert calls[0][0].split("\n")[0] == "line_16 = 16"
+        assert "原文件第 16-26 行" in calls[0][1]
+        assert "增量代码审查报告" in result
+        # 片段内第 6 行即新文件第 21 行
+        assert "- 位置：21" in result
+        assert "- 位置：3" in result
+        assert "- 位置：31-32" in result
+        assert "示例3" not in result
+
+    @pytest.mark.asyncio
+    async def test_large_change_falls_back_to_full_review(self):
+        async def fake_review_code(*args, **kwargs):
+            return "完整审查"
+
+        with patch.object(review_chain, "review_code", side_effect=fake_review_code):
+            result = await review_chain.review_changes("x = 1", OLD_CODE, "旧结果", "a.py")
+
+        assert result == "完整审查"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_reuses_previous_review(self):
+        result = await review_chain.review_changes(OLD_CODE, OLD_CODE, "旧结果", "a.py")
+        assert result.endswith("旧结果")
+
+
+@pytest_asyncio.fixture
+async def session_factory(db_factory):
+    """上一版本已审查过的两个文件版本"""
+    async with db_factory() as db:
+        db.add(SessionModel(session_id="s1"))
+        db.add(File(file_id="f_v1", session_id="s1", filename="a.py", filepath="", file_type=".py",
+                    file_size=1, content=OLD_CODE, review_result=_instruction(1, "3")))
+        db.add(File(file_id="f_v2", session_id="s1", filename="a.py", filepath="", file_type=".py",
+                    file_size=1, content=OLD_CODE + "\nline_41 = 41", parent_file_id="f_v1"))
+        await db.commit()
+
+    return db_factory
+
+
+class TestReviewFile:
+    """测试按文件版本选择完整审查或增量审查"""
+
+    @pytest.mark.asyncio
+    async def test_incremental_when_parent_reviewed(self, session_factory):
+        async def fake_changes(**kwargs):
+            assert kwargs["previous_code"] == OLD_CODE
+            return "增量结果"
+
+        async with session_factory() as db:
+            with patch.object(review_chain, "review_changes", side_effect=fake_changes) as changes, \
+                 patch.object(review_chain, "review_code") as full:
+                result, line_count = await review_service.review_file(db, "f_v2")
+            await db.commit()
+
+        assert result == "增量结果"
+        assert line_count == 41
+        changes.assert_called_once()
+        full.assert_not_called()
+        async with session_factory() as db:
+            saved = await db.scalar(select(File.review_result).where(File.file_id == "f_v2"))
+        assert saved == "增量结果"
+
+    @pytest.mark.asyncio
+    async def test_loads_file_and_parent_with_one_query(self, session_factory):
+        """测试当前版本和上一版本的记录用一次查询取出"""
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        async def fake_changes(**kwargs):
+            return "增量结果"
+
+        async with session_factory() as db:
+            engine = db.bind.sync_engine
+            event.listen(engine, "before_cursor_execute", record)
+            try:
+                with patch.object(review_chain, "review_changes", side_effect=fake_changes):
+                    await review_service.review_file(db, "f_v2")
+            finally:
+                event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_full_review_when_disabled(self, session_factory):
+        async def fake_review_code(**kwargs):
+            return "完整结果"
+
+        async with session_factory() as db:
+            with patch.object(review_chain, "review_code", side_effect=fake_review_code), \
+                 patch.object(review_chain, "review_changes") as changes:
+                result, _ = await review_service.review_file(db, "f_v2", incremental=False)
+
+        assert result == "完整结果"
+        changes.assert_not_called()
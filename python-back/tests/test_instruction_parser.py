@@ -0,0 +1,110 @@
+"""
+测试结构化修改指令解析
+"""
+from app.services.instruction_parser import (
+    StreamingInstructionParser,
+    parse_instructions,
+)
+
+REVIEW = """## 📊 代码审查报告
+
+### 💡 改进建议
+
+#### 🔧 结构化修改指令
+
+**修改1：添加模块文档字符串**
+- 操作类型：INSERT
+- 位置：1
+- 内容：
+```python
+'''
+模块说明
+'''
+```
+
+**修改2：改进错误处理**
+- 操作类型：替换
+- 位置：第 3-4 行
+- 内容：
+```python
+    # 捕获具体异常
+    except ValueError:
+```
+
+**修改3：删除调试代码**
+- 操作类型：DELETE
+- 位置：8
+
+### 📝 总结
+代码整体良好
+"""
+
+
+class TestParseInstructions:
+    """测试解析完整审查结果"""
+
+    def test_fields(self):
+        instructions = parse_instructions(REVIEW)
+
+        assert [(i.number, i.type, i.start_line, i.end_line) for i in instructions] == [
+            (1, "INSERT", 1, 1),
+            (2, "REPLACE", 3, 4),
+            (3, "DELETE", 8, 8),
+        ]
+        assert instructions[0].description == "添加模块文档字符串"
+        assert instructions[0].content == "'''\n模块说明\n'''"
+        # 代码中的 # 注释不会结束指令块
+        assert instructions[1].content == "    # 捕获具体异常\n    except ValueError:"
+        assert all(i.valid for i in instructions)
+
+    def test_validates_against_line_count(self):
+        instructions = parse_instructions(REVIEW, line_count=5)
+
+        assert [i.valid for i in instructions] == [True, True, False]
+        assert "超出文件范围" in instructions[2].error
+
+    def test_insert_after_last_line_is_valid(self):
+        markdown = "**修改1：追加**\n- 操作类型：INSERT\n- 位置：6\n- 内容：\n```python\npass\n```"
+        assert parse_instructions(markdown, line_count=5)[0].valid
+
+    def test_missing_fields(self):
+        markdown = (
+            "**修改1：没有类型**\n- 位置：1\n\n"
+            "**修改2：没有内容**\n- 操作类型：REPLACE\n- 位置：2-1\n"
+        )
+        instructions = parse_instructions(markdown)
+
+        assert instructions[0].error == "缺少操作类型"
+        assert "无效" in instructions[1].error
+
+
+class TestStreamingInstructionParser:
+    """测试流式增量解析"""
+
+    def test_char_by_char_matches_full_parse(self):
+        parser = StreamingInstructionParser(line_count=10)
+        emitted = []
+        for char in REVIEW:
+            emitted.extend(parser.feed(char))
+        emitted.extend(parser.finish())
+
+        assert emitted == parse_instructions(REVIEW, line_count=10)
+
+    def test_emits_when_content_fence_closes(self):
+        """内容代码块闭合后立即产出，不等待下一个标题"""
+        parser = StreamingInstructionParser()
+        head, _ = REVIEW.split("**修改2")
+
+        emitted = parser.feed(head)
+
+        assert [i.number for i in emitted] == [1]
+        assert parser.feed("**修改2") == []
+
+    def test_unterminated_block_flushed_on_finish(self):
+        parser = StreamingInstructionParser()
+        assert parser.feed("**修改1：删除**\n- 操作类型：DELETE\n- 位置：2") == []
+
+        instructions = parser.finish()
+
+        assert len(instructions) == 1
+        assert instructions[0].start_line == 2
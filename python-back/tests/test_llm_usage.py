@@ -0,0 +1,71 @@
+"""
+测试 LLM 用量统计
+"""
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.services.llm_usage import LLMUsageStats, extract_usage, merge_usage
+
+
+def make_message(input_tokens, cached_tokens, output_tokens):
+    return AIMessage(
+        content="ok",
+        usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": cached_tokens},
+        },
+    )
+
+
+class TestExtractUsage:
+    """测试从响应中读取用量"""
+
+    def test_usage_metadata(self):
+        usage = extract_usage(make_message(2000, 1792, 300))
+        assert usage == {"input_tokens": 2000, "cached_tokens": 1792, "output_tokens": 300}
+
+    def test_raw_token_usage(self):
+        """兼容接口只返回原始用量时读取 prompt_tokens_details"""
+        message = AIMessage(
+            content="ok",
+            response_metadata={"token_usage": {
+                "prompt_tokens": 1500,
+                "completion_tokens": 100,
+                "prompt_tokens_details": {"cached_tokens": 1024},
+            }},
+        )
+        assert extract_usage(message) == {"input_tokens": 1500, "cached_tokens": 1024, "output_tokens": 100}
+
+    def test_without_usage(self):
+        assert extract_usage(AIMessage(content="ok")) is None
+        assert extract_usage({"role": "assistant", "content": "ok"}) is None
+
+    def test_merge(self):
+        total = merge_usage(None, {"input_tokens": 10, "cached_tokens": 0, "output_tokens": 1})
+        total = merge_usage(total, None)
+        total = merge_usage(total, {"input_tokens": 20, "cached_tokens": 8, "output_tokens": 2})
+        assert total == {"input_tokens": 30, "cached_tokens": 8, "output_tokens": 3}
+
+
+class TestLLMUsageStats:
+    """测试累计统计"""
+
+    def test_record_agent_result(self):
+        """Agent 结果中每次模型调用的用量都会累计，其他消息被忽略"""
+        stats = LLMUsageStats()
+        result = {"messages": [
+            HumanMessage(content="请审查"),
+            make_message(2000, 0, 100),
+            make_message(2500, 2048, 400),
+        ]}
+
+        usage = stats.record_result(result)
+
+        assert usage == {"input_tokens": 4500, "cached_tokens": 2048, "output_tokens": 500}
+        summary = stats.stats()
+        assert summary["calls"] == 2
+        assert summary["cache_hit_rate"] == round(2048 / 4500, 4)
+
+    def test_empty_stats(self):
+        assert LLMUsageStats().stats()["cache_hit_rate"] == 0.0
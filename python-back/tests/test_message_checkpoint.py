@@ -0,0 +1,76 @@
+"""
+测试流式消息检查点
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.models.message import Message
+from app.models.session import Session as SessionModel
+from app.services.message_checkpoint import MessageCheckpointer
+
+
+@pytest_asyncio.fixture
+async def session_factory(db_factory):
+    """带有一条空 AI 消息的临时数据库"""
+    async with db_factory() as db:
+        db.add(SessionModel(session_id="s1"))
+        db.add(Message(message_id="m1", session_id="s1", role="assistant", content=""))
+        await db.commit()
+
+    return db_factory
+
+
+async def _load(factory) -> Message:
+    async with factory() as db:
+        return await db.scalar(select(Message).where(Message.message_id == "m1"))
+
+
+class TestMessageCheckpointer:
+    """测试批量追加写入"""
+
+    @pytest.mark.asyncio
+    async def test_batches_by_token_count(self, session_factory):
+        """测试按增量数批量写入，5000 个增量只写入少量几次"""
+        checkpointer = MessageCheckpointer("m1", session_factory, every_tokens=1000, interval_ms=60000)
+        checkpointer.start()
+
+        for i in range(5000):
+            checkpointer.append(content="x")
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+        await checkpointer.aclose()
+
+        message = await _load(session_factory)
+        assert message.content == "x" * 5000
+        assert message.thinking_process is None
+        assert 1 <= checkpointer.flush_count <= 6
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_interval(self, session_factory):
+        """测试增量较少时按时间间隔写入"""
+        checkpointer = MessageCheckpointer("m1", session_factory, every_tokens=1000, interval_ms=20)
+        checkpointer.start()
+
+        checkpointer.append(content="部分", thinking="🔧 工具\n")
+        await asyncio.sleep(0.2)
+
+        message = await _load(session_factory)
+        assert message.content == "部分"
+        assert message.thinking_process == "🔧 工具\n"
+        await checkpointer.aclose()
+        assert checkpointer.flush_count == 1
+
+    @pytest.mark.asyncio
+    async def test_finish_without_await(self, session_factory):
+        """测试断开连接时不等待也会写入剩余内容"""
+        checkpointer = MessageCheckpointer("m1", session_factory, every_tokens=1000, interval_ms=60000)
+        checkpointer.start()
+        checkpointer.append(content="未完成的回复")
+
+        checkpointer.finish()
+        await asyncio.sleep(0.2)
+
+        assert (await _load(session_factory)).content == "未完成的回复"
@@ -0,0 +1,129 @@
+"""
+测试消息分页
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import inspect
+
+from app.db.database import get_async_db
+from app.main import app
+from app.models.message import Message
+from app.models.session import Session as SessionModel
+from app.utils.cursor import decode_cursor, encode_cursor
+
+BASE_TIME = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest_asyncio.fixture
+async def client(db_engine, db_factory):
+    """包含 7 条消息的测试客户端（其中 3 条创建时间相同）"""
+    async with db_factory() as db:
+        db.add(SessionModel(session_id="s1", title="新对话"))
+        offsets = [0, 1, 2, 2, 2, 3, 4]
+        for i, offset in enumerate(offsets):
+            db.add(Message(
+                message_id=f"msg_{i}",
+                session_id="s1",
+                role="assistant" if i % 2 else "user",
+                content=f"消息{i} " + "x" * 500,
+                thinking_process="思考" if i % 2 else None,
+                created_at=BASE_TIME + timedelta(seconds=offset)
+            ))
+        await db.commit()
+
+    async def override_get_async_db():
+        async with db_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        ac.engine = db_engine
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _collect(client, **params):
+    """依次获取所有页"""
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        data = (await client.get("/api/v1/code/messages/session/s1", params=query)).json()["data"]
+        ids.extend(item["message_id"] for item in data["items"])
+        pages += 1
+        cursor = data["next_cursor"]
+        assert data["has_more"] == (cursor is not None)
+        if cursor is None:
+            return ids, pages
+
+
+class TestMessagePagination:
+    """测试 keyset 分页"""
+
+    @pytest.mark.asyncio
+    async def test_without_limit_returns_all(self, client):
+        """测试不分页时保持原有行为"""
+        data = (await client.get("/api/v1/code/messages/session/s1")).json()["data"]
+        assert data["total"] == 7
+        assert [m["message_id"] for m in data["items"]] == [f"msg_{i}" for i in range(7)]
+        assert data["items"][1]["thinking_process"] == "思考"
+        assert data["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_pages_cover_all_messages_across_ties(self, client):
+        """测试相同创建时间的消息跨页时不重复、不遗漏"""
+        ids, pages = await _collect(client, limit=3)
+        assert ids == [f"msg_{i}" for i in range(7)]
+        assert pages == 3
+
+    @pytest.mark.asyncio
+    async def test_desc_order(self, client):
+        """测试从新到旧分页"""
+        ids, _ = await _collect(client, limit=2, order="desc")
+        assert ids == [f"msg_{i}" for i in reversed(range(7))]
+
+    @pytest.mark.asyncio
+    async def test_truncated_content(self, client):
+        """测试截断模式只返回内容预览"""
+        response = await client.get(
+            "/api/v1/code/messages/session/s1",
+            params={"limit": 2, "content_mode": "truncated", "preview_length": 10}
+        )
+        item = response.json()["data"]["items"][1]
+        assert item["content"] == "消息1 xxxxxx"
+        assert item["content_length"] == len("消息1 " + "x" * 500)
+        assert item["truncated"] is True
+        assert "thinking_process" not in item
+
+    @pytest.mark.asyncio
+    async def test_metadata_only(self, client):
+        """测试 none 模式不返回内容"""
+        response = await client.get(
+            "/api/v1/code/messages/session/s1", params={"content_mode": "none"}
+        )
+        item = response.json()["data"]["items"][0]
+        assert item["content"] is None
+        assert item["content_length"] > 0
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client):
+        """测试无效游标返回 400"""
+        response = await client.get(
+            "/api/v1/code/messages/session/s1", params={"limit": 2, "cursor": "invalid"}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_composite_index_exists(self, client):
+        """测试分页使用的复合索引已创建"""
+        async with client.engine.connect() as conn:
+            indexes = await conn.run_sync(lambda c: inspect(c).get_indexes("messages"))
+        index = next(i for i in indexes if i["name"] == "ix_messages_session_created_id")
+        assert index["column_names"] == ["session_id", "created_at", "id"]
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 1, 1, 12, 0, 0, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
@@ -0,0 +1,80 @@
+"""
+测试 Alembic 迁移
+"""
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.db.database import Base, run_migrations
+import app.models  # noqa
+
+# 引入迁移之前的表结构（由 create_all 创建，没有 alembic_version 表）
+LEGACY_SCHEMA = [
+    """CREATE TABLE sessions (
+        id INTEGER PRIMARY KEY, session_id VARCHAR(50) NOT NULL, title VARCHAR(200) NOT NULL,
+        summary TEXT, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)""",
+    "CREATE UNIQUE INDEX ix_sessions_session_id ON sessions (session_id)",
+    """CREATE TABLE messages (
+        id INTEGER PRIMARY KEY, message_id VARCHAR(50) NOT NULL,
+        session_id VARCHAR(50) NOT NULL REFERENCES sessions (session_id), role VARCHAR(9) NOT NULL,
+        content TEXT NOT NULL, thinking_process TEXT, created_at DATETIME NOT NULL)""",
+    """CREATE TABLE files (
+        id INTEGER PRIMARY KEY, file_id VARCHAR(50) NOT NULL,
+        session_id VARCHAR(50) NOT NULL REFERENCES sessions (session_id), filename VARCHAR(255) NOT NULL,
+        filepath VARCHAR(500) NOT NULL, file_type VARCHAR(20), file_size INTEGER NOT NULL,
+        content TEXT, created_at DATETIME NOT NULL)""",
+    "INSERT INTO sessions VALUES (1, 's1', '旧会话', NULL, '2025-01-01', '2025-01-01')",
+    "INSERT INTO files VALUES (1, 'f1', 's1', 'a.py', '/tmp/a.py', '.py', 3, 'x=1', '2025-01-01')",
+]
+
+
+def _index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_fresh_database_matches_models(tmp_path):
+    """测试空数据库迁移后与模型定义一致"""
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    run_migrations(url)
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+    assert "ix_messages_session_created_id" in _index_names(engine, "messages")
+    assert "ix_files_session_created" in _index_names(engine, "files")
+    assert "ix_sessions_updated_at" in _index_names(engine, "sessions")
+    engine.dispose()
+
+
+def test_legacy_database_upgraded_in_place(tmp_path):
+    """测试没有版本表的旧数据库被标记为初始版本后升级，数据保留"""
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+
+    run_migrations(url)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("files")}
+    assert {"blob_hash", "encoding"} <= columns
+    assert inspect(engine).has_table("blobs")
+    assert "ix_files_session_created" in _index_names(engine, "files")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT content FROM files WHERE file_id = 'f1'")).scalar() == "x=1"
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() is not None
+    engine.dispose()
+
+
+def test_create_all_database_upgraded(tmp_path):
+    """测试由 create_all 创建的最新结构数据库可以直接升级"""
+    url = f"sqlite:///{tmp_path / 'current.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    run_migrations(url)
+    run_migrations(url)
+
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+    engine.dispose()
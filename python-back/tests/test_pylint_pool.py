@@ -0,0 +1,83 @@
+"""
+测试 Pylint 常驻工作进程池
+"""
+import asyncio
+import time
+
+import pytest
+from app.utils.pylint_pool import PylintWorkerPool
+
+pytestmark = pytest.mark.skipif(
+    not PylintWorkerPool.is_available(),
+    reason="未安装 pylint"
+)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    """创建单进程的工作进程池"""
+    pool = PylintWorkerPool(size=1, job_timeout=60, max_jobs_per_worker=2)
+    yield pool
+    pool.shutdown()
+
+
+class TestPylintWorkerPool:
+    """测试工作进程池"""
+
+    def test_run_returns_json_issues(self, pool):
+        """测试同步分析返回 JSON 结构的问题列表"""
+        issues = pool.run("import os\n", "sample.py")
+
+        symbols = {issue["symbol"] for issue in issues}
+        assert "unused-import" in symbols
+        assert all(issue["module"] == "sample" for issue in issues)
+
+    def test_worker_recycled_after_max_jobs(self, pool):
+        """测试超过任务数后工作进程被回收，分析仍然正常"""
+        for _ in range(3):
+            issues = pool.run('"""doc"""\n', "clean.py")
+            assert issues == []
+
+    @pytest.mark.asyncio
+    async def test_arun(self, pool):
+        """测试异步分析"""
+        issues = await pool.arun("x = eval('1')\n", "evil.py")
+        assert any(issue["symbol"] == "eval-used" for issue in issues)
+
+    def test_timeout_replaces_only_stuck_worker(self):
+        """测试任务超时后抛出 TimeoutError，只替换卡住的工作进程"""
+        pool = PylintWorkerPool(size=1, job_timeout=3)
+        try:
+            pool.start()
+            stuck_pid = pool._idle[0].process.pid
+            with pytest.raises(TimeoutError):
+                pool._call(time.sleep, 30)
+
+            assert [worker.process.pid for worker in pool._idle] != [stuck_pid]
+            assert pool.run('"""doc"""\n', "clean.py") == []
+        finally:
+            pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_jobs_survive_stuck_job(self):
+        """测试并发任务中一个卡住时，其他任务（包括排队中的）仍然正常完成"""
+        pool = PylintWorkerPool(size=2, job_timeout=5)
+        try:
+            await asyncio.to_thread(pool.start)
+
+            async def stuck():
+                await pool._acall(time.sleep, 60)
+
+            async def lint(index: int):
+                issues = await pool.arun("import os\n", f"m{index}.py")
+                return {issue["symbol"] for issue in issues}
+
+            results = await asyncio.gather(
+                stuck(), *(lint(i) for i in range(4)), return_exceptions=True
+            )
+
+            assert isinstance(results[0], TimeoutError)
+            assert all("unused-import" in symbols for symbols in results[1:])
+            assert len(pool._idle) == 2
+        finally:
+            pool.shutdown()
@@ -0,0 +1,166 @@
+"""
+测试 LLM 响应缓存
+"""
+import sqlite3
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.response_cache import ResponseCache, normalize_code
+
+
+def _key(code="x = 1", question="有问题吗？", **overrides):
+    params = dict(model="gpt-4o-mini", temperature=0.2, system_prompt="prompt", code=code, question=question)
+    params.update(overrides)
+    return ResponseCache.make_key(**params)
+
+
+class TestResponseCacheKey:
+    """测试缓存键"""
+
+    def test_normalized_code_same_key(self):
+        """测试换行符和行尾空白不影响缓存键"""
+        assert normalize_code("a = 1  \r\nb = 2\n\n") == "a = 1\nb = 2"
+        assert _key("a = 1  \r\nb = 2\n") == _key("a = 1\nb = 2")
+
+    def test_parameters_change_key(self):
+        """测试模型、温度、提示词、问题不同时缓存键不同"""
+        base = _key()
+        assert _key(model="gpt-4o") != base
+        assert _key(temperature=0.7) != base
+        assert _key(system_prompt="other") != base
+        assert _key(question="另一个问题") != base
+        assert _key(extra={"filename": "b.py"}) != base
+
+
+class TestResponseCache:
+    """测试 TTL 与 LRU 淘汰"""
+
+    def test_get_set(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        cache.set("k", "审查结果")
+
+        assert cache.get("k") == "审查结果"
+        assert cache.get("missing") is None
+        assert cache.stats()["hits"] == 1
+
+    def test_ttl_expiry(self, tmp_path):
+        """测试过期条目不再命中"""
+        cache = ResponseCache(str(tmp_path / "responses.db"), ttl_seconds=60)
+        cache.set("k", "v")
+
+        with patch("app.services.response_cache.time.time", return_value=time.time() + 120):
+            assert cache.get("k") is None
+
+    def test_lru_eviction(self, tmp_path):
+        """测试超出条目上限时淘汰最久未访问的条目"""
+        cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=2)
+        cache.set("a", "1")
+        time.sleep(0.01)
+        cache.set("b", "2")
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.set("c", "3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get("c") == "3"
+
+    def test_hit_does_not_write(self, tmp_path):
+        """测试命中时不写库，访问时间随下一次写入提交"""
+        path = str(tmp_path / "responses.db")
+        cache = ResponseCache(path)
+        cache.set("k", "v")
+        stored = sqlite3.connect(path).execute("SELECT last_access FROM response_cache").fetchone()[0]
+        time.sleep(0.01)
+
+        assert cache.get("k") == "v"
+        assert not cache._conn.in_transaction
+        assert sqlite3.connect(path).execute("SELECT last_access FROM response_cache").fetchone()[0] == stored
+
+        cache.set("other", "v2")
+        touched = sqlite3.connect(path).execute(
+            "SELECT last_access FROM response_cache WHERE key = 'k'"
+        ).fetchone()[0]
+        assert touched > stored
+
+    def test_expired_entries_cleaned_periodically(self, tmp_path):
+        """测试过期条目在清理间隔到达后的写入中批量删除"""
+        cache = ResponseCache(str(tmp_path / "responses.db"), ttl_seconds=60)
+        cache.set("old", "v")
+        later = time.time() + ResponseCache.CLEANUP_INTERVAL + 120
+
+        with patch("app.services.response_cache.time.time", return_value=later):
+            assert cache.get("old") is None
+            cache.set("new", "v")
+
+        assert cache.stats()["entries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_async_access(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        await cache.aset("k", "v")
+
+        assert await cache.aget("k") == "v"
+
+    def test_persists_across_instances(self, tmp_path):
+        """测试进程重启后仍可命中"""
+        path = str(tmp_path / "responses.db")
+        ResponseCache(path).set("k", "v")
+
+        assert ResponseCache(path).get("k") == "v"
+
+    def test_disabled(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.db"), enabled=False)
+        cache.set("k", "v")
+
+        assert cache.get("k") is None
+
+
+class TestReviewCodeCache:
+    """测试 review_code 命中缓存时不再调用 Agent"""
+
+    @pytest.mark.asyncio
+    async def test_second_review_served_from_cache(self, tmp_path):
+        from app.services import review_chain as review_chain_module
+
+        chain = review_chain_module.review_chain
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        agent_review = AsyncMock(return_value="审查报告")
+
+        with patch.object(review_chain_module, "get_response_cache", return_value=cache), \
+             patch.object(chain, "_review_with_agent", agent_review):
+            first = await chain.review_code("x = 1\n", "a.py", mode="agent")
+            second = await chain.review_code("x = 1", "a.py", mode="agent")
+            other = await chain.review_code("x = 1", "a.py", user_question="别的问题", mode="agent")
+
+        assert first == second == other == "审查报告"
+        assert agent_review.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_partial_chunk_failure_not_cached(self, tmp_path):
+        """测试分块审查有分块失败时不缓存，成功的报告即使包含失败字样也会缓存"""
+        from app.services import review_chain as review_chain_module
+
+        chain = review_chain_module.review_chain
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        code = "\n".join(f"def func_{i}():\n    return {i}\n" for i in range(40))
+        calls = 0
+
+        async def flaky_review(code, filename, language, user_question, scope=None):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RuntimeError("模型返回异常")
+            return "报告中引用了 ❌ **审查失败** 字样"
+
+        with patch.object(review_chain_module, "get_response_cache", return_value=cache), \
+             patch.object(chain, "_review_with_agent", side_effect=flaky_review), \
+             patch("app.services.review_chain.settings.REVIEW_CHUNK_MAX_TOKENS", 100):
+            await chain.review_code(code, "big.py", mode="agent")
+            assert cache.stats()["entries"] == 0
+            await chain.review_code(code, "big.py", mode="agent")
+
+        assert cache.stats()["entries"] == 1
@@ -0,0 +1,146 @@
+"""
+测试后台审查任务队列
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.models.file import File
+from app.models.message import Message
+from app.models.session import Session as SessionModel
+from app.services import review_jobs
+from app.services.review_jobs import ReviewJobQueue, ReviewJobStatus
+
+
+@pytest_asyncio.fixture
+async def session_factory(db_factory, tmp_path):
+    """带有两个已上传文件的临时数据库"""
+    async with db_factory() as db:
+        db.add(SessionModel(session_id="s1"))
+        for name in ("a.py", "b.py"):
+            path = tmp_path / name
+            path.write_text("x = 1\n", encoding="utf-8")
+            db.add(File(file_id=f"f_{name}", session_id="s1", filename=name,
+                        filepath=str(path), file_type=".py", file_size=6))
+        await db.commit()
+
+    return db_factory
+
+
+async def _wait_finished(queue, job_id, timeout=2.0):
+    async def poll():
+        while queue.get(job_id).status not in review_jobs.FINISHED_STATUSES:
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+    return queue.get(job_id)
+
+
+class TestReviewJobQueue:
+    """测试任务提交、进度、结果和取消"""
+
+    @pytest.mark.asyncio
+    async def test_single_job_persists_message(self, session_factory):
+        """测试单文件任务完成后结果保存为 AI 消息"""
+        queue = ReviewJobQueue(concurrency=1, session_factory=session_factory)
+
+        async def fake_review(**kwargs):
+            return f"{kwargs['filename']} 的报告"
+
+        with patch.object(review_jobs.review_chain, "review_code", side_effect=fake_review):
+            job = queue.submit("single", "s1", ["f_a.py"])
+            assert job.status == ReviewJobStatus.PENDING
+            job = await _wait_finished(queue, job.job_id)
+
+        assert job.status == ReviewJobStatus.SUCCEEDED
+        assert (job.completed_files, job.total_files) == (1, 1)
+        async with session_factory() as db:
+            message = await db.scalar(select(Message).where(Message.message_id == job.message_id))
+        assert message.content == "a.py 的报告"
+        await queue.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_multiple_job_reports_progress(self, session_factory):
+        """测试多文件任务报告进度"""
+        queue = ReviewJobQueue(concurrency=1, session_factory=session_factory)
+        progress = []
+
+        async def fake_review_multiple(files, user_question=None, progress_callback=None):
+            for i in range(len(files)):
+                progress_callback(i + 1, len(files))
+                progress.append(queue.get(job.job_id).completed_files)
+            return "综合报告"
+
+        with patch.object(review_jobs.review_chain, "review_multiple_files", side_effect=fake_review_multiple):
+            job = queue.submit("multiple", "s1", ["f_a.py", "f_b.py"], "有问题吗？")
+            job = await _wait_finished(queue, job.job_id)
+
+        assert progress == [1, 2]
+        assert job.status == ReviewJobStatus.SUCCEEDED
+        assert job.result == "综合报告"
+        await queue.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_missing_file_fails_job(self, session_factory):
+        """测试文件不存在时任务失败"""
+        queue = ReviewJobQueue(concurrency=1, session_factory=session_factory)
+
+        job = queue.submit("single", "s1", ["missing"])
+        job = await _wait_finished(queue, job.job_id)
+
+        assert job.status == ReviewJobStatus.FAILED
+        assert "文件不存在" in job.error
+        await queue.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cancel_running_and_pending(self, session_factory):
+        """测试取消执行中和排队中的任务"""
+        queue = ReviewJobQueue(concurrency=1, session_factory=session_factory)
+
+        async def slow_review(**kwargs):
+            await asyncio.sleep(10)
+
+        with patch.object(review_jobs.review_chain, "review_code", side_effect=slow_review):
+            running = queue.submit("single", "s1", ["f_a.py"])
+            pending = queue.submit("single", "s1", ["f_b.py"])
+            await asyncio.sleep(0.05)
+            assert queue.get(running.job_id).status == ReviewJobStatus.RUNNING
+
+            assert (await queue.cancel(pending.job_id)).status == ReviewJobStatus.CANCELLED
+            running = await queue.cancel(running.job_id)
+
+        assert running.status == ReviewJobStatus.CANCELLED
+        assert queue.get(pending.job_id).status == ReviewJobStatus.CANCELLED
+        async with session_factory() as db:
+            assert (await db.scalars(select(Message))).all() == []
+        await queue.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cancel_while_saving_counts_as_succeeded(self, session_factory):
+        """测试结果保存过程中取消，任务按成功结束且消息已保存"""
+        queue = ReviewJobQueue(concurrency=1, session_factory=session_factory)
+        saving = asyncio.Event()
+        save_review_message = review_jobs.save_review_message
+
+        async def fake_review(**kwargs):
+            return "报告"
+
+        async def slow_save(*args, **kwargs):
+            saving.set()
+            await asyncio.sleep(0.1)
+            return await save_review_message(*args, **kwargs)
+
+        with patch.object(review_jobs.review_chain, "review_code", side_effect=fake_review), \
+             patch.object(review_jobs, "save_review_message", side_effect=slow_save):
+            job = queue.submit("single", "s1", ["f_a.py"])
+            await asyncio.wait_for(saving.wait(), 2.0)
+            job = await queue.cancel(job.job_id)
+
+        assert job.status == ReviewJobStatus.SUCCEEDED
+        assert job.cancel_requested
+        async with session_factory() as db:
+            message = await db.scalar(select(Message).where(Message.message_id == job.message_id))
+        assert message.content == "报告"
+        await queue.shutdown()
@@ -0,0 +1,97 @@
+"""
+测试安全检查规则引擎
+"""
+from app.services.security_rules import (
+    SecurityRule,
+    SecurityRuleEngine,
+    default_engine,
+    format_security_report,
+)
+
+
+class TestSecurityRuleEngine:
+    """测试单次扫描规则引擎"""
+
+    def test_reports_line_and_column(self):
+        """测试发现带有行号和列号"""
+        findings = default_engine.scan("x = 1\nresult = eval(user_input)\n")
+
+        assert len(findings) == 1
+        assert findings[0].rule_id == "eval-call"
+        assert (findings[0].line, findings[0].column) == (2, 10)
+
+    def test_ignores_comments_and_docstrings(self):
+        """测试注释和文档字符串中的匹配被忽略"""
+        code = '"""Never use eval(x) or os.system(cmd)."""\n# exec(code)\nvalue = "input(data)"\n'
+
+        assert default_engine.scan(code) == []
+
+    def test_ast_confirms_real_calls(self):
+        """测试 AST 确认真实调用，属性名相同的调用不会误报"""
+        code = "model.eval()\nresult = eval('1 + 1')\n"
+
+        findings = default_engine.scan(code)
+
+        assert [f.line for f in findings] == [2]
+
+    def test_non_ascii_columns(self):
+        """测试含中文的行中列号按字符计算"""
+        findings = default_engine.scan('name = "中文"; x = eval("1")\n')
+
+        assert findings[0].column == 18
+
+    def test_syntax_error_still_scans(self):
+        """测试无法解析的代码仍然可以检查"""
+        findings = default_engine.scan("def broken(:\n    os.system(cmd)\n")
+
+        assert [f.rule_id for f in findings] == ["os-system"]
+
+    def test_language_specific_rules(self):
+        """测试规则只作用于适用的语言"""
+        js = "el.innerHTML = html; // eval(a)\n"
+
+        assert [f.rule_id for f in default_engine.scan(js, "javascript")] == ["js-inner-html"]
+        assert "js-inner-html" not in [f.rule_id for f in default_engine.scan(js, "python")]
+
+    def test_many_rules_single_pass(self):
+        """测试大量规则时仍然正确匹配"""
+        rules = [
+            SecurityRule(rule_id=f"rule-{i}", pattern=rf"\bdanger_{i}\s*\(", message=f"危险调用 {i}")
+            for i in range(500)
+        ]
+        engine = SecurityRuleEngine(rules)
+
+        findings = engine.scan("danger_42()\nsafe()\ndanger_499(x)\n")
+
+        assert [f.rule_id for f in findings] == ["rule-42", "rule-499"]
+
+    def test_cpickle_load(self):
+        """测试 cPickle 调用同样被识别"""
+        findings = default_engine.scan("import cPickle\ndata = cPickle.loads(raw)\n")
+
+        assert [(f.rule_id, f.line) for f in findings] == [("pickle-load", 2)]
+
+    def test_rules_matching_same_offset(self):
+        """测试多条规则在同一位置匹配时都会报告"""
+        rules = [
+            SecurityRule(rule_id="broad", pattern=r"\bdanger\w*\s*\(", message="危险调用"),
+            SecurityRule(rule_id="narrow", pattern=r"\bdanger_exec\s*\(", message="危险执行"),
+        ]
+        engine = SecurityRuleEngine(rules)
+
+        findings = engine.scan("danger_exec(x)\ndanger_read(y)\n")
+
+        assert [(f.rule_id, f.line) for f in findings] == [("broad", 1), ("narrow", 1), ("broad", 2)]
+
+    def test_overlapping_default_rules(self):
+        """测试同时命中密码和 API 密钥规则的赋值报告两条"""
+        findings = default_engine.scan('API_KEY_PASSWORD = "hunter2"\n')
+
+        assert {f.rule_id for f in findings} == {"hardcoded-password", "hardcoded-api-key"}
+
+    def test_report_groups_by_rule(self):
+        """测试报告按规则分组并列出位置"""
+        report = format_security_report(default_engine.scan("eval(a)\neval(b)\n"))
+
+        assert report.count("eval()") == 1
+        assert "第 1 行第 1 列、第 2 行第 1 列" in report
@@ -0,0 +1,106 @@
+"""
+测试 SSE 帧合并
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.utils.sse import coalesce_deltas, format_sse_event
+
+
+async def _source(events, delay=0.0):
+    for event in events:
+        if delay:
+            await asyncio.sleep(delay)
+        yield event
+
+
+async def _collect(iterator):
+    return [event async for event in iterator]
+
+
+def _content(delta):
+    return {"type": "content", "delta": delta}
+
+
+class TestCoalesceDeltas:
+    """测试增量事件合并"""
+
+    def test_format_sse_event(self):
+        """测试 SSE 帧格式"""
+        frame = format_sse_event({"type": "content", "delta": "你好"})
+
+        assert frame.startswith("data: ") and frame.endswith("\n\n")
+        assert json.loads(frame[6:]) == {"type": "content", "delta": "你好"}
+
+    @pytest.mark.asyncio
+    async def test_merges_burst_into_one_frame(self):
+        """测试同时到达的增量合并为一帧"""
+        frames = await _collect(coalesce_deltas(_source([_content("a"), _content("b"), _content("c")])))
+
+        assert frames == [_content("abc")]
+
+    @pytest.mark.asyncio
+    async def test_disabled_passes_through(self):
+        """测试关闭合并时逐个转发"""
+        events = [_content("a"), _content("b")]
+
+        assert await _collect(coalesce_deltas(_source(events), flush_interval_ms=0)) == events
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_size_budget(self):
+        """测试超过字节预算立即输出"""
+        events = [_content("x" * 300) for _ in range(4)]
+
+        frames = await _collect(coalesce_deltas(_source(events), flush_max_bytes=512))
+
+        assert [len(f["delta"]) for f in frames] == [600, 600]
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_time_budget(self):
+        """测试超过时间窗口后不等待下一个事件即输出"""
+        async def slow_source():
+            yield _content("a")
+            await asyncio.sleep(0.2)
+            yield _content("b")
+
+        iterator = coalesce_deltas(slow_source(), flush_interval_ms=10)
+        first = await asyncio.wait_for(iterator.__anext__(), timeout=0.1)
+
+        assert first == _content("a")
+        assert await _collect(iterator) == [_content("b")]
+
+    @pytest.mark.asyncio
+    async def test_preserves_order_across_types(self):
+        """测试类型切换和非增量事件时保持顺序"""
+        events = [
+            {"type": "thinking", "delta": "t1"},
+            {"type": "thinking", "delta": "t2"},
+            _content("a"),
+            {"type": "error", "error": "x"},
+            _content("b"),
+        ]
+
+        frames = await _collect(coalesce_deltas(_source(events)))
+
+        assert frames == [
+            {"type": "thinking", "delta": "t1t2"},
+            _content("a"),
+            {"type": "error", "error": "x"},
+            _content("b"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_flushes_pending_before_error(self):
+        """测试上游出错时先输出已缓冲的内容"""
+        async def failing_source():
+            yield _content("partial")
+            raise RuntimeError("boom")
+
+        frames = []
+        with pytest.raises(RuntimeError):
+            async for frame in coalesce_deltas(failing_source()):
+                frames.append(frame)
+
+        assert frames == [_content("partial")]
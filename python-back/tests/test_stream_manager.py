@@ -0,0 +1,99 @@
+"""
+测试可恢复的流式生成
+"""
+import asyncio
+
+import pytest
+
+from app.services.stream_manager import StreamBuffer, StreamManager
+
+
+async def _events(count, delay=0.0):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield {"type": "content", "delta": str(i)}
+    yield {"type": "done"}
+
+
+async def _collect(buffer, last_event_id=0):
+    return [item async for item in buffer.subscribe(last_event_id)]
+
+
+class TestStreamBuffer:
+    """测试事件环形缓冲"""
+
+    @pytest.mark.asyncio
+    async def test_replay_after_last_event_id(self):
+        """测试从 Last-Event-ID 之后补发"""
+        buffer = StreamBuffer("m1", max_events=10)
+        for i in range(5):
+            buffer.publish({"type": "content", "delta": str(i)})
+        buffer.close()
+
+        items = await _collect(buffer, last_event_id=3)
+
+        assert items == [(4, {"type": "content", "delta": "3"}), (5, {"type": "content", "delta": "4"})]
+
+    @pytest.mark.asyncio
+    async def test_evicted_events_become_snapshot(self):
+        """测试已淘汰的事件折叠为快照"""
+        buffer = StreamBuffer("m1", max_events=2)
+        for i in range(5):
+            buffer.publish({"type": "content", "delta": str(i)})
+        buffer.close()
+
+        items = await _collect(buffer, last_event_id=1)
+
+        assert items[0] == (3, {"type": "snapshot", "message_id": "m1", "content": "012", "thinking": ""})
+        assert [seq for seq, _ in items[1:]] == [4, 5]
+
+    @pytest.mark.asyncio
+    async def test_live_tail(self):
+        """测试补发后继续接收新事件"""
+        buffer = StreamBuffer("m1", max_events=10)
+        buffer.publish({"type": "start"})
+
+        async def produce():
+            await asyncio.sleep(0.01)
+            buffer.publish({"type": "content", "delta": "a"})
+            buffer.close()
+
+        asyncio.create_task(produce())
+        items = await asyncio.wait_for(_collect(buffer), timeout=1)
+
+        assert [event["type"] for _, event in items] == ["start", "content"]
+
+
+class TestStreamManager:
+    """测试后台生成任务"""
+
+    @pytest.mark.asyncio
+    async def test_generation_survives_disconnect(self):
+        """测试客户端断开后生成继续，重连可以补发"""
+        manager = StreamManager(max_events=100, retain_seconds=60, orphan_timeout=60)
+        buffer = manager.start("m1", _events(5, delay=0.01))
+
+        # 收到第一个事件后断开
+        subscription = buffer.subscribe()
+        first_seq, _ = await subscription.__anext__()
+        await subscription.aclose()
+
+        await asyncio.sleep(0.2)
+        assert buffer.done
+
+        items = await _collect(manager.get("m1"), last_event_id=first_seq)
+        assert "".join(e.get("delta", "") for _, e in items) == "1234"
+        assert items[-1][1] == {"type": "done"}
+
+    @pytest.mark.asyncio
+    async def test_stops_when_orphaned(self):
+        """测试长时间没有客户端连接时停止生成"""
+        manager = StreamManager(max_events=100, retain_seconds=60, orphan_timeout=0.05)
+        buffer = manager.start("m1", _events(100, delay=0.01))
+
+        await asyncio.sleep(0.5)
+
+        assert buffer.done
+        assert buffer.last_seq < 50
+        await manager.shutdown()
@@ -0,0 +1,137 @@
+"""
+测试上传文件的单次流式写入
+"""
+import hashlib
+import io
+from unittest.mock import patch
+
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app.services import file_service
+from app.utils.text_encoding import IncrementalEncodingDetector
+
+
+class CountingStream(io.BytesIO):
+    """记录读取字节数的文件对象"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class TestIncrementalEncodingDetector:
+    """测试增量编码识别"""
+
+    def test_utf8_split_across_chunks(self):
+        """测试多字节字符被分块截断时仍识别为 UTF-8"""
+        data = "# 中文注释\nx = 1\n".encode("utf-8")
+        detector = IncrementalEncodingDetector(["utf-8", "gb18030"], keep_text=True)
+        for i in range(0, len(data), 3):
+            detector.feed(data[i:i + 3])
+        assert detector.finish() == ("utf-8", "# 中文注释\nx = 1\n")
+
+    def test_fallback_encoding(self):
+        """测试 UTF-8 解码失败后回退到 GB18030"""
+        detector = IncrementalEncodingDetector(["utf-8", "gb18030"], keep_text=True)
+        detector.feed("# 中文注释\n".encode("gb18030"))
+        assert detector.finish() == ("gb18030", "# 中文注释\n")
+
+    def test_utf8_bom(self):
+        """测试带 BOM 的 UTF-8 解码时去掉 BOM"""
+        detector = IncrementalEncodingDetector(["utf-8", "gb18030"], keep_text=True)
+        detector.feed(b"\xef\xbb\xbfx = 1\n")
+        assert detector.finish() == ("utf-8-sig", "x = 1\n")
+
+    def test_undecodable(self):
+        """测试所有候选编码都失败"""
+        detector = IncrementalEncodingDetector(["utf-8"])
+        detector.feed(b"\xff\xfe\x00")
+        assert detector.finish() == (None, None)
+
+
+class TestSaveUploadFile:
+    """测试单次流式写入"""
+
+    @pytest.mark.asyncio
+    async def test_hash_and_encoding_in_one_pass(self, db):
+        """测试写入时同时得到哈希、大小和编码"""
+        content = "print('你好')\n".encode("utf-8")
+        result = await file_service.save_upload_file(
+            UploadFile(file=io.BytesIO(content), filename="a.py"), "f1", keep_text=True
+        )
+        assert result.sha256 == hashlib.sha256(content).hexdigest()
+        assert result.size == len(content)
+        assert result.encoding == "utf-8"
+        assert result.text == "print('你好')\n"
+
+    @pytest.mark.asyncio
+    async def test_aborts_as_soon_as_limit_crossed(self, db):
+        """测试超过大小限制后不再继续读取"""
+        stream = CountingStream(b"x" * (5 * file_service.UPLOAD_CHUNK_SIZE))
+        with pytest.raises(ValueError):
+            await file_service.save_upload_file(
+                UploadFile(file=stream, filename="a.py"), "f1",
+                max_size=file_service.UPLOAD_CHUNK_SIZE + 1
+            )
+        assert stream.bytes_read == 2 * file_service.UPLOAD_CHUNK_SIZE
+        assert list((file_service.get_blob_dir() / "tmp").iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_declared_size_rejected_without_reading(self, db):
+        """测试已知大小超限时不读取内容"""
+        stream = CountingStream(b"x = 1\n")
+        with pytest.raises(ValueError):
+            await file_service.save_upload_file(
+                UploadFile(file=stream, filename="a.py", size=100), "f1", max_size=10
+            )
+        assert stream.bytes_read == 0
+
+    @pytest.mark.asyncio
+    async def test_gb18030_file_readable(self, db):
+        """测试 GB18030 编码的文件按识别出的编码读取"""
+        content = "# 中文注释\nx = 1\n"
+        db_file = await file_service.upload_file(
+            db, UploadFile(file=io.BytesIO(content.encode("gb18030")), filename="a.py"), "s1"
+        )
+        assert db_file.encoding == "gb18030"
+        assert await file_service.get_file_content(db, db_file.file_id) == content
+
+    @pytest.mark.asyncio
+    async def test_binary_file_rejected(self, db):
+        """测试无法识别编码的文件被拒绝"""
+        with patch("app.services.file_service.settings.UPLOAD_FALLBACK_ENCODINGS", []):
+            with pytest.raises(ValueError):
+                await file_service.upload_file(
+                    db, UploadFile(file=io.BytesIO(b"\xff\xfe\x00\x01"), filename="a.py"), "s1"
+                )
+
+
+def test_oversized_content_length_rejected():
+    """测试 Content-Length 超限的上传请求在读取请求体前被拒绝"""
+    from app.main import app
+
+    client = TestClient(app)
+    with patch("app.main.settings.MAX_UPLOAD_SIZE", 10):
+        response = client.post(
+            "/api/v1/code/files/upload",
+            files={"file": ("a.py", b"x" * 100 * 1024)},
+            data={"session_id": "s1"}
+        )
+    assert response.status_code == 413
+
+
+def test_size_limit_only_applies_to_upload_routes():
+    """测试其他接口不受上传大小限制影响"""
+    from app.main import app
+
+    client = TestClient(app)
+    with patch("app.main.settings.MAX_UPLOAD_SIZE", 10):
+        response = client.post("/api/v1/code/files/not-upload", content=b"x" * 100 * 1024)
+    assert response.status_code != 413
@@ -21,6 +21,23 @@ export const fileAPI = {
     })
   },
   
+  // 上传文件的新版本（应用修改建议后），审查时只审查与上一版本相比修改的部分
+  uploadFileVersion(parentFileId, sessionId, filename, content) {
+    const formData = new FormData()
+    formData.append('file', new Blob([content], { type: 'text/plain' }), filename)
+    formData.append('session_id', sessionId)
+    formData.append('parent_file_id', parentFileId)
+    return this.uploadFile(formData)
+  },
+  
+  // 获取文件与上一版本的差异
+  getFileDiff(fileId) {
+    return request({
+      url: `/files/${fileId}/diff`,
+      method: 'get'
+    })
+  },
+  
   // 获取文件内容
   getFile(fileId) {
     return request({
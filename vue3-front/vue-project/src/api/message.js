@@ -10,11 +10,12 @@ export const messageAPI = {
     })
   },
   
-  // 获取会话的所有消息
-  getSessionMessages(sessionId) {
+  // 获取会话的消息（params 可传 limit / cursor / order / content_mode 分页获取）
+  getSessionMessages(sessionId, params = {}) {
     return request({
       url: `/messages/session/${sessionId}`,
-      method: 'get'
+      method: 'get',
+      params
     })
   },
   
@@ -97,6 +97,20 @@ export const useMessageStore = defineStore('message', () => {
     }
   }
   
+  // 添加服务端解析出的修改指令
+  const appendInstruction = (instruction) => {
+    if (streamingMessage.value) {
+      streamingMessage.value.instructions = [...(streamingMessage.value.instructions || []), instruction]
+    }
+  }
+  
+  // 生成出错时服务端不保存修改指令，丢弃已收到的指令
+  const resetInstructions = () => {
+    if (streamingMessage.value) {
+      streamingMessage.value.instructions = []
+    }
+  }
+  
   const endStreamingMessage = () => {
     if (streamingMessage.value) {
       streamingMessage.value.streaming = false
@@ -165,6 +179,8 @@ export const useMessageStore = defineStore('message', () => {
     startStreamingMessage,
     updateStreamingMessageId,
     appendToStreamingMessage,
+    appendInstruction,
+    resetInstructions,
     endStreamingMessage,
     clearSessionMessages,
     loadSessionMessages,
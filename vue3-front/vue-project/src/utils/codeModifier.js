@@ -114,6 +114,33 @@ export function parseModificationInstructions(content) {
   return instructions
 }
 
+/**
+ * 转换服务端解析的修改指令（消息的 instructions 字段或 instruction 事件）
+ * 只保留通过校验的指令，格式与 parseModificationInstructions 的结果一致
+ * @param {Array} serverInstructions - 服务端指令数组
+ * @returns {Array} 修改指令数组
+ */
+export function fromServerInstructions(serverInstructions) {
+  if (!Array.isArray(serverInstructions)) {
+    return []
+  }
+  
+  const instructions = serverInstructions
+    .filter(item => item.valid)
+    .map(item => ({
+      description: item.description,
+      type: item.type,
+      startLine: item.start_line,
+      endLine: item.end_line,
+      language: '',
+      content: item.content || ''
+    }))
+  
+  // 按行号排序（从后往前，这样修改时不会影响后续行号）
+  instructions.sort((a, b) => b.startLine - a.startLine)
+  return instructions
+}
+
 /**
  * 应用修改指令到代码上
  * @param {string} originalCode - 原始代码
@@ -222,6 +222,12 @@ export function createSSEConnection(url, data, callbacks = {}) {
   if (callbacks.onThinking) {
     client.on('thinking', callbacks.onThinking)
   }
+  if (callbacks.onInstruction) {
+    client.on('instruction', callbacks.onInstruction)
+  }
+  if (callbacks.onInstructionsReset) {
+    client.on('instructions_reset', callbacks.onInstructionsReset)
+  }
 
   // 连接
   client.connect(data).catch(error => {